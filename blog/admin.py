@@ -1,7 +1,21 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from .models import Post
 from .models import Subscriber
+from .models import OutboxEmail
+from .models import PostNotificationProgress
+from .models import DigestItem
+from .models import MailMetric
+
+class PostNotificationProgressInline(admin.StackedInline):
+    model = PostNotificationProgress
+    can_delete = False
+    extra = 0
+    max_num = 0
+    fields = ('total', 'sent', 'failed', 'skipped', 'remaining', 'started_at', 'finished_at')
+    readonly_fields = fields
+
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -14,17 +28,98 @@ class PostAdmin(admin.ModelAdmin):
         return ''
     thumb.short_description = 'Image'
 
-    list_display = ('thumb','title', 'author', 'category', 'created_at', 'published', 'key')
+    def notified(self, obj):
+        progress = getattr(obj, 'notification_progress', None)
+        if not progress:
+            return ''
+        text = f"{progress.sent}/{progress.total}"
+        if progress.failed:
+            text += f" ({progress.failed} failed)"
+        return text
+    notified.short_description = 'Emailed'
+
+    list_display = ('thumb','title', 'author', 'category', 'created_at', 'published', 'notified', 'key')
     list_display_links = ('title',)
     prepopulated_fields = {"slug": ("title",)}
     search_fields = ('title', 'content', 'author', 'tags', 'category')
     list_filter = ('published', 'created_at', 'category')
     readonly_fields = ('key',)
+    inlines = [PostNotificationProgressInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('notification_progress')
 
 
 @admin.register(Subscriber)
 class SubscriberAdmin(admin.ModelAdmin):
-    list_display = ('email', 'active', 'created_at')
-    list_filter = ('active', 'created_at')
+    list_display = ('email', 'active', 'delivery', 'created_at')
+    list_filter = ('active', 'delivery', 'created_at')
     search_fields = ('email',)
     readonly_fields = ('token', 'created_at')
+
+
+@admin.register(DigestItem)
+class DigestItemAdmin(admin.ModelAdmin):
+    list_display = ('post', 'queued_at', 'sent_at')
+    list_filter = ('sent_at',)
+    list_select_related = ('post',)
+    readonly_fields = ('post', 'queued_at', 'sent_at')
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient_list', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'idempotency_key', 'recipients')
+    readonly_fields = ('idempotency_key', 'attempts', 'locked_at', 'locked_by', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    def recipient_list(self, obj):
+        return ', '.join(obj.recipients)
+    recipient_list.short_description = 'To'
+
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.exclude(status=OutboxEmail.SENT).update(
+            status=OutboxEmail.PENDING, next_attempt_at=timezone.now(), attempts=0, locked_at=None,
+        )
+        self.message_user(request, f"{updated} email(s) queued for retry.")
+    retry_now.short_description = "Retry selected emails now"
+
+
+@admin.register(MailMetric)
+class MailMetricAdmin(admin.ModelAdmin):
+    """Operations panel: delivery counters, latency and recent failures."""
+    list_display = ('period', 'kind', 'attempted', 'sent', 'failed', 'max_queue_depth')
+    list_filter = ('kind',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        from django.template.response import TemplateResponse
+        from . import mailmetrics, mailpool
+        try:
+            hours = max(1, min(24 * 30, int(request.GET.get('hours', 24))))
+        except ValueError:
+            hours = 24
+        # Include this process's not-yet-flushed counts
+        mailmetrics.flush()
+        outbox = {s: 0 for s, _ in OutboxEmail.STATUS_CHOICES}
+        for row in OutboxEmail.objects.values('status').annotate(n=Count('pk')):
+            outbox[row['status']] = row['n']
+        context = dict(
+            self.admin_site.each_context(request),
+            title='Mail delivery',
+            opts=self.model._meta,
+            hours=hours,
+            summary=mailmetrics.summary(hours),
+            outbox=outbox,
+            outbox_failures=OutboxEmail.objects.exclude(last_error='').exclude(status=OutboxEmail.SENT)
+            .order_by('-next_attempt_at')[:20],
+            pool=mailpool.stats(),
+        )
+        return TemplateResponse(request, 'admin/blog/mail_metrics.html', context)
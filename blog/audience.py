@@ -0,0 +1,138 @@
+"""Streaming import and export of the subscriber list.
+
+``blog.Subscriber`` is the only audience store (``portfolio.Subscription``
+is a proxy of it). ``export_subscribers`` and ``import_subscribers`` move
+it in and out as CSV or JSON Lines without holding the list in memory:
+
+  * export streams rows with ``values_list(...).iterator()``;
+  * import reads the file row by row and, per batch of ``batch_size``,
+    looks up the addresses that already exist with one query and inserts
+    the rest with one ``bulk_create``.
+
+Columns are ``FIELDS``; only ``email`` is required on import. Addresses are
+lower-cased, invalid ones are skipped, and existing subscribers are left
+untouched (duplicates within the file count as existing).
+"""
+import csv
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Subscriber
+
+FIELDS = ('email', 'active', 'delivery', 'created_at', 'token')
+FORMATS = ('csv', 'jsonl')
+_TRUE = {'1', 'true', 'yes', 'y', 't', 'on'}
+
+
+def guess_format(path, default='csv'):
+    return 'jsonl' if str(path).lower().endswith(('.jsonl', '.ndjson')) else default
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield one dict per subscriber, streamed from the database."""
+    qs = Subscriber.objects.all() if queryset is None else queryset
+    for values in qs.order_by('pk').values_list(*FIELDS).iterator(chunk_size=chunk_size):
+        row = dict(zip(FIELDS, values))
+        row['created_at'] = row['created_at'].isoformat() if row['created_at'] else ''
+        row['token'] = str(row['token'])
+        yield row
+
+
+def write_export(out, fmt='csv', queryset=None):
+    """Write the list to the text stream ``out``; returns the row count."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for row in export_rows(queryset):
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in export_rows(queryset):
+            out.write(json.dumps(row) + '\n')
+            count += 1
+    return count
+
+
+def read_rows(fh, fmt='csv'):
+    """Yield dicts from a CSV (with header) or JSON Lines text stream."""
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+        return
+    for line in fh:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {}
+
+
+def _bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE
+
+
+def build_subscriber(row, default_active=True):
+    """An unsaved ``Subscriber`` for an import row, or None if it is invalid."""
+    email = str(row.get('email') or '').strip().lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    delivery = row.get('delivery') or Subscriber.IMMEDIATE
+    if delivery not in dict(Subscriber.DELIVERY_CHOICES):
+        delivery = Subscriber.IMMEDIATE
+    created_at = parse_datetime(str(row.get('created_at') or '')) or timezone.now()
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    try:
+        token = uuid.UUID(str(row.get('token')))
+    except ValueError:
+        token = uuid.uuid4()
+    return Subscriber(
+        email=email, active=_bool(row.get('active'), default_active),
+        delivery=delivery, created_at=created_at, token=token,
+    )
+
+
+def import_rows(rows, batch_size=1000, default_active=True, dry_run=False):
+    """Insert new subscribers from ``rows`` in batches.
+
+    Returns ``{'created', 'existing', 'invalid'}`` counts.
+    """
+    stats = {'created': 0, 'existing': 0, 'invalid': 0}
+    batch = {}
+
+    def flush():
+        existing = set(Subscriber.objects.filter(email__in=list(batch)).values_list('email', flat=True))
+        new = [s for email, s in batch.items() if email not in existing]
+        stats['existing'] += len(existing)
+        if new and not dry_run:
+            # ignore_conflicts covers concurrent signups and reused tokens
+            Subscriber.objects.bulk_create(new, batch_size=batch_size, ignore_conflicts=True)
+        stats['created'] += len(new)
+        batch.clear()
+
+    for row in rows:
+        sub = build_subscriber(row, default_active)
+        if sub is None:
+            stats['invalid'] += 1
+            continue
+        if sub.email in batch:
+            stats['existing'] += 1
+            continue
+        batch[sub.email] = sub
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
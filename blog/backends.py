@@ -0,0 +1,115 @@
+"""Email backend that behaves like a slow, unreliable SMTP server.
+
+For load tests and ``manage.py benchmark_email``: nothing leaves the
+process, but every connection costs ``EMAIL_SIMULATED_CONNECT_LATENCY``
+seconds, every message ``EMAIL_SIMULATED_LATENCY`` seconds (plus up to
+``EMAIL_SIMULATED_JITTER``), and a share ``EMAIL_SIMULATED_FAILURE_RATE``
+of messages is rejected with ``SMTPDataError`` (451), as a real server
+would. The same values can be passed to ``get_connection()`` as
+``latency``, ``connect_latency``, ``jitter`` and ``failure_rate``.
+
+Unlike the locmem backend, delivered messages are not kept, so a 100k
+message run doesn't fill memory; ``SimulatedEmailBackend.stats`` counts
+sessions, sends and failures and records when each message went out.
+"""
+import random
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+class SimulationStats:
+    """Thread-safe counters shared by every simulated connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sessions = 0
+            self.sent = 0
+            self.failed = 0
+            self.recipients = set()
+            # time.perf_counter() of each delivered message
+            self.delivered_at = []
+
+    def _session(self):
+        with self._lock:
+            self.sessions += 1
+
+    def _delivered(self, recipients):
+        with self._lock:
+            self.sent += 1
+            self.recipients.update(recipients)
+            self.delivered_at.append(time.perf_counter())
+
+    def _failed(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'sessions': self.sessions, 'sent': self.sent, 'failed': self.failed,
+                'unique_recipients': len(self.recipients),
+                'duplicates': self.sent - len(self.recipients),
+                'delivered_at': list(self.delivered_at),
+            }
+
+
+class SimulatedEmailBackend(BaseEmailBackend):
+    stats = SimulationStats()
+
+    def __init__(self, latency=None, connect_latency=None, jitter=None, failure_rate=None,
+                 fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.latency = float(getattr(settings, 'EMAIL_SIMULATED_LATENCY', 0) if latency is None else latency)
+        self.connect_latency = float(
+            getattr(settings, 'EMAIL_SIMULATED_CONNECT_LATENCY', 0) if connect_latency is None else connect_latency
+        )
+        self.jitter = float(getattr(settings, 'EMAIL_SIMULATED_JITTER', 0) if jitter is None else jitter)
+        self.failure_rate = float(
+            getattr(settings, 'EMAIL_SIMULATED_FAILURE_RATE', 0) if failure_rate is None else failure_rate
+        )
+        self._open = False
+
+    def _pause(self, seconds):
+        if self.jitter:
+            seconds += random.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def open(self):
+        if self._open:
+            return False
+        self._pause(self.connect_latency)
+        self.stats._session()
+        self._open = True
+        return True
+
+    def close(self):
+        self._open = False
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        new_conn = self.open()
+        sent = 0
+        try:
+            for message in email_messages:
+                self._pause(self.latency)
+                if self.failure_rate and random.random() < self.failure_rate:
+                    self.stats._failed()
+                    if not self.fail_silently:
+                        raise smtplib.SMTPDataError(451, b'Simulated temporary failure')
+                    continue
+                self.stats._delivered(message.recipients())
+                sent += 1
+        finally:
+            if new_conn:
+                self.close()
+        return sent
@@ -0,0 +1,118 @@
+"""Periodic digest email for subscribers who chose digest delivery.
+
+Publishing a post emails ``delivery='immediate'`` subscribers right away
+(``blog.dispatch``) and, if anyone uses digest delivery, queues a
+``DigestItem`` for the post. ``manage.py send_digest`` (or the
+``send_digest_task`` Celery beat entry, every ``BLOG_DIGEST_INTERVAL``
+seconds) then:
+
+  * claims every queued item with ``select_for_update(skip_locked=True)``,
+    so overlapping runs never include a post twice;
+  * renders one email listing all the claimed posts, once;
+  * streams digest subscribers in a single query and sends each one
+    email through the batched ``PostNotificationDispatcher`` machinery
+    (or queues them in the outbox with ``USE_EMAIL_OUTBOX``).
+
+Five posts in a week therefore cost digest subscribers one email, not five.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .dispatch import PostNotificationDispatcher, audience
+from .emails import compiled_email
+from .models import DigestItem, Subscriber
+
+logger = logging.getLogger(__name__)
+
+
+def digest_enabled():
+    """True when any active subscriber wants the digest."""
+    return audience(Subscriber.DIGEST).exists()
+
+
+def queue_post(post):
+    """Add ``post`` to the next digest (a no-op if it is already queued)."""
+    DigestItem.objects.get_or_create(post=post)
+
+
+def claim_items():
+    """Mark every unsent item as sent and return them, oldest first."""
+    with transaction.atomic():
+        items = list(
+            DigestItem.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True).order_by('queued_at', 'pk')
+        )
+        if items:
+            DigestItem.objects.filter(pk__in=[i.pk for i in items]).update(sent_at=timezone.now())
+    return items
+
+
+def release_items(items):
+    """Put claimed items back in the queue after a failed run."""
+    DigestItem.objects.filter(pk__in=[i.pk for i in items]).update(sent_at=None)
+
+
+class DigestDispatcher(PostNotificationDispatcher):
+    """One email per digest subscriber listing several posts."""
+
+    delivery = Subscriber.DIGEST
+    template_name = 'emails/post_digest'
+
+    def __init__(self, posts, run_key='', **kwargs):
+        self.posts = list(posts)
+        self.run_key = run_key
+        super().__init__(None, **kwargs)
+
+    def get_subject(self):
+        site_name = getattr(settings, 'SITE_NAME', 'Portfolio')
+        if len(self.posts) == 1:
+            return f'New post: {self.posts[0].title}'
+        return f'{site_name}: {len(self.posts)} new posts'
+
+    def compile(self):
+        entries = [
+            {
+                'title': p.title,
+                'excerpt': (p.content[:200] + '...') if p.content else '',
+                'url': self.base_url + p.get_absolute_url(),
+            }
+            for p in self.posts
+        ]
+        ctx = {'site_name': getattr(settings, 'SITE_NAME', 'Portfolio'), 'posts': entries}
+        return compiled_email(
+            self.template_name, ctx, fields=('unsubscribe_url',),
+            fallback=lambda c: '\n\n'.join(f"{e['title']}\n{e['url']}" for e in c['posts'])
+            + f"\n\nTo unsubscribe: {c['unsubscribe_url']}",
+        )
+
+    def idempotency_key(self, subscriber_pk):
+        return f'digest:{self.run_key}:subscriber:{subscriber_pk}'
+
+
+def send_digest(connection=None):
+    """Send the digest of everything queued since the last run.
+
+    Returns a stats dict (``posts`` plus the dispatcher's counters, or
+    ``queued`` with the outbox). Items for posts unpublished in the meantime
+    are dropped; if sending fails outright the items are released again.
+    """
+    items = claim_items()
+    posts = [i.post for i in DigestItem.objects.filter(pk__in=[i.pk for i in items])
+             .select_related('post').order_by('queued_at', 'pk') if i.post.published]
+    if not posts:
+        return {'posts': 0, 'recipients': 0, 'sent': 0, 'failed': 0}
+    dispatcher = DigestDispatcher(posts, connection=connection, run_key=f'{items[0].pk}-{items[-1].pk}')
+    try:
+        if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+            stats = {'queued': dispatcher.enqueue()}
+        else:
+            stats = dispatcher.send()
+    except Exception:
+        release_items(items)
+        raise
+    stats['posts'] = len(posts)
+    logger.info('Blog digest of %d post(s): %s', len(posts), stats)
+    return stats
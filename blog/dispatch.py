@@ -0,0 +1,279 @@
+"""Batched newsletter delivery for new blog posts.
+
+Sending one notification per subscriber used to cost a query, two template
+renders, a ``reverse()``, a thread and an SMTP session per recipient. The
+dispatcher here instead:
+
+  * streams ``(email, token)`` pairs for active subscribers in one query;
+  * renders the text and HTML bodies once, with a sentinel in place of the
+    unsubscribe URL, and substitutes each recipient's link (``blog.emails``);
+  * sends through a single ``get_connection()`` using ``send_messages`` in
+    batches of ``POST_NOTIFICATION_BATCH_SIZE``, reopening the connection
+    only if a batch fails.
+
+``blog.signals`` and ``blog.tasks`` both go through ``dispatch_post_notification``,
+which queues the messages in the durable outbox instead when
+``USE_EMAIL_OUTBOX`` is enabled (see ``blog.outbox``).
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from . import mailmetrics
+from .emails import compiled_email
+from .models import PostNotificationProgress, Subscriber
+
+logger = logging.getLogger(__name__)
+
+# Any valid UUID works; it is swapped for each recipient's token.
+_TOKEN_PLACEHOLDER = '00000000-0000-0000-0000-000000000000'
+
+
+def site_url():
+    """Scheme and host used for absolute links in outgoing email ('' if unknown)."""
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
+    if not host:
+        return ''
+    scheme = 'https' if not settings.DEBUG else 'http'
+    return f'{scheme}://{host}'
+
+
+def audience(delivery=Subscriber.IMMEDIATE):
+    """Active subscribers with the given delivery preference."""
+    return Subscriber.objects.filter(active=True, delivery=delivery)
+
+
+def default_batch_size():
+    return max(1, int(getattr(settings, 'POST_NOTIFICATION_BATCH_SIZE', 50)))
+
+
+def default_rate_limit():
+    """Messages per second per sending process (0 = unlimited)."""
+    return float(getattr(settings, 'POST_NOTIFICATION_RATE_LIMIT', 0) or 0)
+
+
+class PostNotificationDispatcher:
+    """Render a post notification once and deliver it to many subscribers."""
+
+    delivery = Subscriber.IMMEDIATE
+    template_name = 'emails/post_notification'
+
+    def __init__(self, post, connection=None, batch_size=None, base_url=None, subscriber_ids=None,
+                 recipients=None, rate_limit=None, on_batch=None):
+        self.post = post
+        self.connection = connection
+        self.batch_size = batch_size or default_batch_size()
+        self.rate_limit = default_rate_limit() if rate_limit is None else rate_limit
+        self.on_batch = on_batch
+        self._recipients = recipients
+        self.base_url = site_url() if base_url is None else base_url
+        self.subscriber_ids = subscriber_ids
+        self.subject = self.get_subject()
+        self.from_email = settings.DEFAULT_FROM_EMAIL
+        prefix, _, suffix = reverse('blog:unsubscribe', args=[_TOKEN_PLACEHOLDER]).partition(_TOKEN_PLACEHOLDER)
+        self._unsubscribe_prefix = self.base_url + prefix
+        self._unsubscribe_suffix = suffix
+        self.email = self.compile()
+
+    def get_subject(self):
+        return f'New post: {self.post.title}'
+
+    def compile(self):
+        post = self.post
+        excerpt = (post.content[:300] + '...') if post.content else ''
+        post_url = self.base_url + post.get_absolute_url()
+        ctx = {'title': post.title, 'excerpt': excerpt, 'url': post_url}
+        return compiled_email(
+            self.template_name, ctx, fields=('unsubscribe_url',),
+            fallback=lambda c: f"{c['title']}\n\n{c['excerpt']}\n\nRead more: {c['url']}\n\nTo unsubscribe: {c['unsubscribe_url']}",
+        )
+
+    def unsubscribe_url(self, token):
+        return f'{self._unsubscribe_prefix}{token}{self._unsubscribe_suffix}'
+
+    def recipients(self):
+        """``(pk, email, token)`` for every recipient, streamed from one query
+        unless a pre-loaded list was passed in."""
+        if self._recipients is not None:
+            return iter(self._recipients)
+        qs = audience(self.delivery)
+        if self.subscriber_ids is not None:
+            qs = qs.filter(pk__in=list(self.subscriber_ids))
+        return qs.order_by('pk').values_list('pk', 'email', 'token').iterator(chunk_size=max(self.batch_size, 500))
+
+    def build_message(self, email, token, connection=None):
+        url = self.unsubscribe_url(token)
+        text_body, html_body = self.email.render(unsubscribe_url=url)
+        msg = EmailMultiAlternatives(
+            self.subject,
+            text_body,
+            self.from_email,
+            [email],
+            connection=connection,
+            headers={'List-Unsubscribe': f'<{url}>'},
+        )
+        if html_body:
+            msg.attach_alternative(html_body, 'text/html')
+        return msg
+
+    def _send_batch(self, connection, batch):
+        self._batch_error = None
+        try:
+            return connection.send_messages(batch) or 0
+        except Exception:
+            logger.exception('Post notification batch of %d failed; retrying once', len(batch))
+        # A dropped SMTP session shouldn't lose the rest of the list.
+        try:
+            connection.close()
+        except Exception:
+            pass
+        try:
+            connection.open()
+            return connection.send_messages(batch) or 0
+        except Exception as exc:
+            logger.exception('Post notification batch of %d failed', len(batch))
+            self._batch_error = exc
+            return 0
+
+    def send(self):
+        """Deliver to every recipient; returns a stats dict."""
+        started = self._started = time.perf_counter()
+        connection = self.connection or get_connection(fail_silently=False)
+        stats = {'recipients': 0, 'sent': 0, 'failed': 0, 'batches': 0, 'seconds': 0.0}
+        batch = []
+        connection.open()
+        try:
+            for _pk, email, token in self.recipients():
+                batch.append(self.build_message(email, token, connection))
+                if len(batch) >= self.batch_size:
+                    self._flush(connection, batch, stats)
+                    batch = []
+            if batch:
+                self._flush(connection, batch, stats)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+
+    def idempotency_key(self, subscriber_pk):
+        return f'post:{self.post.pk}:subscriber:{subscriber_pk}'
+
+    def enqueue(self):
+        """Write one outbox row per recipient instead of sending; returns the count.
+
+        Keys are ``post:<id>:subscriber:<id>``, so publishing, unpublishing
+        and republishing a post never mails the same subscriber twice.
+        """
+        from .outbox import enqueue_many, new_row
+
+        rows, count = [], 0
+        for pk, email, token in self.recipients():
+            url = self.unsubscribe_url(token)
+            text_body, html_body = self.email.render(unsubscribe_url=url)
+            rows.append(new_row(
+                self.subject, text_body, [email],
+                from_email=self.from_email,
+                html_body=html_body or '',
+                template_name=self.template_name,
+                idempotency_key=self.idempotency_key(pk),
+                headers={'List-Unsubscribe': f'<{url}>'},
+            ))
+            if len(rows) >= 500:
+                enqueue_many(rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            enqueue_many(rows)
+            count += len(rows)
+        return count
+
+    def _throttle(self, started, already_sent):
+        if self.rate_limit > 0:
+            wait = already_sent / self.rate_limit - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _flush(self, connection, batch, stats):
+        self._throttle(self._started, stats['recipients'])
+        started = time.perf_counter()
+        sent = self._send_batch(connection, batch)
+        mailmetrics.record(self.template_name, time.perf_counter() - started, sent=sent,
+                           failed=len(batch) - sent, error=self._batch_error)
+        stats['recipients'] += len(batch)
+        stats['sent'] += sent
+        stats['failed'] += len(batch) - sent
+        stats['batches'] += 1
+        if self.on_batch:
+            try:
+                self.on_batch(sent, len(batch) - sent)
+            except Exception:
+                logger.exception('Progress callback failed')
+
+
+def start_progress(post, total):
+    """Reset the post's progress row for a new run of ``total`` recipients."""
+    PostNotificationProgress.objects.update_or_create(
+        post=post,
+        defaults={'total': total, 'sent': 0, 'failed': 0, 'skipped': 0,
+                  'started_at': timezone.now(), 'finished_at': None},
+    )
+
+
+def record_progress(post_id, sent=0, failed=0, skipped=0):
+    """Add to the post's counters (safe across concurrent workers)."""
+    if not (sent or failed or skipped):
+        return
+    qs = PostNotificationProgress.objects.filter(post_id=post_id)
+    qs.update(sent=F('sent') + sent, failed=F('failed') + failed, skipped=F('skipped') + skipped)
+    qs.filter(finished_at__isnull=True, total__lte=F('sent') + F('failed') + F('skipped')).update(finished_at=timezone.now())
+
+
+def send_notification_chunk(post, subscriber_ids, connection=None):
+    """Send to one chunk of subscriber ids over a single connection.
+
+    The chunk is loaded with one ``in_bulk`` query; ids that unsubscribed in
+    the meantime are counted as skipped.
+    """
+    ids = set(subscriber_ids)
+    subs = audience().in_bulk(ids)
+    recipients = [(pk, subs[pk].email, subs[pk].token) for pk in sorted(subs)]
+    record_progress(post.pk, skipped=len(ids) - len(recipients))
+    if not recipients:
+        return {'recipients': 0, 'sent': 0, 'failed': 0, 'batches': 0, 'seconds': 0.0}
+    dispatcher = PostNotificationDispatcher(
+        post, connection=connection, recipients=recipients,
+        on_batch=lambda sent, failed: record_progress(post.pk, sent=sent, failed=failed),
+    )
+    return dispatcher.send()
+
+
+def dispatch_post_notification(post, subscriber_ids=None, connection=None):
+    """Send the new-post notification for ``post`` to active subscribers
+    who want every post (digest subscribers get it via ``blog.digest``).
+
+    With ``USE_EMAIL_OUTBOX`` the messages are queued for ``run_mail_worker``.
+    """
+    dispatcher = PostNotificationDispatcher(post, connection=connection, subscriber_ids=subscriber_ids)
+    if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+        queued = dispatcher.enqueue()
+        logger.info('Post %s notification: %d queued', post.pk, queued)
+        return {'queued': queued}
+    if post.pk:
+        qs = audience()
+        if subscriber_ids is not None:
+            qs = qs.filter(pk__in=list(subscriber_ids))
+        total = qs.count()
+        start_progress(post, total)
+        dispatcher.on_batch = lambda sent, failed: record_progress(post.pk, sent=sent, failed=failed)
+    stats = dispatcher.send()
+    logger.info('Post %s notification: %d/%d sent in %d batches (%.2fs)',
+                post.pk, stats['sent'], stats['recipients'], stats['batches'], stats['seconds'])
+    return stats
@@ -0,0 +1,130 @@
+"""Render-once email templates with fast per-recipient substitution.
+
+Most outgoing email differs between recipients only in a link or a name,
+yet each one used to go through the full template engine. A
+``CompiledEmail`` renders the ``.txt`` and ``.html`` templates once, with a
+sentinel in place of every per-recipient field, and splits the output into
+literal segments. ``render(**values)`` then only joins strings:
+
+    email = compiled_email('emails/post_notification', {'title': ...},
+                           fields=('unsubscribe_url',))
+    text, html = email.render(unsubscribe_url=url)
+
+Values are HTML-escaped for the HTML part (unless marked safe) and inserted
+verbatim in the text part. Fields must be output as plain ``{{ field }}``
+in the templates (filters or ``{% if %}`` on a field would see the sentinel,
+not the value).
+
+``compiled_email()`` keeps recently used compilations in a small per-process
+cache keyed by template and static context, so e.g. every subscription
+confirmation for the same site branding reuses one render.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+
+_SENTINEL = '@@EMAILFIELD:{}@@'
+_SENTINEL_RE = re.compile(r'@@EMAILFIELD:([A-Za-z_][A-Za-z0-9_]*)@@')
+
+
+def sentinel(field):
+    return _SENTINEL.format(field)
+
+
+def _compile(rendered):
+    """Split rendered output into literals (even) and field names (odd)."""
+    if rendered is None:
+        return None
+    return _SENTINEL_RE.split(rendered)
+
+
+def _fill(parts, values, escape):
+    out = list(parts)
+    for i in range(1, len(out), 2):
+        value = values.get(out[i], '')
+        out[i] = str(conditional_escape(value)) if escape else str(value)
+    return ''.join(out)
+
+
+class CompiledEmail:
+    """A text/HTML email template rendered once with sentinel placeholders."""
+
+    def __init__(self, template_name, context=None, fields=(), fallback=None):
+        """``template_name`` is the path without extension; ``fallback`` is an
+        optional callable ``(context) -> text`` used when the ``.txt``
+        template is missing (the HTML part is then omitted)."""
+        self.template_name = template_name
+        self.fields = tuple(fields)
+        ctx = dict(context or {})
+        ctx.update({f: sentinel(f) for f in self.fields})
+        try:
+            text = render_to_string(f'{template_name}.txt', ctx)
+        except TemplateDoesNotExist:
+            if fallback is None:
+                raise
+            text, html = fallback(ctx), None
+        else:
+            try:
+                html = render_to_string(f'{template_name}.html', ctx)
+            except TemplateDoesNotExist:
+                html = None
+        self._text = _compile(text)
+        self._html = _compile(html)
+
+    @property
+    def has_html(self):
+        return self._html is not None
+
+    def render_text(self, **values):
+        return _fill(self._text, values, escape=False)
+
+    def render_html(self, **values):
+        if self._html is None:
+            return None
+        return _fill(self._html, values, escape=True)
+
+    def render(self, **values):
+        """Return ``(text, html)`` for one recipient (``html`` may be None)."""
+        return self.render_text(**values), self.render_html(**values)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(template_name, context, fields):
+    try:
+        key = (template_name, tuple(sorted((context or {}).items())), tuple(fields))
+        hash(key)
+        return key
+    except TypeError:
+        return None
+
+
+def compiled_email(template_name, context=None, fields=(), fallback=None):
+    """Return a (possibly cached) ``CompiledEmail``."""
+    key = _cache_key(template_name, context, fields)
+    size = int(getattr(settings, 'EMAIL_TEMPLATE_CACHE_SIZE', 64))
+    if key is None or size <= 0 or settings.DEBUG:
+        return CompiledEmail(template_name, context, fields, fallback)
+    with _cache_lock:
+        email = _cache.get(key)
+        if email is not None:
+            _cache.move_to_end(key)
+            return email
+    email = CompiledEmail(template_name, context, fields, fallback)
+    with _cache_lock:
+        _cache[key] = email
+        while len(_cache) > size:
+            _cache.popitem(last=False)
+    return email
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,244 @@
+"""Lightweight email delivery metrics.
+
+Every send path (the background pool via ``outbox.send_or_record``, the
+outbox worker, the batched newsletter dispatcher and the Celery tasks)
+calls ``record()``. Counts are kept in memory per process and written to
+hourly ``blog.MailMetric`` rows, one per kind of email, at most every
+``MAIL_METRICS_FLUSH_INTERVAL`` seconds, on exit and from gunicorn's
+``worker_exit`` hook. Each row holds:
+
+  * attempted / sent / failed counters;
+  * a per-message latency histogram (``LATENCY_BUCKETS_MS``) plus the
+    total and maximum;
+  * the deepest background-pool queue seen while recording;
+  * the last few error messages.
+
+The kind is the template an email was rendered from
+(``emails/contact_ack``) or, failing that, the prefix of its idempotency
+key (``contact``, ``testimonial``...). ``summary()`` aggregates recent rows
+for the "Mail delivery" admin page. Set ``MAIL_METRICS_ENABLED=False`` to
+turn recording off.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+_OVERFLOW = '+Inf'
+MAX_RECENT_ERRORS = 10
+
+
+def enabled():
+    return bool(getattr(settings, 'MAIL_METRICS_ENABLED', True))
+
+
+def bucket_for(seconds):
+    ms = seconds * 1000
+    for bound in LATENCY_BUCKETS_MS:
+        if ms <= bound:
+            return str(bound)
+    return _OVERFLOW
+
+
+def kind_for(row):
+    """Metric label for an ``OutboxEmail`` row."""
+    if row.template_name:
+        return row.template_name
+    key = row.idempotency_key or ''
+    return key.split(':', 1)[0] if key else 'other'
+
+
+def _period(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def _queue_depth():
+    try:
+        from .mailpool import stats
+        return stats().get('queue_depth', 0)
+    except Exception:
+        return 0
+
+
+def _empty():
+    return {
+        'attempted': 0, 'sent': 0, 'failed': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+        'histogram': defaultdict(int), 'max_queue_depth': 0, 'errors': [],
+    }
+
+
+class MailMetrics:
+    """Per-process accumulator, flushed to ``MailMetric`` rows."""
+
+    def __init__(self, flush_interval=60.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._data = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, kind, seconds, sent=0, failed=0, error=None):
+        """Add one send of ``sent + failed`` messages taking ``seconds`` in total."""
+        count = sent + failed
+        if count <= 0:
+            return
+        per_message = seconds / count
+        depth = _queue_depth()
+        with self._lock:
+            entry = self._data.setdefault((_period(), kind), _empty())
+            entry['attempted'] += count
+            entry['sent'] += sent
+            entry['failed'] += failed
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], per_message)
+            entry['histogram'][bucket_for(per_message)] += count
+            entry['max_queue_depth'] = max(entry['max_queue_depth'], depth)
+            if error is not None:
+                entry['errors'].append({'at': timezone.now().isoformat(timespec='seconds'), 'error': str(error)[:500]})
+                del entry['errors'][:-MAX_RECENT_ERRORS]
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write accumulated counts to the database; returns rows touched."""
+        with self._lock:
+            data, self._data = self._data, {}
+            self._last_flush = time.monotonic()
+        written = 0
+        for (period, kind), entry in data.items():
+            try:
+                _merge(period, kind, entry)
+                written += 1
+            except Exception:
+                logger.exception('Could not flush mail metrics for %s; dropped', kind)
+        return written
+
+
+def _merge(period, kind, entry):
+    from .models import MailMetric
+    with transaction.atomic():
+        row, _ = MailMetric.objects.select_for_update().get_or_create(period=period, kind=kind)
+        row.attempted += entry['attempted']
+        row.sent += entry['sent']
+        row.failed += entry['failed']
+        row.total_seconds += entry['total_seconds']
+        row.max_seconds = max(row.max_seconds, entry['max_seconds'])
+        histogram = dict(row.histogram or {})
+        for bucket, n in entry['histogram'].items():
+            histogram[bucket] = histogram.get(bucket, 0) + n
+        row.histogram = histogram
+        row.max_queue_depth = max(row.max_queue_depth, entry['max_queue_depth'])
+        row.recent_errors = (list(row.recent_errors or []) + entry['errors'])[-MAX_RECENT_ERRORS:]
+        row.save()
+
+
+_metrics = None
+_metrics_pid = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return this process's aggregator (fork-safe, created on first use)."""
+    global _metrics, _metrics_pid
+    pid = os.getpid()
+    if _metrics is None or _metrics_pid != pid:
+        with _metrics_lock:
+            if _metrics is None or _metrics_pid != pid:
+                _metrics = MailMetrics(float(getattr(settings, 'MAIL_METRICS_FLUSH_INTERVAL', 60)))
+                _metrics_pid = pid
+    return _metrics
+
+
+def record(kind, seconds, sent=0, failed=0, error=None):
+    # Prometheus counters for /metrics (myportfolio.metrics) are kept even
+    # with MAIL_METRICS_ENABLED=False
+    try:
+        from myportfolio.metrics import EMAILS
+        if sent:
+            EMAILS.inc(sent, kind=kind, status='sent')
+        if failed:
+            EMAILS.inc(failed, kind=kind, status='failed')
+    except Exception:
+        logger.exception('Could not count sent emails')
+    if not enabled():
+        return
+    try:
+        get_metrics().record(kind, seconds, sent=sent, failed=failed, error=error)
+    except Exception:
+        logger.exception('Could not record mail metrics')
+
+
+def flush():
+    if _metrics is None or _metrics_pid != os.getpid():
+        return 0
+    return _metrics.flush()
+
+
+def _flush_at_exit():
+    # Drain the mail pool first so its last sends are counted
+    try:
+        from .mailpool import shutdown_mail_executor
+        shutdown_mail_executor()
+    except Exception:
+        pass
+    flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+def percentile(histogram, fraction):
+    """Approximate percentile (upper bucket bound in ms) from a histogram."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bound in [str(b) for b in LATENCY_BUCKETS_MS] + [_OVERFLOW]:
+        seen += histogram.get(bound, 0)
+        if seen >= total * fraction:
+            return bound
+    return _OVERFLOW
+
+
+def summary(hours=24):
+    """Totals per kind over the last ``hours`` hours, for the admin page."""
+    from .models import MailMetric
+    since = _period() - timedelta(hours=max(0, hours - 1))
+    kinds = {}
+    errors = []
+    for row in MailMetric.objects.filter(period__gte=since).order_by('period'):
+        k = kinds.setdefault(row.kind, {
+            'kind': row.kind, 'attempted': 0, 'sent': 0, 'failed': 0, 'total_seconds': 0.0,
+            'max_seconds': 0.0, 'histogram': {}, 'max_queue_depth': 0,
+        })
+        k['attempted'] += row.attempted
+        k['sent'] += row.sent
+        k['failed'] += row.failed
+        k['total_seconds'] += row.total_seconds
+        k['max_seconds'] = max(k['max_seconds'], row.max_seconds)
+        k['max_queue_depth'] = max(k['max_queue_depth'], row.max_queue_depth)
+        for bucket, n in (row.histogram or {}).items():
+            k['histogram'][bucket] = k['histogram'].get(bucket, 0) + n
+        errors.extend(dict(e, kind=row.kind) for e in row.recent_errors or [])
+    rows = []
+    for k in sorted(kinds.values(), key=lambda k: -k['attempted']):
+        k['avg_ms'] = round(k['total_seconds'] * 1000 / k['attempted']) if k['attempted'] else None
+        k['max_ms'] = round(k['max_seconds'] * 1000)
+        k['p50_ms'] = percentile(k['histogram'], 0.5)
+        k['p95_ms'] = percentile(k['histogram'], 0.95)
+        k['failure_rate'] = round(100.0 * k['failed'] / k['attempted'], 1) if k['attempted'] else 0.0
+        k['buckets'] = [(b, k['histogram'].get(b, 0)) for b in [str(x) for x in LATENCY_BUCKETS_MS] + [_OVERFLOW]]
+        rows.append(k)
+    errors.sort(key=lambda e: e['at'], reverse=True)
+    return {'kinds': rows, 'recent_errors': errors[:25], 'since': since}
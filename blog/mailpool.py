@@ -0,0 +1,187 @@
+"""Process-wide bounded thread pool for background email.
+
+``async_send_mail`` used to start a new thread per email, so a burst of
+subscriptions or a newsletter could spawn thousands of threads in one
+gunicorn worker. Jobs now go to a fixed number of worker threads
+(``EMAIL_WORKER_THREADS``) through a bounded queue (``EMAIL_QUEUE_SIZE``).
+
+When the queue is full the caller waits up to ``EMAIL_QUEUE_PUT_TIMEOUT``
+seconds and then runs the job itself (``submit``), so a flood slows the
+producer down instead of growing memory or dropping mail. ``offer`` never
+runs the job in the caller: request-path email uses it and, when the pool is
+saturated, parks the message in the outbox instead of sending SMTP on the
+request thread (``blog.utils``). Pending jobs are drained on
+interpreter exit (``atexit``) and from gunicorn's ``worker_exit`` hook
+(see ``gunicorn.conf.py``), bounded by ``EMAIL_DRAIN_TIMEOUT``.
+
+``stats()`` reports queue depth, in-flight jobs and success/failure counts.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BoundedExecutor:
+    """A fixed-size thread pool with a bounded queue and caller-runs backpressure.
+
+    With ``caller_runs=False`` a job that finds the queue full is dropped
+    instead, for work that must never run on a request thread.
+    """
+
+    def __init__(self, max_workers=4, max_queue=1000, put_timeout=1.0, name='mail', caller_runs=True):
+        self.max_workers = max(1, int(max_workers))
+        self.put_timeout = put_timeout
+        self.name = name
+        self.caller_runs = caller_runs
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._threads = []
+        self._shutdown = False
+        self._counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'ran_inline': 0, 'dropped': 0, 'in_flight': 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def _start_workers(self):
+        with self._lock:
+            alive = [t for t in self._threads if t.is_alive()]
+            for i in range(len(alive), self.max_workers):
+                t = threading.Thread(target=self._worker, name=f'{self.name}-{i}', daemon=True)
+                t.start()
+                alive.append(t)
+            self._threads = alive
+
+    def _run(self, fn, args, kwargs):
+        self._count('in_flight')
+        try:
+            fn(*args, **kwargs)
+            self._count('completed')
+        except Exception:
+            self._count('failed')
+            logger.exception('Background %s job failed', self.name)
+        finally:
+            self._count('in_flight', -1)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._run(*item)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)``; runs it inline (or drops it, without
+        ``caller_runs``) if the queue stays full or the pool is shut down.
+        Returns True if it was queued."""
+        return self._submit(fn, args, kwargs, self.caller_runs)
+
+    def offer(self, fn, *args, **kwargs):
+        """Like ``submit`` but never runs the job in the caller: returns False,
+        leaving it to the caller, if the queue stays full or the pool is shut
+        down."""
+        return self._submit(fn, args, kwargs, False)
+
+    def _submit(self, fn, args, kwargs, caller_runs):
+        self._count('submitted')
+        if not self._shutdown:
+            if len(self._threads) < self.max_workers:
+                self._start_workers()
+            try:
+                self._queue.put((fn, args, kwargs), timeout=self.put_timeout)
+                return True
+            except queue.Full:
+                logger.warning('%s queue full (%d); %s', self.name, self._queue.maxsize,
+                               'running job in the caller' if caller_runs else 'dropping job')
+        if not caller_runs:
+            self._count('dropped')
+            return False
+        self._count('ran_inline')
+        self._run(fn, args, kwargs)
+        return False
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counts)
+            data['workers'] = sum(1 for t in self._threads if t.is_alive())
+        data['queue_depth'] = self._queue.qsize()
+        data['queue_capacity'] = self._queue.maxsize
+        return data
+
+    def shutdown(self, timeout=None):
+        """Stop accepting work and wait up to ``timeout`` seconds for queued jobs."""
+        if self._shutdown:
+            return True
+        self._shutdown = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for _ in self._threads:
+            # Block for room so sentinels land behind every queued job
+            try:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                self._queue.put(_STOP, timeout=remaining)
+            except queue.Full:
+                break
+        for t in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            t.join(remaining)
+        drained = not any(t.is_alive() for t in self._threads)
+        if not drained:
+            logger.warning('%s pool exited with %d job(s) still queued', self.name, self._queue.qsize())
+        return drained
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_mail_executor():
+    """Return this process's executor, creating it on first use (fork-safe)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = BoundedExecutor(
+                    max_workers=getattr(settings, 'EMAIL_WORKER_THREADS', 4),
+                    max_queue=getattr(settings, 'EMAIL_QUEUE_SIZE', 1000),
+                    put_timeout=getattr(settings, 'EMAIL_QUEUE_PUT_TIMEOUT', 1.0),
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    return get_mail_executor().submit(fn, *args, **kwargs)
+
+
+def offer(fn, *args, **kwargs):
+    return get_mail_executor().offer(fn, *args, **kwargs)
+
+
+def stats():
+    return get_mail_executor().stats() if _executor is not None and _executor_pid == os.getpid() else {}
+
+
+def shutdown_mail_executor(timeout=None):
+    """Drain queued email before the process exits."""
+    if _executor is None or _executor_pid != os.getpid():
+        return True
+    if timeout is None:
+        timeout = float(getattr(settings, 'EMAIL_DRAIN_TIMEOUT', 25))
+    return _executor.shutdown(timeout=timeout)
+
+
+atexit.register(shutdown_mail_executor)
@@ -0,0 +1,276 @@
+"""Load-test post notifications end to end against a simulated mail server.
+
+Seeds ``--subscribers`` subscribers, publishes a post and times delivery
+through each dispatch mode, with ``blog.backends.SimulatedEmailBackend``
+standing in for SMTP (``--latency-ms``, ``--connect-latency-ms``,
+``--jitter-ms`` and ``--failure-rate``):
+
+  sync      inline once the post is committed (USE_EMAIL_THREADING=False)
+  threaded  on the background pool (blog.mailpool)
+  celery    Celery tasks run eagerly in this process (needs celery)
+  outbox    rows queued with the post, drained by ``--outbox-workers``
+            threads calling ``blog.outbox.process_batch``; failures are
+            retried without backoff
+
+For every mode it reports messages per second from publish to the last
+delivery, p50/p95 publish-to-delivery latency, peak thread count and peak
+Python memory (traced with tracemalloc, which slows the run a little).
+
+The run uses a throwaway test database, created and destroyed the way
+``manage.py test`` does it. ``--current-database`` uses the configured
+database instead (only when it has no active subscribers) and deletes what
+it created afterwards. SQLite allows a single writer, so there the outbox
+mode always runs one worker. Log output from failed sends is suppressed
+unless ``--verbosity 2``.
+
+Usage:
+  python manage.py benchmark_email --subscribers 2000 --latency-ms 5 --failure-rate 0.01
+  python manage.py benchmark_email --modes threaded,outbox --outbox-workers 4
+"""
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from blog import mailmetrics, mailpool
+from blog.backends import SimulatedEmailBackend
+from blog.dispatch import audience
+from blog.models import OutboxEmail, Post, Subscriber
+from blog.outbox import process_batch
+
+MODES = ('sync', 'threaded', 'celery', 'outbox')
+EMAIL_PREFIX = 'bench-'
+EMAIL_DOMAIN = '@example.invalid'
+
+
+def _pct(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class PeakThreads:
+    """Sample ``threading.active_count()`` in the background; keeps the peak."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            # don't count the sampler itself
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._thread = threading.Thread(target=self._sample, name='thread-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark post-notification delivery per dispatch mode against a simulated mail server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=1000)
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help=f'Comma-separated subset of {", ".join(MODES)}.')
+        parser.add_argument('--latency-ms', type=float, default=2.0, help='Simulated time to send one message.')
+        parser.add_argument('--connect-latency-ms', type=float, default=20.0,
+                            help='Simulated time to open a connection.')
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help='Random extra delay per step, up to this.')
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help='Share of messages the server rejects (0-1).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='POST_NOTIFICATION_BATCH_SIZE and OUTBOX_BATCH_SIZE for the run.')
+        parser.add_argument('--outbox-workers', type=int, default=1)
+        parser.add_argument('--timeout', type=float, default=300.0, help='Give up on a mode after this many seconds.')
+        parser.add_argument('--current-database', action='store_true',
+                            help='Use the configured database instead of a throwaway one.')
+
+    def handle(self, *args, **options):
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        unknown = sorted(set(modes) - set(MODES))
+        if unknown:
+            raise CommandError(f'Unknown mode(s): {", ".join(unknown)}')
+        if not 0 <= options['failure_rate'] <= 1:
+            raise CommandError('--failure-rate must be between 0 and 1')
+
+        if options['current_database']:
+            if audience().exists():
+                raise CommandError('This database has active subscribers; run without --current-database.')
+            try:
+                self._run(modes, options)
+            finally:
+                Subscriber.objects.filter(email__startswith=EMAIL_PREFIX, email__endswith=EMAIL_DOMAIN).delete()
+            return
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(modes, options)
+            mailmetrics.flush()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, modes, options):
+        if options['verbosity'] >= 2:
+            return self._run_modes(modes, options)
+        logging.disable(logging.CRITICAL)
+        try:
+            return self._run_modes(modes, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def _run_modes(self, modes, options):
+        n = options['subscribers']
+        if connection.vendor == 'sqlite' and options['outbox_workers'] > 1:
+            options['outbox_workers'] = 1
+            self.stdout.write('SQLite allows one writer: running a single outbox worker.')
+        Subscriber.objects.bulk_create(
+            [Subscriber(email=f'{EMAIL_PREFIX}{i}{EMAIL_DOMAIN}') for i in range(n)], batch_size=1000,
+        )
+        self.stdout.write(
+            f'{n} subscribers; simulated server: {options["latency_ms"]:g} ms/message, '
+            f'{options["connect_latency_ms"]:g} ms/connection, {options["failure_rate"]:.1%} failures'
+        )
+        for mode in modes:
+            if mode == 'celery' and not self._celery_app():
+                self.stdout.write(f'{mode:>9}: skipped (celery is not installed)')
+                continue
+            self._report(mode, n, self._run_mode(mode, options))
+
+    def _settings(self, mode, options):
+        overrides = {
+            'EMAIL_BACKEND': 'blog.backends.SimulatedEmailBackend',
+            'EMAIL_SIMULATED_LATENCY': options['latency_ms'] / 1000.0,
+            'EMAIL_SIMULATED_CONNECT_LATENCY': options['connect_latency_ms'] / 1000.0,
+            'EMAIL_SIMULATED_JITTER': options['jitter_ms'] / 1000.0,
+            'EMAIL_SIMULATED_FAILURE_RATE': options['failure_rate'],
+            'USE_EMAIL_THREADING': mode == 'threaded',
+            'USE_CELERY': mode == 'celery',
+            'USE_EMAIL_OUTBOX': mode == 'outbox',
+            'OUTBOX_BACKOFF_BASE': 0,
+        }
+        if options['batch_size']:
+            overrides['POST_NOTIFICATION_BATCH_SIZE'] = options['batch_size']
+            overrides['OUTBOX_BATCH_SIZE'] = options['batch_size']
+        return overrides
+
+    def _celery_app(self):
+        try:
+            from celery import current_app
+        except ImportError:
+            return None
+        return current_app
+
+    @contextlib.contextmanager
+    def _celery_eager(self, enabled):
+        app = self._celery_app() if enabled else None
+        if app is None:
+            yield
+            return
+        previous = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        try:
+            yield
+        finally:
+            app.conf.task_always_eager = previous
+
+    def _run_mode(self, mode, options):
+        stats = SimulatedEmailBackend.stats
+        stats.reset()
+        deadline = time.monotonic() + options['timeout']
+        with override_settings(**self._settings(mode, options)), self._celery_eager(mode == 'celery'):
+            tracemalloc.start()
+            with PeakThreads() as threads:
+                started = time.perf_counter()
+                # Autocommit: on-commit hooks run as soon as the signal fires
+                post = Post.objects.create(
+                    title=f'Benchmark ({mode})', slug=f'benchmark-email-{mode}', author='bench',
+                    content='Lorem ipsum ' * 80, published=True,
+                )
+                if mode == 'threaded':
+                    self._wait_for_pool(deadline)
+                elif mode == 'outbox':
+                    self._drain_outbox(options['outbox_workers'], deadline)
+                finished = time.perf_counter()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        OutboxEmail.objects.filter(idempotency_key__startswith=f'post:{post.pk}:').delete()
+        post.delete()
+
+        result = stats.snapshot()
+        latencies = sorted(t - started for t in result.pop('delivered_at'))
+        result.update(
+            seconds=(latencies[-1] if latencies else finished - started),
+            p50=_pct(latencies, 0.50), p95=_pct(latencies, 0.95),
+            threads=threads.peak, memory=peak_memory,
+            timed_out=time.monotonic() > deadline,
+        )
+        return result
+
+    def _wait_for_pool(self, deadline):
+        while time.monotonic() < deadline:
+            s = mailpool.stats()
+            if s.get('completed', 0) + s.get('failed', 0) >= s.get('submitted', 0):
+                break
+            time.sleep(0.005)
+        self._close_pool_connections()
+
+    def _close_pool_connections(self):
+        # Each pool thread holds its own database connection; close them so
+        # the throwaway database can be dropped.
+        executor = mailpool.get_mail_executor()
+        barrier = threading.Barrier(executor.max_workers, timeout=5)
+
+        def close():
+            connections.close_all()
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+
+        for _ in range(executor.max_workers):
+            executor.submit(close)
+
+    def _drain_outbox(self, workers, deadline):
+        unfinished = OutboxEmail.objects.filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING])
+
+        def work(i):
+            try:
+                while time.monotonic() < deadline:
+                    claimed, _sent, _failed = process_batch(worker=f'bench-{i}')
+                    if not claimed:
+                        if not unfinished.exists():
+                            return
+                        time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        pool = [threading.Thread(target=work, args=(i,), name=f'outbox-bench-{i}') for i in range(max(1, workers))]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+    def _report(self, mode, expected, r):
+        rate = r['unique_recipients'] / r['seconds'] if r['seconds'] else 0.0
+        line = (
+            f'{mode:>9}: {r["unique_recipients"]}/{expected} delivered in {r["seconds"]:.2f}s '
+            f'({rate:.0f} msg/s), p50 {r["p50"] * 1000:.0f} ms, p95 {r["p95"] * 1000:.0f} ms, '
+            f'peak {r["threads"]} threads, peak {r["memory"] / 1024 / 1024:.1f} MB traced; '
+            f'{r["failed"]} rejected, {r["duplicates"]} duplicate(s), {r["sessions"]} connection(s)'
+        )
+        if r['timed_out']:
+            line += ' [timed out]'
+        self.stdout.write(line)
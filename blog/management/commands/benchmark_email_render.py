@@ -0,0 +1,51 @@
+"""Compare per-recipient template rendering with ``blog.emails`` substitution.
+
+Renders the new-post notification (text + HTML) for ``--recipients``
+synthetic recipients both ways and reports renders per second. No database
+access and no email is sent.
+
+Usage:
+  python manage.py benchmark_email_render --recipients 10000
+"""
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from blog.emails import CompiledEmail
+
+TEMPLATE = 'emails/post_notification'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark render-once email templates against render_to_string per recipient.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        n = options['recipients']
+        ctx = {
+            'title': 'Benchmark post',
+            'excerpt': 'Lorem ipsum dolor sit amet ' * 10,
+            'url': 'https://example.com/blog/benchmark-post/',
+        }
+        urls = [f'https://example.com/blog/unsubscribe/{uuid.uuid4()}/' for _ in range(n)]
+
+        started = time.perf_counter()
+        for url in urls:
+            c = dict(ctx, unsubscribe_url=url)
+            render_to_string(f'{TEMPLATE}.txt', c)
+            render_to_string(f'{TEMPLATE}.html', c)
+        full = time.perf_counter() - started
+
+        started = time.perf_counter()
+        email = CompiledEmail(TEMPLATE, ctx, fields=('unsubscribe_url',))
+        for url in urls:
+            email.render(unsubscribe_url=url)
+        compiled = time.perf_counter() - started
+
+        for label, seconds in (('render_to_string', full), ('compiled', compiled)):
+            self.stdout.write(f'{label:>16}: {n} recipients in {seconds:.3f}s ({n / seconds:,.0f}/s)')
+        self.stdout.write(f'{"speedup":>16}: {full / compiled:.1f}x')
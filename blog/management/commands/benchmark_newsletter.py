@@ -0,0 +1,107 @@
+"""Measure post-notification throughput against a local SMTP sink.
+
+Creates throwaway subscribers inside a transaction that is rolled back at
+the end, starts ``blog.smtpsink.SMTPSink`` (or targets ``--host/--port``)
+and times ``blog.dispatch.PostNotificationDispatcher``. ``--legacy`` also
+times the previous per-recipient approach (a query, two renders and a new
+SMTP connection per subscriber) for comparison.
+
+Usage:
+  python manage.py benchmark_newsletter --subscribers 5000 --latency-ms 2 --legacy
+"""
+import time
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from blog.dispatch import PostNotificationDispatcher, site_url
+from blog.models import Post, Subscriber
+from blog.smtpsink import SMTPSink
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batched newsletter delivery against a local SMTP sink.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Messages per send_messages() call (default POST_NOTIFICATION_BATCH_SIZE).')
+        parser.add_argument('--latency-ms', type=float, default=0.0,
+                            help='Delay the built-in sink adds to every SMTP reply.')
+        parser.add_argument('--host', help='Use an existing SMTP server instead of the built-in sink.')
+        parser.add_argument('--port', type=int, default=25)
+        parser.add_argument('--legacy', action='store_true',
+                            help='Also time one query/render/connection per recipient.')
+
+    def handle(self, *args, **options):
+        sink = None
+        if options['host']:
+            host, port = options['host'], options['port']
+        else:
+            sink = SMTPSink(latency=options['latency_ms'] / 1000.0).start()
+            host, port = sink.host, sink.port
+        try:
+            with transaction.atomic():
+                self._run(options, host, port, sink)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            if sink:
+                sink.stop()
+
+    def _connection(self, host, port):
+        return get_connection(SMTP_BACKEND, host=host, port=port, username='', password='',
+                              use_tls=False, use_ssl=False, fail_silently=False)
+
+    def _run(self, options, host, port, sink):
+        n = options['subscribers']
+        Subscriber.objects.bulk_create(
+            [Subscriber(email=f'bench-{i}@example.invalid') for i in range(n)], batch_size=1000,
+        )
+        # Unsaved post: saving would fire the real notification signal.
+        post = Post(title='Benchmark post', slug='benchmark-post', author='bench', content='Lorem ipsum ' * 80)
+        audience = list(Subscriber.objects.filter(email__startswith='bench-').values_list('pk', flat=True))
+
+        before = sink.stats() if sink else None
+        dispatcher = PostNotificationDispatcher(
+            post, connection=self._connection(host, port),
+            batch_size=options['batch_size'], subscriber_ids=audience,
+        )
+        stats = dispatcher.send()
+        self._report('batched', stats['sent'], stats['seconds'], sink, before)
+
+        if options['legacy']:
+            before = sink.stats() if sink else None
+            started = time.perf_counter()
+            sent = 0
+            base = site_url()
+            for sid in audience:
+                s = Subscriber.objects.get(pk=sid, active=True)
+                ctx = {
+                    'title': post.title, 'excerpt': post.content[:300] + '...',
+                    'url': base + post.get_absolute_url(),
+                    'unsubscribe_url': base + reverse('blog:unsubscribe', args=[s.token]),
+                }
+                text_body = render_to_string('emails/post_notification.txt', ctx)
+                html_body = render_to_string('emails/post_notification.html', ctx)
+                sent += send_mail(f'New post: {post.title}', text_body, None, [s.email],
+                                  html_message=html_body, connection=self._connection(host, port))
+            self._report('per-recipient', sent, time.perf_counter() - started, sink, before)
+
+    def _report(self, label, sent, seconds, sink, before):
+        rate = sent / seconds if seconds else 0.0
+        line = f'{label:>14}: {sent} messages in {seconds:.2f}s ({rate:.0f} msg/s)'
+        if sink:
+            after = sink.stats()
+            line += f', {after["sessions"] - before["sessions"]} SMTP session(s)'
+        self.stdout.write(line)
@@ -0,0 +1,37 @@
+"""Stream the subscriber list to CSV or JSON Lines.
+
+Rows are read from the database in chunks and written as they arrive, so
+large lists never sit in memory.
+
+Usage:
+  python manage.py export_subscribers > subscribers.csv
+  python manage.py export_subscribers --format jsonl --active-only -o active.jsonl
+"""
+from django.core.management.base import BaseCommand
+
+from blog.audience import FORMATS, guess_format, write_export
+from blog.models import Subscriber
+
+
+class Command(BaseCommand):
+    help = 'Export blog/newsletter subscribers as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', default='-', help="File to write ('-' for stdout).")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Defaults to jsonl for .jsonl/.ndjson outputs, otherwise csv.')
+        parser.add_argument('--active-only', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        fmt = options['format'] or guess_format(path)
+        qs = Subscriber.objects.all()
+        if options['active_only']:
+            qs = qs.filter(active=True)
+        if path == '-':
+            self.stdout.ending = ''
+            count = write_export(self.stdout, fmt, qs)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as fh:
+                count = write_export(fh, fmt, qs)
+            self.stderr.write(f'Exported {count} subscriber(s) to {path}.')
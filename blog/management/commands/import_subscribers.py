@@ -0,0 +1,53 @@
+"""Bulk-import subscribers from CSV or JSON Lines.
+
+The file is read row by row; each batch costs one lookup query and one
+``bulk_create``. Existing addresses are left unchanged, so re-running an
+import is safe. Imported addresses are active unless the file says
+otherwise or ``--inactive`` is given (for lists that still need opt-in).
+
+Usage:
+  python manage.py import_subscribers subscribers.csv
+  python manage.py import_subscribers list.jsonl --batch-size 5000 --dry-run
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.audience import FORMATS, guess_format, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import blog/newsletter subscribers from CSV (with header) or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read ('-' for stdin).")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Defaults to jsonl for .jsonl/.ndjson files, otherwise csv.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--inactive', action='store_true',
+                            help='Import rows without an "active" column as inactive.')
+        parser.add_argument('--dry-run', action='store_true', help='Count only; write nothing.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        started = time.perf_counter()
+        kwargs = {
+            'batch_size': max(1, options['batch_size']),
+            'default_active': not options['inactive'],
+            'dry_run': options['dry_run'],
+        }
+        if path == '-':
+            stats = import_rows(read_rows(sys.stdin, fmt), **kwargs)
+        else:
+            try:
+                with open(path, encoding='utf-8-sig', newline='') as fh:
+                    stats = import_rows(read_rows(fh, fmt), **kwargs)
+            except OSError as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+        prefix = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['created']} new subscriber(s); {stats['existing']} already present, "
+            f"{stats['invalid']} invalid ({time.perf_counter() - started:.1f}s)."
+        ))
@@ -0,0 +1,54 @@
+"""Deliver queued email from the ``blog.OutboxEmail`` table.
+
+Runs until interrupted (SIGINT/SIGTERM finish the current batch first).
+Several workers can run at once; rows are claimed with
+``SELECT ... FOR UPDATE SKIP LOCKED`` on databases that support it.
+
+Usage:
+  python manage.py run_mail_worker
+  python manage.py run_mail_worker --once        # drain what is due, then exit
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.outbox import process_batch, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Send email queued in the outbox, retrying failures with exponential backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows claimed per batch (default OUTBOX_BATCH_SIZE).')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is due.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no rows are due instead of polling.')
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self._stop)
+            except ValueError:
+                # Not in the main thread (e.g. call_command from a test)
+                pass
+        worker = worker_id()
+        totals = {'sent': 0, 'failed': 0}
+        verbosity = options['verbosity']
+        while not self._stopping:
+            claimed, sent, failed = process_batch(options['batch_size'], worker=worker)
+            totals['sent'] += sent
+            totals['failed'] += failed
+            if claimed and verbosity > 1:
+                self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(f"Mail worker {worker} stopped: {totals['sent']} sent, {totals['failed']} failed")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
@@ -0,0 +1,29 @@
+"""Send the blog digest to subscribers who chose digest delivery.
+
+Covers every post published since the previous run, so schedule it at the
+digest period (e.g. weekly from cron or Render's cron jobs); with Celery
+beat the ``send_digest_task`` entry in ``CELERY_BEAT_SCHEDULE`` does the
+same.
+
+Usage:
+  python manage.py send_digest
+"""
+from django.core.management.base import BaseCommand
+
+from blog.digest import send_digest
+
+
+class Command(BaseCommand):
+    help = 'Email one digest of newly published posts to digest subscribers.'
+
+    def handle(self, *args, **options):
+        stats = send_digest()
+        if not stats['posts']:
+            self.stdout.write('No new posts since the last digest.')
+            return
+        if 'queued' in stats:
+            self.stdout.write(self.style.SUCCESS(f"Digest of {stats['posts']} post(s) queued for {stats['queued']} subscriber(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Digest of {stats['posts']} post(s) sent to {stats['sent']}/{stats['recipients']} subscriber(s)."
+            ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_subscriber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(blank=True, max_length=200, null=True, unique=True)),
+                ('recipients', models.JSONField(default=list)),
+                ('from_email', models.CharField(blank=True, max_length=254)),
+                ('reply_to', models.JSONField(blank=True, default=list)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('html_body', models.TextField(blank=True)),
+                ('template_name', models.CharField(blank=True, help_text='Rendered at delivery as <name>.txt / <name>.html when body is empty', max_length=200)),
+                ('context', models.JSONField(blank=True, default=dict)),
+                ('headers', models.JSONField(blank=True, default=dict)),
+                ('attachments', models.JSONField(blank=True, default=list, help_text="Stored files to attach: [{'name': storage name, 'filename': ...}]")),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='blog_outbox_status_a9fe72_idx')],
+            },
+        ),
+    ]
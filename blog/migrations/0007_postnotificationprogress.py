@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostNotificationProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0, help_text='Unsubscribed before their chunk was sent')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_progress', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'notification progress',
+                'verbose_name_plural': 'notification progress',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_postnotificationprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='delivery',
+            field=models.CharField(choices=[('immediate', 'Every new post'), ('digest', 'Weekly digest')], default='immediate', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DigestItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='digest_item', to='blog.post')),
+            ],
+            options={
+                'ordering': ['queued_at'],
+            },
+        ),
+    ]
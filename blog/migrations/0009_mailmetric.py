@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_subscriber_delivery_digestitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateTimeField(help_text='Start of the hour')),
+                ('kind', models.CharField(max_length=100)),
+                ('attempted', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('max_seconds', models.FloatField(default=0)),
+                ('histogram', models.JSONField(blank=True, default=dict)),
+                ('max_queue_depth', models.PositiveIntegerField(default=0)),
+                ('recent_errors', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'mail delivery metric',
+                'ordering': ['-period', 'kind'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'kind'), name='blog_mailmetric_period_kind')],
+            },
+        ),
+    ]
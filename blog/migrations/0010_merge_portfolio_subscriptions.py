@@ -0,0 +1,123 @@
+"""Fold ``portfolio.Subscription`` rows into ``blog.Subscriber``.
+
+Addresses are compared case-insensitively and stored lower-cased. When an
+address is on both lists the blog row (and its token) is kept; it becomes
+active if either row was active and keeps the earlier ``created_at``.
+Rows only on the portfolio list keep their token, so links already sent
+keep working.
+
+Reversing (together with portfolio 0044, which drops the old table and
+recreates it empty) copies every subscriber back to
+``portfolio.Subscription`` with its token and state. Which list an address
+originally came from is not recorded, so both lists then hold the merged
+audience; nobody is lost.
+"""
+import uuid
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower
+
+BATCH = 1000
+
+
+def _absorb(target, active, created_at):
+    changed = False
+    if active and not target.active:
+        target.active = True
+        changed = True
+    if created_at and created_at < target.created_at:
+        target.created_at = created_at
+        changed = True
+    return changed
+
+
+def normalise_blog_emails(Subscriber):
+    mixed = Subscriber.objects.annotate(lower=Lower('email')).exclude(email=F('lower')).order_by('pk')
+    for sub in mixed.iterator(chunk_size=BATCH):
+        lower = sub.email.lower()
+        twin = Subscriber.objects.filter(email=lower).first()
+        if twin is None:
+            sub.email = lower
+            sub.save(update_fields=['email'])
+        else:
+            if _absorb(twin, sub.active, sub.created_at):
+                twin.save(update_fields=['active', 'created_at'])
+            sub.delete()
+
+
+def merge_subscriptions(apps, schema_editor):
+    Subscriber = apps.get_model('blog', 'Subscriber')
+    Subscription = apps.get_model('portfolio', 'Subscription')
+    normalise_blog_emails(Subscriber)
+
+    batch = []
+
+    def flush(rows):
+        emails = {r.email.strip().lower() for r in rows}
+        existing = {s.email: s for s in Subscriber.objects.filter(email__in=emails)}
+        new, changed = {}, {}
+        for r in rows:
+            email = r.email.strip().lower()
+            target = existing.get(email) or new.get(email)
+            if target is None:
+                new[email] = Subscriber(
+                    email=email, active=r.active, created_at=r.created_at,
+                    token=r.token or uuid.uuid4(),
+                )
+            elif _absorb(target, r.active, r.created_at) and target.pk:
+                changed[target.pk] = target
+        Subscriber.objects.bulk_create(new.values(), batch_size=BATCH)
+        if changed:
+            Subscriber.objects.bulk_update(changed.values(), ['active', 'created_at'], batch_size=BATCH)
+
+    for row in Subscription.objects.order_by('pk').iterator(chunk_size=BATCH):
+        batch.append(row)
+        if len(batch) >= BATCH:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def split_subscriptions(apps, schema_editor):
+    Subscriber = apps.get_model('blog', 'Subscriber')
+    Subscription = apps.get_model('portfolio', 'Subscription')
+    batch = []
+
+    def flush(rows):
+        source = {r.email: r for r in rows}
+        # Rows still there (portfolio 0044 not applied) are left alone
+        known = set(
+            Subscription.objects.annotate(lower=Lower('email'))
+            .filter(lower__in=source).values_list('lower', flat=True)
+        )
+        Subscription.objects.bulk_create(
+            [Subscription(email=r.email, active=r.active, token=r.token) for r in rows if r.email not in known],
+            batch_size=BATCH,
+        )
+        # created_at is auto_now_add there, so it can only be set afterwards
+        copied = list(Subscription.objects.filter(email__in=set(source) - known))
+        for sub in copied:
+            sub.created_at = source[sub.email].created_at
+        Subscription.objects.bulk_update(copied, ['created_at'], batch_size=BATCH)
+
+    for row in Subscriber.objects.order_by('pk').iterator(chunk_size=BATCH):
+        batch.append(row)
+        if len(batch) >= BATCH:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_mailmetric'),
+        ('portfolio', '0043_mediablob'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_subscriptions, split_subscriptions),
+    ]
@@ -37,9 +37,19 @@ class Subscriber(models.Model):
     """A simple email subscriber for blog updates.
 
     We store a token so users can unsubscribe without authentication.
+    ``delivery`` picks an email per new post or a periodic digest
+    (see ``blog.digest``).
     """
+    IMMEDIATE = 'immediate'
+    DIGEST = 'digest'
+    DELIVERY_CHOICES = [
+        (IMMEDIATE, 'Every new post'),
+        (DIGEST, 'Weekly digest'),
+    ]
+
     email = models.EmailField(unique=True)
     active = models.BooleanField(default=True)
+    delivery = models.CharField(max_length=10, choices=DELIVERY_CHOICES, default=IMMEDIATE)
     token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
 
@@ -48,3 +58,123 @@ class Subscriber(models.Model):
 
     def __str__(self):
         return f"{self.email} ({'active' if self.active else 'unsubscribed'})"
+
+
+class DigestItem(models.Model):
+    """A published post waiting for the next digest email.
+
+    Queued on publish when any subscriber uses digest delivery; ``sent_at``
+    is set when a ``send_digest`` run picks it up.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='digest_item')
+    queued_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['queued_at']
+
+    def __str__(self):
+        return f"{self.post} ({'sent' if self.sent_at else 'queued'})"
+
+
+class PostNotificationProgress(models.Model):
+    """Delivery progress of the new-post email for one post.
+
+    Updated with ``F()`` increments after every batch, so chunks handled by
+    several Celery workers add up correctly. Shown inline on the Post admin.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='notification_progress')
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0, help_text="Unsubscribed before their chunk was sent")
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'notification progress'
+        verbose_name_plural = 'notification progress'
+
+    def __str__(self):
+        return f"{self.post}: {self.sent}/{self.total} sent"
+
+    @property
+    def remaining(self):
+        return max(0, self.total - self.sent - self.failed - self.skipped)
+
+
+class OutboxEmail(models.Model):
+    """An email waiting to be delivered by ``manage.py run_mail_worker``.
+
+    Rows are written instead of sending inline when ``USE_EMAIL_OUTBOX`` is
+    enabled (see ``blog.outbox``), so mail survives worker restarts and is
+    retried with exponential backoff. ``idempotency_key`` (for example
+    ``post:12:subscriber:34``) makes enqueueing the same logical email twice
+    a no-op.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    recipients = models.JSONField(default=list)
+    from_email = models.CharField(max_length=254, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    template_name = models.CharField(max_length=200, blank=True, help_text="Rendered at delivery as <name>.txt / <name>.html when body is empty")
+    context = models.JSONField(default=dict, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    attachments = models.JSONField(default=list, blank=True, help_text="Stored files to attach: [{'name': storage name, 'filename': ...}]")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class MailMetric(models.Model):
+    """Hourly delivery counters for one kind of email.
+
+    Written by ``blog.mailmetrics`` from each process's in-memory
+    aggregator; ``histogram`` maps latency bucket upper bounds (ms, or
+    ``+Inf``) to message counts.
+    """
+    period = models.DateTimeField(help_text="Start of the hour")
+    kind = models.CharField(max_length=100)
+    attempted = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    max_seconds = models.FloatField(default=0)
+    histogram = models.JSONField(default=dict, blank=True)
+    max_queue_depth = models.PositiveIntegerField(default=0)
+    recent_errors = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-period', 'kind']
+        constraints = [models.UniqueConstraint(fields=['period', 'kind'], name='blog_mailmetric_period_kind')]
+        verbose_name = 'mail delivery metric'
+
+    def __str__(self):
+        return f"{self.kind} @ {self.period:%Y-%m-%d %H:00}: {self.sent}/{self.attempted} sent"
@@ -0,0 +1,276 @@
+"""Durable, database-backed email outbox.
+
+With ``USE_EMAIL_OUTBOX = True`` every outgoing email is written to
+``blog.OutboxEmail`` instead of being sent from the request (or from a
+daemon thread that dies with the gunicorn worker). ``manage.py
+run_mail_worker`` then:
+
+  * claims due rows in batches with ``select_for_update(skip_locked=True)``,
+    so several workers can run side by side without sending a row twice;
+  * delivers a claimed batch over one SMTP connection;
+  * marks rows sent, or reschedules them with exponential backoff and
+    jitter until ``OUTBOX_MAX_ATTEMPTS`` is reached;
+  * reclaims rows left in ``sending`` by a worker that died
+    (``OUTBOX_LOCK_TIMEOUT``). Delivery is therefore at-least-once.
+
+Without the outbox, ``blog.utils.deliver_mail`` sends after commit from the
+background pool and only records the emails that failed (``send_or_record``)
+or that found the pool saturated (``record``), so the worker doubles as the
+retry queue.
+
+Rows carry an optional ``idempotency_key``; enqueueing a key that already
+exists returns the existing row instead of creating a duplicate.
+"""
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import mailmetrics
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_enabled():
+    return bool(getattr(settings, 'USE_EMAIL_OUTBOX', False))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def new_row(subject, body, recipients, from_email=None, html_body=None, template_name='', context=None,
+         idempotency_key=None, attachments=None, headers=None, reply_to=None):
+    return OutboxEmail(
+        idempotency_key=idempotency_key or None,
+        subject=subject[:255],
+        body=body or '',
+        html_body=html_body or '',
+        template_name=template_name or '',
+        context=context or {},
+        recipients=list(recipients),
+        from_email=from_email or '',
+        reply_to=list(reply_to or []),
+        headers=dict(headers or {}),
+        attachments=list(attachments or []),
+    )
+
+
+def enqueue(subject, body, recipients, **kwargs):
+    """Add one email to the outbox; returns ``(row, created)``.
+
+    ``kwargs`` are ``from_email``, ``html_body``, ``template_name``,
+    ``context``, ``idempotency_key``, ``attachments``, ``headers`` and
+    ``reply_to``.
+    """
+    row = new_row(subject, body, recipients, **kwargs)
+    if row.idempotency_key:
+        existing = OutboxEmail.objects.filter(idempotency_key=row.idempotency_key).first()
+        if existing:
+            return existing, False
+    try:
+        with transaction.atomic():
+            row.save()
+    except IntegrityError:
+        # Lost a race with another enqueue of the same key
+        return OutboxEmail.objects.get(idempotency_key=row.idempotency_key), False
+    return row, True
+
+
+def enqueue_many(rows, batch_size=500):
+    """Bulk-insert unsaved ``OutboxEmail`` rows, skipping duplicate keys."""
+    OutboxEmail.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+
+
+def message_fields(email_msg):
+    """``enqueue`` arguments for a built ``EmailMessage``/``EmailMultiAlternatives``."""
+    html_body = ''
+    for content, mimetype in getattr(email_msg, 'alternatives', None) or []:
+        if mimetype == 'text/html':
+            html_body = content
+    return (email_msg.subject, email_msg.body, email_msg.to), {
+        'from_email': email_msg.from_email, 'html_body': html_body,
+        'headers': email_msg.extra_headers, 'reply_to': email_msg.reply_to,
+    }
+
+
+def enqueue_message(email_msg, idempotency_key=None, attachments=None):
+    """Enqueue a built ``EmailMessage``/``EmailMultiAlternatives``.
+
+    In-memory attachments on the message are not persisted; pass stored
+    files as ``attachments`` (``[{'name': ..., 'filename': ...}]``) instead.
+    """
+    args, kwargs = message_fields(email_msg)
+    return enqueue(*args, idempotency_key=idempotency_key, attachments=attachments, **kwargs)
+
+
+def send_or_record(row, connection=None):
+    """Send an unsaved ``OutboxEmail`` now; returns True when it was sent.
+
+    If sending fails the row is saved as a pending retry (attempt 1, with
+    backoff), so ``run_mail_worker`` or the admin "retry" action picks it
+    up later instead of the email being lost.
+    """
+    started = time.perf_counter()
+    try:
+        connection = connection or get_connection(fail_silently=False)
+        if connection.send_messages([build_message(row, connection)]):
+            mailmetrics.record(mailmetrics.kind_for(row), time.perf_counter() - started, sent=1)
+            return True
+        error = 'backend reported 0 messages sent'
+    except Exception as exc:
+        error = exc
+    mailmetrics.record(mailmetrics.kind_for(row), time.perf_counter() - started, failed=1, error=error)
+    logger.warning('Email %r to %s failed, recorded for retry: %s', row.subject, ', '.join(row.recipients), error)
+    record(row, error, attempts=1)
+    return False
+
+
+def record(row, error='', attempts=0):
+    """Save an unsent ``OutboxEmail`` as pending for ``run_mail_worker``.
+
+    With ``attempts`` (a failed send) it waits out the backoff first;
+    otherwise it is due at once.
+    """
+    row.status = OutboxEmail.PENDING
+    row.attempts = attempts
+    row.next_attempt_at = timezone.now() + timedelta(seconds=backoff_delay(attempts) if attempts else 0)
+    row.last_error = str(error)[:2000]
+    try:
+        with transaction.atomic():
+            row.save()
+    except IntegrityError:
+        # The same idempotency key is already queued
+        pass
+    except Exception:
+        logger.exception('Could not record email %r', row.subject)
+
+
+# -- worker side -------------------------------------------------------------
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number ``attempts`` (1-based), with jitter."""
+    base = float(_setting('OUTBOX_BACKOFF_BASE', 30))
+    cap = float(_setting('OUTBOX_BACKOFF_MAX', 60 * 60))
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.75, 1.25)
+
+
+def claim_batch(limit, worker=None):
+    """Lock up to ``limit`` due rows for this worker and return them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=int(_setting('OUTBOX_LOCK_TIMEOUT', 10 * 60)))
+    due = Q(status=OutboxEmail.PENDING, next_attempt_at__lte=now) | Q(status=OutboxEmail.SENDING, locked_at__lt=stale)
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('next_attempt_at', 'pk')[:limit]
+        )
+        if rows:
+            OutboxEmail.objects.filter(pk__in=[r.pk for r in rows]).update(
+                status=OutboxEmail.SENDING, locked_at=now, locked_by=worker or worker_id(),
+                attempts=F('attempts') + 1,
+            )
+    for r in rows:
+        r.attempts += 1
+    return rows
+
+
+def build_message(row, connection=None):
+    body, html_body = row.body, row.html_body
+    if not body and row.template_name:
+        body = render_to_string(f'{row.template_name}.txt', row.context)
+        try:
+            html_body = render_to_string(f'{row.template_name}.html', row.context)
+        except Exception:
+            html_body = ''
+    msg = EmailMultiAlternatives(
+        row.subject, body, row.from_email or None, row.recipients,
+        connection=connection, headers=row.headers or None, reply_to=row.reply_to or None,
+    )
+    if html_body:
+        msg.attach_alternative(html_body, 'text/html')
+    for ref in row.attachments:
+        try:
+            with default_storage.open(ref['name'], 'rb') as fh:
+                msg.attach(ref.get('filename') or os.path.basename(ref['name']), fh.read(), ref.get('mimetype'))
+        except Exception:
+            logger.warning('Outbox %s: attachment %s is missing; sending without it', row.pk, ref.get('name'))
+    return msg
+
+
+def _mark_sent(row):
+    OutboxEmail.objects.filter(pk=row.pk).update(
+        status=OutboxEmail.SENT, sent_at=timezone.now(), locked_at=None, last_error='',
+    )
+
+
+def _mark_failed(row, error):
+    max_attempts = int(_setting('OUTBOX_MAX_ATTEMPTS', 8))
+    if row.attempts >= max_attempts:
+        status, next_at = OutboxEmail.FAILED, timezone.now()
+        logger.error('Outbox %s gave up after %d attempts: %s', row.pk, row.attempts, error)
+    else:
+        status, next_at = OutboxEmail.PENDING, timezone.now() + timedelta(seconds=backoff_delay(row.attempts))
+    OutboxEmail.objects.filter(pk=row.pk).update(
+        status=status, next_attempt_at=next_at, locked_at=None, last_error=str(error)[:2000],
+    )
+
+
+def deliver(rows, connection=None):
+    """Send claimed rows over one connection; returns ``(sent, failed)``."""
+    sent = failed = 0
+    if not rows:
+        return sent, failed
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for row in rows:
+            mailmetrics.record(mailmetrics.kind_for(row), 0.0, failed=1, error=exc)
+            _mark_failed(row, exc)
+        return 0, len(rows)
+    try:
+        for row in rows:
+            started = time.perf_counter()
+            try:
+                if connection.send_messages([build_message(row, connection)]):
+                    mailmetrics.record(mailmetrics.kind_for(row), time.perf_counter() - started, sent=1)
+                    _mark_sent(row)
+                    sent += 1
+                    continue
+                error = 'backend reported 0 messages sent'
+            except Exception as exc:
+                error = exc
+            mailmetrics.record(mailmetrics.kind_for(row), time.perf_counter() - started, failed=1, error=error)
+            _mark_failed(row, error)
+            failed += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return sent, failed
+
+
+def process_batch(batch_size=None, connection=None, worker=None):
+    """Claim and deliver one batch; returns ``(claimed, sent, failed)``."""
+    batch_size = batch_size or int(_setting('OUTBOX_BATCH_SIZE', 50))
+    rows = claim_batch(batch_size, worker=worker)
+    sent, failed = deliver(rows, connection=connection)
+    return len(rows), sent, failed
@@ -1,10 +1,14 @@
+import logging
+
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from .utils import async_send_mail
-from django.urls import reverse
 from django.conf import settings
-from django.template.loader import render_to_string
-from .models import Post, Subscriber
+from django.db import transaction
+from .digest import digest_enabled, queue_post
+from .dispatch import audience, dispatch_post_notification, send_notification_chunk, start_progress
+from .models import Post
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(pre_save, sender=Post)
@@ -23,83 +27,68 @@ def _capture_previous_published(sender, instance, **kwargs):
 @receiver(post_save, sender=Post)
 def notify_subscribers_on_publish(sender, instance, created, **kwargs):
     """When a post is newly created or changed from unpublished -> published,
-    notify active subscribers via email.
+    notify active subscribers via email. Subscribers on digest delivery
+    get the post in the next ``send_digest`` run instead (``blog.digest``).
+
+    Delivery is batched over one SMTP connection (see ``blog.dispatch``) and
+    runs on a Celery worker when enabled, otherwise on the shared background
+    pool (or inline with ``USE_EMAIL_THREADING=False``), once the saving
+    transaction has committed. With ``USE_EMAIL_OUTBOX`` the messages are
+    queued durably, in the same transaction as the post, for
+    ``run_mail_worker``.
     """
     was_published = getattr(instance, '_previous_published', False)
     now_published = bool(instance.published)
     # Only notify when published now and previously not published OR newly created and published
-    if now_published and (created or not was_published):
-        # Compose simple plaintext email for subscribers
-        subject = f"New post: {instance.title}"
-        post_url = ''
+    if not (now_published and (created or not was_published)):
+        return
+    if digest_enabled():
+        queue_post(instance)
+    if not audience().exists():
+        return
+
+    if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+        dispatch_post_notification(instance)
+        return
+
+    # Workers (Celery or the local pool) must see the committed post
+    transaction.on_commit(lambda: _schedule_notification(instance))
+
+
+def _schedule_notification(post):
+    if getattr(settings, 'USE_CELERY', False):
         try:
-            # Try to build full URL if SITE host is available in settings
-            host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
-            scheme = 'https' if not settings.DEBUG else 'http'
-            post_url = f"{scheme}://{host}{instance.get_absolute_url()}"
+            from .tasks import send_notifications_task
         except Exception:
-            post_url = instance.get_absolute_url()
-        # Send individualized emails so we can include an unsubscribe link per recipient
-        subs_qs = Subscriber.objects.filter(active=True).values_list('id', flat=True)
-        subs = list(subs_qs)
-        if not subs:
+            # Celery missing: deliver locally below
+            send_notifications_task = None
+        if send_notifications_task is not None:
+            _schedule_chunks(post, send_notifications_task)
             return
-        # If Celery is enabled, dispatch batches of subscriber ids to the worker
+
+    def _dispatch():
         try:
-            from django.conf import settings as _settings
-            use_celery = getattr(_settings, 'USE_CELERY', False)
-            batch_size = int(getattr(_settings, 'POST_NOTIFICATION_BATCH_SIZE', 50))
+            dispatch_post_notification(post)
         except Exception:
-            use_celery = False
-            batch_size = 50
+            logger.exception('Post notification for %s failed', post.pk)
+
+    if getattr(settings, 'USE_EMAIL_THREADING', True):
+        from .mailpool import submit
+        submit(_dispatch)
+    else:
+        _dispatch()
 
-        if use_celery:
-            try:
-                from .tasks import send_notifications_task
-                # Chunk subscriber ids and schedule tasks
-                for i in range(0, len(subs), batch_size):
-                    chunk = subs[i:i+batch_size]
-                    try:
-                        send_notifications_task.delay(instance.pk, list(chunk))
-                    except Exception:
-                        # If scheduling fails, fall back to immediate send for this chunk
-                        from django.apps import apps as _apps
-                        SubscriberModel = _apps.get_model('blog', 'Subscriber')
-                        for sid in chunk:
-                            try:
-                                s = SubscriberModel.objects.get(pk=sid, active=True)
-                                unsubscribe_path = reverse('blog:unsubscribe', args=[s.token])
-                                host = _settings.ALLOWED_HOSTS[0] if _settings.ALLOWED_HOSTS else ''
-                                scheme = 'https' if not _settings.DEBUG else 'http'
-                                unsubscribe_url = f"{scheme}://{host}{unsubscribe_path}" if host else unsubscribe_path
-                                excerpt = (instance.content[:300] + '...') if instance.content else ''
-                                text_body = render_to_string('emails/post_notification.txt', {'title': instance.title, 'excerpt': excerpt, 'url': post_url, 'unsubscribe_url': unsubscribe_url})
-                                html_body = render_to_string('emails/post_notification.html', {'title': instance.title, 'excerpt': excerpt, 'url': post_url, 'unsubscribe_url': unsubscribe_url})
-                                async_send_mail(subject, text_body, _settings.DEFAULT_FROM_EMAIL, [s.email], fail_silently=True, html_message=html_body)
-                            except Exception:
-                                continue
-            except Exception:
-                # If importing task failed, fall back to local send below
-                use_celery = False
 
-        if not use_celery:
-            # Local threaded sending per recipient (safe for small lists)
-            from django.apps import apps as _apps
-            SubscriberModel = _apps.get_model('blog', 'Subscriber')
-            for sid in subs:
-                try:
-                    s = SubscriberModel.objects.get(pk=sid, active=True)
-                    unsubscribe_path = reverse('blog:unsubscribe', args=[s.token])
-                    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
-                    scheme = 'https' if not settings.DEBUG else 'http'
-                    unsubscribe_url = f"{scheme}://{host}{unsubscribe_path}" if host else unsubscribe_path
-                    excerpt = (instance.content[:300] + '...') if instance.content else ''
-                    try:
-                        text_body = render_to_string('emails/post_notification.txt', {'title': instance.title, 'excerpt': excerpt, 'url': post_url, 'unsubscribe_url': unsubscribe_url})
-                        html_body = render_to_string('emails/post_notification.html', {'title': instance.title, 'excerpt': excerpt, 'url': post_url, 'unsubscribe_url': unsubscribe_url})
-                    except Exception:
-                        text_body = f"{instance.title}\n\n{excerpt}\n\nRead more: {post_url}\n\nTo unsubscribe: {unsubscribe_url}"
-                        html_body = None
-                    async_send_mail(subject, text_body, settings.DEFAULT_FROM_EMAIL, [s.email], fail_silently=True, html_message=html_body)
-                except Exception:
-                    continue
+def _schedule_chunks(post, task):
+    """Fan the audience out to Celery in POST_NOTIFICATION_BATCH_SIZE chunks."""
+    ids = list(audience().order_by('pk').values_list('pk', flat=True))
+    start_progress(post, len(ids))
+    size = max(1, int(getattr(settings, 'POST_NOTIFICATION_BATCH_SIZE', 50)))
+    for i in range(0, len(ids), size):
+        chunk = ids[i:i + size]
+        try:
+            task.delay(post.pk, chunk)
+        except Exception:
+            # Broker unreachable: send this chunk from the local pool instead
+            from .mailpool import submit
+            submit(send_notification_chunk, post, chunk)
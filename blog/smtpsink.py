@@ -0,0 +1,99 @@
+"""A minimal in-process SMTP sink for delivery benchmarks and tests.
+
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+Django's SMTP backend, discards message bodies and counts sessions,
+messages and recipients. ``latency`` adds a per-command delay to mimic a
+remote relay. Not for production use.
+
+    with SMTPSink() as sink:
+        connection = get_connection('django.core.mail.backends.smtp.EmailBackend',
+                                    host=sink.host, port=sink.port)
+        ...
+        sink.stats()
+"""
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        sink._count('sessions')
+        self.reply('220 localhost SMTP sink ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode('latin-1').strip().split(' ', 1)[0].upper()
+            if cmd == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n')
+                self.reply('250 8BITMIME')
+            elif cmd in ('HELO', 'MAIL', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif cmd == 'RCPT':
+                sink._count('recipients')
+                self.reply('250 OK')
+            elif cmd == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data)
+                sink._count('messages')
+                sink._count('bytes', size)
+                self.reply('250 OK queued')
+            elif cmd == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Run an SMTP sink on ``host:port`` (port 0 picks a free port)."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self._lock = threading.Lock()
+        self._stats = {'sessions': 0, 'messages': 0, 'recipients': 0, 'bytes': 0}
+        self.server = _Server((host, port), _SMTPHandler)
+        self.server.sink = self
+        self.server.latency = latency
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = None
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
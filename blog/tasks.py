@@ -4,73 +4,67 @@ This module defines a Celery task `send_email_task` only when Celery is
 installed. The rest of the code imports this module optionally and falls
 back to threaded delivery when Celery is not available.
 """
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
 try:
     from celery import shared_task
     from django.core.mail import send_mail
     from django.conf import settings
 
     @shared_task
-    def send_email_task(subject, message, from_email, recipient_list, html_message=None):
+    def send_email_task(subject, message, from_email, recipient_list, html_message=None, template=None):
+        from . import mailmetrics
+        kind = template or 'celery'
+        started = time.perf_counter()
         try:
             # Use Django's send_mail which supports html_message
-            send_mail(subject, message, from_email, recipient_list, html_message=html_message, fail_silently=True)
-        except Exception:
-            # Avoid raising from background task
+            send_mail(subject, message, from_email, recipient_list, html_message=html_message, fail_silently=False)
+        except Exception as exc:
+            # Avoid raising from background task, but count and log it
+            mailmetrics.record(kind, time.perf_counter() - started, failed=1, error=exc)
+            logger.exception('Celery email %r to %s failed', subject, recipient_list)
             return False
+        mailmetrics.record(kind, time.perf_counter() - started, sent=1)
         return True
     @shared_task
-    def send_notifications_task(post_id, subscriber_ids):
-        """Background task: send personalized notifications for a post to a list of subscriber ids.
+    def send_notifications_task(post_id, subscriber_ids=None):
+        """Background task: send the notification for a post to a chunk of subscribers.
 
-        This task loads the Post and Subscriber objects and sends individualized
-        emails including unsubscribe links. It is intended to run on a worker.
+        The chunk is loaded with ``in_bulk`` and sent over one SMTP connection
+        at no more than ``POST_NOTIFICATION_RATE_LIMIT`` messages/second;
+        counters on ``PostNotificationProgress`` are updated after every batch.
+        Without ``subscriber_ids`` all active subscribers are notified.
         """
         try:
             from django.apps import apps
-            from django.template.loader import render_to_string
+            from .dispatch import dispatch_post_notification, send_notification_chunk
             Post = apps.get_model('blog', 'Post')
-            Subscriber = apps.get_model('blog', 'Subscriber')
             post = Post.objects.get(pk=post_id)
         except Exception:
+            logger.exception('Post %s for notification could not be loaded', post_id)
             return False
-        # Build post_url safely
         try:
-            from django.conf import settings as _settings
-            host = _settings.ALLOWED_HOSTS[0] if _settings.ALLOWED_HOSTS else ''
-            scheme = 'https' if not _settings.DEBUG else 'http'
-            post_url = f"{scheme}://{host}{post.get_absolute_url()}" if host else post.get_absolute_url()
+            if subscriber_ids is None:
+                dispatch_post_notification(post)
+            else:
+                send_notification_chunk(post, subscriber_ids)
         except Exception:
-            post_url = post.get_absolute_url()
-
-        for sid in subscriber_ids:
-            try:
-                sub = Subscriber.objects.get(pk=sid, active=True)
-                unsubscribe_path = f"/blog/unsubscribe/{sub.token}/"
-                unsubscribe_url = f"{scheme}://{host}{unsubscribe_path}" if host else unsubscribe_path
-                excerpt = (post.content[:300] + '...') if post.content else ''
-                try:
-                    text_body = render_to_string('emails/post_notification.txt', {
-                        'title': post.title,
-                        'excerpt': excerpt,
-                        'url': post_url,
-                        'unsubscribe_url': unsubscribe_url,
-                    })
-                    html_body = render_to_string('emails/post_notification.html', {
-                        'title': post.title,
-                        'excerpt': excerpt,
-                        'url': post_url,
-                        'unsubscribe_url': unsubscribe_url,
-                    })
-                except Exception:
-                    text_body = f"{post.title}\n\n{excerpt}\n\nRead more: {post_url}\n\nTo unsubscribe: {unsubscribe_url}"
-                    html_body = None
-                try:
-                    send_mail(f"New post: {post.title}", text_body, _settings.DEFAULT_FROM_EMAIL, [sub.email], html_message=html_body, fail_silently=True)
-                except Exception:
-                    continue
-            except Exception:
-                continue
+            logger.exception('Post %s notification task failed', post_id)
+            return False
         return True
+
+    @shared_task
+    def send_digest_task():
+        """Periodic task (see ``CELERY_BEAT_SCHEDULE``): send the blog digest."""
+        from .digest import send_digest
+        try:
+            return send_digest()
+        except Exception:
+            logger.exception('Blog digest task failed')
+            return False
 except Exception:
     # Celery not installed — define a dummy function for safe importing
     def send_email_task(*args, **kwargs):
@@ -1,8 +1,11 @@
-import threading
-from django.core.mail import send_mail
+import logging
+
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
 
+logger = logging.getLogger(__name__)
+
 _USE_CELERY = getattr(settings, 'USE_CELERY', False)
 _celery_send = None
 if _USE_CELERY:
@@ -12,34 +15,109 @@ if _USE_CELERY:
         _celery_send = None
 
 
-def async_send_mail(subject, message, from_email, recipient_list, fail_silently=True, html_message=None):
-    """Send email either synchronously or on a background thread depending
-    on settings.USE_EMAIL_THREADING. This is a small, safe helper suitable for
-    low-volume sites; for larger lists use a real task queue (Celery/RQ).
+def _enqueue(subject, message, from_email, recipient_list, html_message=None, idempotency_key=None, fail_silently=True, attachments=None, template=None, **kwargs):
+    try:
+        from .outbox import enqueue
+        enqueue(subject, message, recipient_list, from_email=from_email, html_body=html_message,
+                idempotency_key=idempotency_key, attachments=attachments, template_name=template, **kwargs)
+        return True
+    except Exception:
+        if not fail_silently:
+            raise
+        logger.exception('Could not queue email %r', subject)
+        return False
+
+
+def _send_in_background(row):
+    """Send an unsaved outbox row on the bounded pool (or inline with
+    ``USE_EMAIL_THREADING=False``); failures are saved for retry.
+
+    This runs on the request thread, so a saturated pool never makes it
+    send: the row goes to the outbox for ``run_mail_worker`` instead.
+    """
+    from .outbox import record, send_or_record
+    if getattr(settings, 'USE_EMAIL_THREADING', True):
+        from .mailpool import offer
+        if not offer(send_or_record, row):
+            record(row, 'background email queue full')
+    else:
+        send_or_record(row)
+
+
+def _deliver(row, fail_silently):
+    try:
+        transaction.on_commit(lambda: _send_in_background(row))
+        return True
+    except Exception:
+        if not fail_silently:
+            raise
+        logger.exception('Could not schedule email %r', row.subject)
+        return False
+
+
+def deliver_mail(subject, message, from_email, recipient_list, fail_silently=False, html_message=None, idempotency_key=None, attachments=None, template=None):
+    """Drop-in for ``django.core.mail.send_mail`` that never makes the caller
+    wait for SMTP.
+
+    With ``USE_EMAIL_OUTBOX`` the email is written to the durable outbox in
+    the current transaction. Otherwise it is sent once the transaction
+    commits (nothing goes out if it rolls back), on the background pool;
+    a failed send is saved to the outbox for ``run_mail_worker`` to retry.
+    ``idempotency_key`` suppresses duplicate queued sends and
+    ``attachments`` are stored-file references (see ``blog.outbox``).
+    ``template`` names the template the body came from; it labels the
+    email in ``blog.mailmetrics``.
+    ``fail_silently`` only covers errors while scheduling the email.
+    """
+    if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+        return _enqueue(subject, message, from_email, recipient_list, html_message, idempotency_key, fail_silently, attachments, template)
+    from .outbox import new_row
+    row = new_row(subject, message, recipient_list, from_email=from_email, html_body=html_message,
+                  idempotency_key=idempotency_key, attachments=attachments, template_name=template)
+    return _deliver(row, fail_silently)
+
+
+def deliver_message(email_msg, idempotency_key=None, attachments=None, fail_silently=False):
+    """``deliver_mail`` for a built ``EmailMessage``/``EmailMultiAlternatives``.
+
+    In-memory attachments on the message are dropped; pass stored files as
+    ``attachments`` so they are read when the email is actually sent.
+    """
+    from .outbox import message_fields, new_row
+    args, kwargs = message_fields(email_msg)
+    if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+        subject, body, to = args
+        return _enqueue(subject, body, kwargs.pop('from_email'), to, kwargs.pop('html_body'),
+                        idempotency_key, fail_silently, attachments, **kwargs)
+    return _deliver(new_row(*args, idempotency_key=idempotency_key, attachments=attachments, **kwargs), fail_silently)
+
+
+def async_send_mail(subject, message, from_email, recipient_list, fail_silently=True, html_message=None, idempotency_key=None, template=None):
+    """Send email in the background, after the current transaction commits.
+
+    Uses the Celery task when ``USE_CELERY`` is set (falling back to the
+    local pool if the broker is unreachable), the durable outbox with
+    ``USE_EMAIL_OUTBOX``, and otherwise ``deliver_mail``.
     """
+    if getattr(settings, 'USE_EMAIL_OUTBOX', False):
+        return _enqueue(subject, message, from_email, recipient_list, html_message, idempotency_key, fail_silently, template=template)
+
     # Prefer Celery if configured and available
     if _USE_CELERY and _celery_send is not None:
-        try:
-            # schedule the celery task; pass html_message as the last arg
-            _celery_send.delay(subject, message, from_email, recipient_list, html_message)
-            return True
-        except Exception:
-            # Fall back to threading if Celery fails
-            pass
+        from .outbox import new_row
+        row = new_row(subject, message, recipient_list, from_email=from_email, html_body=html_message,
+                      idempotency_key=idempotency_key, template_name=template)
 
-    if getattr(settings, 'USE_EMAIL_THREADING', True):
-        def _send():
+        def _schedule():
             try:
-                send_mail(subject, message, from_email, recipient_list, fail_silently=fail_silently, html_message=html_message)
+                _celery_send.delay(subject, message, from_email, recipient_list, html_message, template)
             except Exception:
-                # Intentionally swallow errors here to avoid crashing signals/views
-                pass
-        t = threading.Thread(target=_send, daemon=True)
-        t.start()
+                # Fall back to the local pool if Celery fails
+                logger.warning('Celery unavailable; sending %r locally', subject, exc_info=True)
+                _send_in_background(row)
+
+        transaction.on_commit(_schedule)
         return True
-    else:
-        try:
-            send_mail(subject, message, from_email, recipient_list, fail_silently=fail_silently)
-            return True
-        except Exception:
-            return False
+
+    return deliver_mail(subject, message, from_email, recipient_list, fail_silently=fail_silently,
+                        html_message=html_message, idempotency_key=idempotency_key, template=template)
@@ -5,6 +5,7 @@ from .models import Post, Subscriber
 from django.utils.text import slugify
 from django.views.decorators.cache import cache_page
 from django.conf import settings
+from .emails import compiled_email
 from .utils import async_send_mail
 from django.urls import reverse
 
@@ -51,8 +52,11 @@ def subscribe(request):
         if email:
             subscriber, created = Subscriber.objects.get_or_create(email=email)
             if subscriber.active:
-                # Already active
+                # Already active; delivery changes go through the manage link
                 return render(request, 'blog/subscribe_success.html', {'email': subscriber.email})
+            delivery = request.POST.get('delivery')
+            if delivery in dict(Subscriber.DELIVERY_CHOICES):
+                subscriber.delivery = delivery
             # Ensure token exists
             if not getattr(subscriber, 'token', None):
                 import uuid as _uuid
@@ -60,23 +64,20 @@ def subscribe(request):
             subscriber.active = False
             subscriber.save()
             # Send confirmation email with token link
+            confirm_url = request.build_absolute_uri(reverse('blog:subscribe_confirm', kwargs={'token': str(subscriber.token)}))
             try:
-                confirm_url = request.build_absolute_uri(reverse('blog:subscribe_confirm', kwargs={'token': str(subscriber.token)}))
-                ctx = {'confirm_url': confirm_url}
-                from django.template.loader import render_to_string
-                text_body = render_to_string('emails/subscribe_confirm.txt', ctx)
-                html_body = render_to_string('emails/subscribe_confirm.html', ctx)
+                text_body, html_body = compiled_email('emails/subscribe_confirm', fields=('confirm_url',)).render(confirm_url=confirm_url)
             except Exception:
-                text_body = f"Please confirm your subscription: {request.build_absolute_uri(reverse('blog:subscribe_confirm', kwargs={'token': str(subscriber.token)}))}"
+                text_body = f"Please confirm your subscription: {confirm_url}"
                 html_body = None
             try:
-                async_send_mail('Confirm your subscription', text_body, settings.DEFAULT_FROM_EMAIL, [subscriber.email], fail_silently=True, html_message=html_body)
+                async_send_mail('Confirm your subscription', text_body, settings.DEFAULT_FROM_EMAIL, [subscriber.email], fail_silently=True, html_message=html_body, template='emails/subscribe_confirm')
             except Exception:
                 pass
             return render(request, 'blog/subscribe_success.html', {'email': subscriber.email})
         else:
             message = 'Please provide a valid email address.'
-    return render(request, 'blog/subscribe.html', {'message': message})
+    return render(request, 'blog/subscribe.html', {'message': message, 'delivery_choices': Subscriber.DELIVERY_CHOICES})
 
 
 def subscribe_confirm(request, token):
@@ -115,16 +116,14 @@ def manage_subscription(request):
                 import uuid as _uuid
                 sub.token = _uuid.uuid4()
                 sub.save()
+            manage_url = request.build_absolute_uri(reverse('blog:manage_subscription_token', kwargs={'token': sub.token}))
             try:
-                manage_url = request.build_absolute_uri(reverse('blog:manage_subscription_token', kwargs={'token': sub.token}))
-                from django.template.loader import render_to_string
-                text_body = render_to_string('emails/manage_subscription.txt', {'manage_url': manage_url})
-                html_body = render_to_string('emails/manage_subscription.html', {'manage_url': manage_url})
+                text_body, html_body = compiled_email('emails/manage_subscription', fields=('manage_url',)).render(manage_url=manage_url)
             except Exception:
                 text_body = f'Manage your subscription: {manage_url}'
                 html_body = None
             try:
-                async_send_mail('Manage your subscription', text_body, settings.DEFAULT_FROM_EMAIL, [sub.email], fail_silently=True, html_message=html_body)
+                async_send_mail('Manage your subscription', text_body, settings.DEFAULT_FROM_EMAIL, [sub.email], fail_silently=True, html_message=html_body, template='emails/manage_subscription')
             except Exception:
                 pass
             return render(request, 'blog/manage_sent.html', {'email': sub.email})
@@ -136,17 +135,25 @@ def manage_subscription(request):
 def manage_subscription_token(request, token):
     """Show subscription status for a token and allow unsubscribe.
 
-    GET shows status, POST unsubscribes the subscriber.
+    GET shows status. POST with ``delivery`` switches between an email per
+    post and the digest; any other POST unsubscribes the subscriber.
     """
     try:
         sub = Subscriber.objects.get(token=token)
     except Subscriber.DoesNotExist:
         return render(request, 'blog/unsubscribe_invalid.html')
+    ctx = {'subscriber': sub, 'delivery_choices': Subscriber.DELIVERY_CHOICES}
     if request.method == 'POST':
+        delivery = request.POST.get('delivery')
+        if delivery in dict(Subscriber.DELIVERY_CHOICES):
+            sub.delivery = delivery
+            sub.save(update_fields=['delivery'])
+            ctx['message'] = f'Delivery updated: {sub.get_delivery_display().lower()}.'
+            return render(request, 'blog/manage_dashboard.html', ctx)
         sub.active = False
         sub.save()
         return render(request, 'blog/unsubscribe_success.html', {'email': sub.email})
-    return render(request, 'blog/manage_dashboard.html', {'subscriber': sub})
+    return render(request, 'blog/manage_dashboard.html', ctx)
 
 
 def unsubscribe(request, token):
@@ -0,0 +1,44 @@
+"""Gunicorn settings picked up automatically from the project root.
+
+Only hooks live here; bind/workers stay on the command line (see Procfile).
+"""
+
+
+def on_starting(server):
+    # Drop the previous run's worker snapshots (myportfolio.metrics) so
+    # /metrics starts from zero with the new master
+    import os
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        from myportfolio.metrics import clear_dir
+        clear_dir(directory)
+
+
+def worker_exit(server, worker):
+    # Let queued background email finish while the worker is still inside
+    # gunicorn's graceful shutdown window. blog.mailpool's atexit hook covers
+    # runserver and management commands; running it twice is harmless.
+    try:
+        from blog.mailpool import shutdown_mail_executor
+        shutdown_mail_executor()
+    except Exception:
+        pass
+    # Write this worker's unflushed mail metrics (blog.mailmetrics)
+    try:
+        from blog.mailmetrics import flush
+        flush()
+    except Exception:
+        pass
+    # Write this worker's final request/email counters for /metrics
+    try:
+        from myportfolio.metrics import flush as flush_metrics
+        flush_metrics()
+    except Exception:
+        pass
+    # Write out queued log records (myportfolio.logqueue) last, so anything
+    # logged above still makes it
+    try:
+        from myportfolio.logqueue import stop
+        stop()
+    except Exception:
+        pass
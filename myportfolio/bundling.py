@@ -0,0 +1,321 @@
+"""Build-time JS/CSS bundling, minification and critical-CSS extraction.
+
+Run from ``NonStrictManifestStaticFilesStorage.post_process`` during
+``collectstatic``. For every entry in ``STATIC_BUNDLES`` (``DEFAULT_BUNDLES``
+unless settings override it) the source files are concatenated and minified
+into ``bundles/<name>.js`` / ``bundles/<name>.css``; for every template in
+``CRITICAL_CSS_TEMPLATES`` (``DEFAULT_CRITICAL_TEMPLATES``) the
+rules of ``CRITICAL_CSS_SOURCE`` that match the above-the-fold markup
+(``base.html`` up to the content block, the page's hero block and the start
+of its content block) are written to ``critical/<template>.css``. The
+generated files are then hashed, compressed and recorded in the manifest
+like any other static file, and ``site_extras.bundle_js`` /
+``site_extras.bundle_css`` reference them by logical name.
+
+The minifiers are deliberately conservative (no renaming, newlines kept in
+JS so automatic semicolon insertion behaves exactly as before).
+"""
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+# Each page loads a single script: the site-wide code followed by its own.
+DEFAULT_BUNDLES = {
+    'site': {'css': ['css/styles.css'], 'js': ['js/main.js']},
+    'home': {'js': ['js/main.js', 'js/home.js']},
+    'gallery': {'js': ['js/main.js', 'js/lightbox.js']},
+    'projects': {'js': ['js/main.js', 'js/projects.js']},
+    'contact': {'js': ['js/main.js', 'js/contact.js']},
+}
+DEFAULT_CRITICAL_TEMPLATES = (
+    'home.html', 'about.html', 'projects.html', 'project.html', 'contact.html',
+    'gallery.html', 'services.html', 'service.html', 'testimonials.html',
+    'blog/post_list.html', 'blog/post_detail.html',
+)
+# Elements/selectors that are always above the fold.
+ALWAYS_CRITICAL = {'*', 'html', 'body', ':root', 'a', 'img', 'svg', 'main', 'header', 'nav'}
+
+
+def bundle_config():
+    return getattr(settings, 'STATIC_BUNDLES', DEFAULT_BUNDLES)
+
+
+def bundle_name(name, kind):
+    return f'bundles/{name}.{kind}'
+
+
+def critical_name(template_name):
+    return 'critical/' + re.sub(r'\.html?$', '', template_name) + '.css'
+
+
+# -- minifiers ---------------------------------------------------------------
+
+def minify_css(source):
+    """Strip comments and insignificant whitespace from a stylesheet."""
+    out, strings = [], []
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in '"\'':
+            j = i + 1
+            while j < n and source[j] != ch:
+                j += 2 if source[j] == '\\' else 1
+            # Set aside so the whitespace rules below never reach inside
+            out.append(f'\0{len(strings)}\0')
+            strings.append(source[i:j + 1])
+            i = j + 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(ch)
+            i += 1
+    css = ''.join(out)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # "a: b" -> "a:b" only inside declarations (never touch selector pseudo-classes)
+    css = re.sub(r'(?<=[{;])([-\w]+)\s*:\s*', r'\1:', css)
+    css = css.replace(';}', '}')
+    return re.sub(r'\0(\d+)\0', lambda m: strings[int(m.group(1))], css.strip())
+
+
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'yield', 'await')
+
+
+def _regex_allowed(out):
+    """Whether a '/' at this point starts a regex literal rather than division."""
+    text = ''.join(out[-16:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _REGEX_PRECEDERS:
+        return True
+    return any(re.search(rf'(?:^|[^\w$]){kw}$', text) for kw in _REGEX_KEYWORDS)
+
+
+def minify_js(source):
+    """Remove comments, indentation and blank lines from JavaScript.
+
+    Strings, template literals and regex literals are copied verbatim.
+    Line breaks are preserved so statement boundaries never change.
+    """
+    out = []
+    i, n = 0, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in '"\'`':
+            j = i + 1
+            while j < n and source[j] != ch:
+                j += 2 if source[j] == '\\' else 1
+            out.append(source[i:j + 1])
+            i = j + 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            chunk = source[i:n if end == -1 else end + 2]
+            out.append('\n' if '\n' in chunk else ' ')
+            i = n if end == -1 else end + 2
+        elif ch == '/' and _regex_allowed(out):
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n':
+                c = source[j]
+                if c == '\\':
+                    j += 2
+                    continue
+                if c == '[':
+                    in_class = True
+                elif c == ']':
+                    in_class = False
+                elif c == '/' and not in_class:
+                    break
+                j += 1
+            j += 1
+            while j < n and (source[j].isalnum() or source[j] == '_'):
+                j += 1  # flags
+            out.append(source[i:j])
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+# -- critical CSS ------------------------------------------------------------
+
+def _split_rules(css):
+    """Split minified CSS into (prelude, body) pairs at the top nesting level."""
+    rules, depth, start, prelude = [], 0, 0, None
+    i, n = 0, len(css)
+    while i < n:
+        ch = css[i]
+        if ch in '"\'':
+            j = i + 1
+            while j < n and css[j] != ch:
+                j += 2 if css[j] == '\\' else 1
+            i = j + 1
+            continue
+        if ch == '{':
+            if depth == 0:
+                prelude = css[start:i].strip()
+                start = i + 1
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[start:i]))
+                start = i + 1
+        elif ch == ';' and depth == 0:
+            # at-rule statement such as @import/@charset
+            rules.append((css[start:i].strip(), None))
+            start = i + 1
+        i += 1
+    return rules
+
+
+def _strip_template_syntax(html):
+    return re.sub(r'{%.*?%}|{{.*?}}|{#.*?#}', ' ', html, flags=re.S)
+
+
+def markup_tokens(html):
+    """Collect the tag names, classes and ids used in a chunk of markup."""
+    html = _strip_template_syntax(html)
+    tags = {t.lower() for t in re.findall(r'<([a-zA-Z][a-zA-Z0-9-]*)', html)}
+    classes, ids = set(), set()
+    for value in re.findall(r'\bclass\s*=\s*["\']([^"\']*)["\']', html):
+        classes.update(value.split())
+    for value in re.findall(r'\bid\s*=\s*["\']([^"\']*)["\']', html):
+        ids.update(value.split())
+    return tags, classes, ids
+
+
+def _selector_matches(selector, tags, classes, ids):
+    sel = selector.strip()
+    if not sel:
+        return False
+    if sel in ALWAYS_CRITICAL:
+        return True
+    # Pseudo-elements/classes and attribute selectors don't decide visibility.
+    bare = re.sub(r'::?[-\w]+(\([^)]*\))?|\[[^\]]*\]', '', sel)
+    for cls in re.findall(r'\.([-\w]+)', bare):
+        if cls not in classes:
+            return False
+    for ident in re.findall(r'#([-\w]+)', bare):
+        if ident not in ids:
+            return False
+    for tag in re.findall(r'(?:^|[\s>+~])([a-zA-Z][a-zA-Z0-9]*)', bare):
+        tag = tag.lower()
+        if tag not in tags and tag not in ALWAYS_CRITICAL:
+            return False
+    return True
+
+
+def extract_critical_css(css, html):
+    """Return the subset of ``css`` whose selectors match ``html``."""
+    tags, classes, ids = markup_tokens(html)
+    css = minify_css(css)
+    kept, animations = [], set()
+
+    def keep_rules(rules):
+        result = []
+        for prelude, body in rules:
+            if body is None:
+                if prelude.startswith('@import') or prelude.startswith('@charset'):
+                    result.append(prelude + ';')
+                continue
+            if prelude.startswith('@media') or prelude.startswith('@supports'):
+                inner = keep_rules(_split_rules(body))
+                if inner:
+                    result.append(f'{prelude}{{{"".join(inner)}}}')
+            elif prelude.startswith('@keyframes') or prelude.startswith('@-webkit-keyframes'):
+                continue
+            elif prelude.startswith('@'):
+                result.append(f'{prelude}{{{body}}}')
+            elif any(_selector_matches(s, tags, classes, ids) for s in prelude.split(',')):
+                animations.update(re.findall(r'animation(?:-name)?:\s*([-\w]+)', body))
+                result.append(f'{prelude}{{{body}}}')
+        return result
+
+    kept = keep_rules(_split_rules(css))
+    # Keyframes referenced by kept rules must come along.
+    for prelude, body in _split_rules(css):
+        if body is not None and prelude.startswith('@keyframes'):
+            if prelude.split(None, 1)[-1].strip() in animations:
+                kept.append(f'{prelude}{{{body}}}')
+    return ''.join(kept)
+
+
+def _block(source, name):
+    m = re.search(r'{%\s*block\s+' + name + r'\s*%}(.*?){%\s*endblock', source, re.S)
+    return m.group(1) if m else ''
+
+
+def _inline_includes(source, read_template):
+    def repl(m):
+        try:
+            return read_template(m.group(1))
+        except Exception:
+            return ''
+    return re.sub(r'{%\s*include\s+["\']([^"\']+)["\']', repl, source)
+
+
+def above_the_fold(template_name, read_template, content_chars=None):
+    """Markup rendered above the fold for a top-level template (approximate)."""
+    content_chars = content_chars or int(getattr(settings, 'CRITICAL_CSS_CONTENT_CHARS', 4000))
+    base = read_template('base.html')
+    head = base.split('{% block content %}', 1)[0]
+    page = read_template(template_name)
+    fold = head + _block(page, 'hero') + _block(page, 'content')[:content_chars]
+    return _inline_includes(fold, read_template)
+
+
+def _read_template_source(name):
+    from django.template.loader import get_template
+    with open(get_template(name).origin.name, encoding='utf-8') as fh:
+        return fh.read()
+
+
+# -- collectstatic hook ------------------------------------------------------
+
+def _read(storage, name):
+    with storage.open(name) as fh:
+        data = fh.read()
+    return data.decode('utf-8') if isinstance(data, bytes) else data
+
+
+def _write(storage, name, text):
+    if storage.exists(name):
+        storage.delete(name)
+    storage._save(name, ContentFile(text.encode('utf-8')))
+
+
+def build_static_bundles(storage, read_template=_read_template_source):
+    """Write bundle and critical-CSS files into ``storage``; return their names."""
+    written = []
+    for name, parts in bundle_config().items():
+        for kind, minify in (('js', minify_js), ('css', minify_css)):
+            sources = parts.get(kind) or []
+            if not sources:
+                continue
+            chunks = [minify(_read(storage, src)) for src in sources]
+            joiner = ';\n' if kind == 'js' else '\n'
+            out_name = bundle_name(name, kind)
+            _write(storage, out_name, joiner.join(chunks))
+            written.append(out_name)
+
+    source_css = getattr(settings, 'CRITICAL_CSS_SOURCE', 'css/styles.css')
+    templates = getattr(settings, 'CRITICAL_CSS_TEMPLATES', DEFAULT_CRITICAL_TEMPLATES)
+    if templates and storage.exists(source_css):
+        css = _read(storage, source_css)
+        for template_name in templates:
+            try:
+                html = above_the_fold(template_name, read_template)
+            except Exception:
+                continue
+            out_name = critical_name(template_name)
+            _write(storage, out_name, extract_critical_css(css, html))
+            written.append(out_name)
+    return written
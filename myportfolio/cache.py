@@ -0,0 +1,60 @@
+"""Cache backends that count hits and misses for ``/metrics``.
+
+Drop-in subclasses of Django's local-memory and Redis backends; every
+``get`` (and so ``get_or_set`` and ``cache_page``) is counted under the
+key's prefix: the part before the first ``:``, or ``cache_page`` /
+``cache_header`` for the per-view cache. At most ``MAX_PREFIXES`` distinct
+prefixes are tracked per process; later ones are counted as ``other``.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from myportfolio import metrics
+
+MAX_PREFIXES = 50
+_VIEW_CACHE = 'views.decorators.cache.'
+_MISSING = object()
+_prefixes = set()
+
+
+def key_prefix(key):
+    key = str(key)
+    if key.startswith(_VIEW_CACHE):
+        return key[len(_VIEW_CACHE):].split('.', 1)[0]
+    prefix = key.split(':', 1)[0][:40]
+    if prefix not in _prefixes:
+        if len(_prefixes) >= MAX_PREFIXES:
+            return 'other'
+        _prefixes.add(prefix)
+    return prefix
+
+
+class MeteredCacheMixin:
+    def _count(self, key, hits, misses):
+        prefix = key_prefix(key)
+        if hits:
+            metrics.CACHE_GETS.inc(hits, prefix=prefix, result='hit')
+        if misses:
+            metrics.CACHE_GETS.inc(misses, prefix=prefix, result='miss')
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            self._count(key, 0, 1)
+            return default
+        self._count(key, 1, 0)
+        return value
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    pass
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    def get_many(self, keys, version=None):
+        # RedisCache fetches these in one round trip instead of calling get()
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            self._count(key, int(key in found), int(key not in found))
+        return found
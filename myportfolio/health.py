@@ -0,0 +1,124 @@
+"""Readiness probes behind ``/ready/``.
+
+``/health/`` only says the process is up. ``/ready/`` checks what a
+request needs: the database, the cache, writing and reading back a file in
+media storage, and opening a connection to the email backend. Each probe
+reports ``ok`` and its latency; a failing probe named in
+``READINESS_OPTIONAL_PROBES`` (email by default: messages are stored and
+retried) only marks the worker ``degraded``, any other failure makes it
+answer 503 so the load balancer stops routing to it.
+
+Results are kept per process for ``READINESS_CACHE_SECONDS``; passing
+storage and email probes, which touch outside services, are kept for
+``READINESS_SLOW_CACHE_SECONDS``. Health checks every few seconds so add
+next to no load. Only one thread per process probes at a time; the others
+wait for its result.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import get_connection
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+SLOW_PROBES = ('storage', 'email')
+
+_lock = threading.Lock()
+_results = {}
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_cache():
+    key = f'health:ready:{uuid.uuid4().hex}'
+    cache.set(key, 1, timeout=10)
+    try:
+        if cache.get(key) != 1:
+            raise RuntimeError('cache did not return the value just stored')
+    finally:
+        cache.delete(key)
+
+
+def check_storage():
+    # Probe the backend under ContentAddressedStorage so no MediaBlob rows are made
+    storage = getattr(default_storage, 'inner', default_storage)
+    payload = uuid.uuid4().hex.encode()
+    name = storage.save(f'health/ready-{payload.decode()}.txt', ContentFile(payload))
+    try:
+        with storage.open(name, 'rb') as f:
+            if f.read() != payload:
+                raise RuntimeError('storage returned different content')
+    finally:
+        storage.delete(name)
+
+
+def check_email():
+    timeout = float(getattr(settings, 'READINESS_PROBE_TIMEOUT', 3))
+    conn = get_connection(fail_silently=False, timeout=timeout)
+    conn.open()
+    conn.close()
+
+
+PROBES = {
+    'database': check_database,
+    'cache': check_cache,
+    'storage': check_storage,
+    'email': check_email,
+}
+
+
+def _run(name, probe):
+    started = time.perf_counter()
+    try:
+        probe()
+        result = {'ok': True}
+    except Exception as exc:
+        logger.warning('Readiness probe %s failed', name, exc_info=True)
+        # Only the exception type: the body is public and messages may hold hostnames
+        result = {'ok': False, 'error': type(exc).__name__}
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    result['checked_at'] = time.time()
+    return result
+
+
+def readiness():
+    """``(ready, report)`` with a result per probe, refreshed once stale."""
+    ttl = float(getattr(settings, 'READINESS_CACHE_SECONDS', 5))
+    slow_ttl = float(getattr(settings, 'READINESS_SLOW_CACHE_SECONDS', 60))
+    optional = set(getattr(settings, 'READINESS_OPTIONAL_PROBES', ('email',)))
+    with _lock:
+        now = time.time()
+        for name, probe in PROBES.items():
+            previous = _results.get(name)
+            if previous is None:
+                _results[name] = _run(name, probe)
+                continue
+            # A failed slow probe is retried as often as the fast ones
+            max_age = slow_ttl if name in SLOW_PROBES and previous['ok'] else ttl
+            if now - previous['checked_at'] >= max_age:
+                _results[name] = _run(name, probe)
+        checks = {name: dict(result) for name, result in _results.items()}
+    now = time.time()
+    for result in checks.values():
+        result['age_s'] = round(now - result.pop('checked_at'), 1)
+    failed = {name for name, result in checks.items() if not result['ok']}
+    ready = not (failed - optional)
+    status = 'fail' if not ready else ('degraded' if failed else 'ok')
+    return ready, {'status': status, 'checks': checks}
+
+
+def reset():
+    """Forget cached results so the next call probes again."""
+    with _lock:
+        _results.clear()
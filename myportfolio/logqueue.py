@@ -0,0 +1,312 @@
+"""Logging that never blocks the request path.
+
+``configure_logging`` is Django's ``LOGGING_CONFIG``: it applies ``LOGGING``
+as usual and then, with ``LOGGING_QUEUE`` on, swaps the handlers of every
+configured logger for one ``QueuedHandler``. Emitting a record then only
+renders its message and traceback (and the admin email, which needs the
+request, unless it is a repeat that will not be mailed) and puts a copy on a
+bounded in-memory queue; a single
+background thread per process hands it to the original handlers (console,
+admin email...). When the queue is full records are dropped and counted
+rather than waiting, and the thread reports how many were lost. The queue
+is drained at exit and from gunicorn's ``worker_exit`` hook.
+
+``DedupAdminEmailHandler`` replaces Django's ``AdminEmailHandler``. It
+fingerprints each error (logger, call site, exception type and the
+innermost frames of its traceback) and mails the first occurrence only;
+repeats within ``ADMIN_EMAIL_DEDUP_SECONDS`` are counted, and the count is
+added to the next email for that fingerprint. At most
+``ADMIN_EMAIL_MAX_PER_HOUR`` emails go out per hour. The bookkeeping lives
+in the cache, so with a shared cache all workers deduplicate together.
+"""
+import atexit
+import copy
+import hashlib
+import logging
+import logging.config
+import os
+import queue
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.utils.log import AdminEmailHandler
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# Innermost traceback frames that make up an exception's fingerprint
+FINGERPRINT_FRAMES = 5
+
+
+class LogDispatcher:
+    """A bounded queue of ``(handlers, record)`` drained by one thread."""
+
+    def __init__(self, maxsize=10000):
+        self._queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        # Threads do not survive fork: start one per process on first use
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-dispatcher', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def put(self, handlers, record):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((handlers, record))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                handlers, record = item
+                for handler in handlers:
+                    if record.levelno >= handler.level:
+                        try:
+                            handler.handle(record)
+                        except Exception:
+                            # Reported like any handler error; the thread carries on
+                            handler.handleError(record)
+                self._report_dropped()
+            finally:
+                self._queue.task_done()
+
+    def _report_dropped(self):
+        if not self.dropped:
+            return
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        logger.warning('Logging queue was full; %d record(s) dropped', dropped)
+
+    def stop(self, timeout=5.0):
+        """Write out queued records and stop the thread; False on timeout."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def flush(self):
+        """Block until every queued record has been handled (for tests)."""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.join()
+
+
+_dispatcher = LogDispatcher()
+_formatter = logging.Formatter()
+
+
+class QueuedHandler(logging.Handler):
+    """Hands records to ``handlers`` on the dispatcher thread."""
+
+    def __init__(self, handlers, dispatcher=None):
+        super().__init__()
+        self.handlers = list(handlers)
+        self.dispatcher = dispatcher or _dispatcher
+
+    def prepare(self, record):
+        """A copy of ``record`` that no longer refers to the request.
+
+        By the time the dispatcher gets to it the response is finished:
+        arguments may have changed, ``request.user`` would open a database
+        connection on the logging thread and uploaded files are closed. So
+        the message, the traceback text, the fingerprint and anything a
+        handler needs from the request (``prepare_record``, e.g. the admin
+        email) are worked out here, on the calling thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.log_fingerprint = fingerprint(record)
+        for handler in self.handlers:
+            prepare_record = getattr(handler, 'prepare_record', None)
+            if prepare_record is not None and record.levelno >= handler.level and handler.filter(record):
+                prepare_record(record)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.__dict__.pop('request', None)
+        return record
+
+    def emit(self, record):
+        try:
+            self.dispatcher.put(self.handlers, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def queue_handlers(loggers=None, dispatcher=None):
+    """Route the handlers of ``loggers`` (default: every configured one) through the queue."""
+    if loggers is None:
+        loggers = [logging.getLogger()] + [
+            item for item in logging.Logger.manager.loggerDict.values() if isinstance(item, logging.Logger)
+        ]
+    for item in loggers:
+        handlers = [h for h in item.handlers if not isinstance(h, QueuedHandler)]
+        if not handlers:
+            continue
+        for handler in handlers:
+            item.removeHandler(handler)
+        item.addHandler(QueuedHandler(handlers, dispatcher))
+
+
+def configure_logging(logging_settings):
+    """``LOGGING_CONFIG`` entry point: dictConfig, then queue the handlers."""
+    if logging_settings:
+        logging.config.dictConfig(logging_settings)
+    if getattr(settings, 'LOGGING_QUEUE', True):
+        global _dispatcher
+        _dispatcher.stop()
+        _dispatcher = LogDispatcher(getattr(settings, 'LOGGING_QUEUE_SIZE', 10000))
+        queue_handlers(dispatcher=_dispatcher)
+
+
+def stop(timeout=5.0):
+    return _dispatcher.stop(timeout)
+
+
+def flush():
+    _dispatcher.flush()
+
+
+atexit.register(stop)
+
+
+def fingerprint(record):
+    """Stable id for "the same error": logger, call site and exception origin."""
+    if getattr(record, 'log_fingerprint', None):
+        # Worked out before the traceback was dropped (QueuedHandler.prepare)
+        return record.log_fingerprint
+    parts = [record.name, record.pathname, str(record.lineno)]
+    if record.exc_info and record.exc_info[0] is not None:
+        exc_type, _, tb = record.exc_info
+        parts.append(f'{exc_type.__module__}.{exc_type.__qualname__}')
+        frames = traceback.extract_tb(tb)[-FINGERPRINT_FRAMES:]
+        parts.extend(f'{frame.filename}:{frame.name}:{frame.lineno}' for frame in frames)
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _hour_key():
+    return f'logmail:sent:{int(time.time() // 3600)}'
+
+
+class DedupAdminEmailHandler(AdminEmailHandler):
+    """``AdminEmailHandler`` that mails each error fingerprint once per window."""
+
+    def __init__(self, include_html=False, email_backend=None, reporter_class=None,
+                 dedup_seconds=None, max_per_hour=None):
+        super().__init__(include_html=include_html, email_backend=email_backend, reporter_class=reporter_class)
+        self.dedup_seconds = dedup_seconds
+        self.max_per_hour = max_per_hour
+
+    def _window(self):
+        return int(self.dedup_seconds if self.dedup_seconds is not None
+                   else getattr(settings, 'ADMIN_EMAIL_DEDUP_SECONDS', 600))
+
+    def _limit(self):
+        return int(self.max_per_hour if self.max_per_hour is not None
+                   else getattr(settings, 'ADMIN_EMAIL_MAX_PER_HOUR', 20))
+
+    def held_back(self, record):
+        """Whether ``allow`` is bound to refuse ``record`` (already mailed in
+        this window, or the hourly cap reached), without counting it."""
+        from django.core.cache import cache
+        try:
+            if cache.get(f'logmail:{fingerprint(record)}') is not None:
+                return True
+            limit = self._limit()
+            return bool(limit) and cache.get(_hour_key(), 0) >= limit
+        except Exception:
+            return False
+
+    def allow(self, record):
+        """``(send, suppressed)``: whether to mail this record, and how many
+        repeats were held back since the last email for its fingerprint."""
+        from django.core.cache import cache
+        window = self._window()
+        limit = self._limit()
+        key = f'logmail:{fingerprint(record)}'
+        try:
+            if not cache.add(key, 1, timeout=window):
+                cache.add(f'{key}:suppressed', 0, timeout=window * 24)
+                cache.incr(f'{key}:suppressed')
+                return False, 0
+            if limit:
+                hour_key = _hour_key()
+                cache.add(hour_key, 0, timeout=3600 * 2)
+                if cache.incr(hour_key) > limit:
+                    return False, 0
+            suppressed = cache.get(f'{key}:suppressed', 0)
+            if suppressed:
+                cache.delete(f'{key}:suppressed')
+            return True, suppressed
+        except Exception:
+            # Without a cache an unthrottled email beats a lost one
+            return True, 0
+
+    def render(self, record):
+        """``(subject, message, html_message)``, as ``AdminEmailHandler`` builds them."""
+        try:
+            request = record.request
+            subject = '%s (%s IP): %s' % (
+                record.levelname,
+                'internal' if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS else 'EXTERNAL',
+                record.getMessage(),
+            )
+        except Exception:
+            subject = '%s: %s' % (record.levelname, record.getMessage())
+            request = None
+        subject = self.format_subject(subject)
+        no_exc_record = copy.copy(record)
+        no_exc_record.exc_info = None
+        no_exc_record.exc_text = None
+        exc_info = record.exc_info or (None, record.getMessage(), None)
+        reporter = self.reporter_class(request, is_email=True, *exc_info)
+        message = '%s\n\n%s' % (self.format(no_exc_record), reporter.get_traceback_text())
+        html_message = reporter.get_traceback_html() if self.include_html else None
+        return subject, message, html_message
+
+    def prepare_record(self, record):
+        # Called by QueuedHandler on the request thread, while the request
+        # and the traceback are still intact. A repeat that emit() will
+        # only count is not rendered: during an error storm that would cost
+        # every failing request a technical 500 page nobody reads.
+        if settings.ADMINS and not self.held_back(record):
+            record.admin_email = self.render(record)
+
+    def emit(self, record):
+        if not settings.ADMINS:
+            return
+        send, suppressed = self.allow(record)
+        if not send:
+            return
+        subject, message, html_message = getattr(record, 'admin_email', None) or self.render(record)
+        if suppressed:
+            subject = f'{subject} (+{suppressed} similar)'
+            message = f'{suppressed} more occurrence(s) of this error were not emailed.\n\n{message}'
+        self.send_mail(subject, message, fail_silently=True, html_message=html_message)
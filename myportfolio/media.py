@@ -0,0 +1,207 @@
+"""Production media serving for FileSystemStorage.
+
+``django.views.static.serve`` is only wired up under DEBUG and is not meant
+for production. This view serves files from local media storage with what a
+real file server would provide:
+
+  * strong ETags and Last-Modified, with 304 responses for conditional GETs;
+  * single ``Range`` requests (206 / 416) honouring ``If-Range``;
+  * long-lived ``immutable`` caching for content-addressed names;
+  * a 404 for private paths (``MEDIA_PRIVATE_PREFIXES``, contact uploads by
+    default), which are only reachable through signed links;
+  * optional ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache,
+    lighttpd) offload so the bytes never pass through a gunicorn worker.
+
+It is normally reached through ``myportfolio.middleware.media.MediaServingMiddleware``.
+"""
+import functools
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_IMMUTABLE_PATTERNS = (
+    r'^blobs/',              # myportfolio.storage.ContentAddressedStorage
+    r'[0-9a-f]{12,}\.[^/]+$',  # names ending in a content hash
+)
+DEFAULT_PRIVATE_PREFIXES = ('messages/',)
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@functools.lru_cache(maxsize=8)
+def _compile(patterns):
+    return [re.compile(p) for p in patterns]
+
+
+def is_immutable(name):
+    patterns = getattr(settings, 'MEDIA_IMMUTABLE_PATTERNS', DEFAULT_IMMUTABLE_PATTERNS)
+    return any(p.search(name) for p in _compile(tuple(patterns)))
+
+
+def is_private(name):
+    """Whether ``name`` lies under one of ``MEDIA_PRIVATE_PREFIXES``.
+
+    Contact attachments (``messages/``) are only handed out through signed,
+    expiring links (``portfolio.attachments``), never by their storage path.
+    """
+    name = posixpath.normpath('/' + name).lstrip('/')
+    prefixes = getattr(settings, 'MEDIA_PRIVATE_PREFIXES', DEFAULT_PRIVATE_PREFIXES)
+    return any(name.startswith(prefix) or name == prefix.rstrip('/') for prefix in prefixes)
+
+
+def make_etag(stat):
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range.
+
+    Returns None when the header should be ignored (absent, malformed or a
+    multi-range request, which is served as a full 200 response) and
+    ``False`` when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        # Only strong comparison is allowed for If-Range
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) == since
+
+
+def _not_modified(request, etag, mtime):
+    inm = request.META.get('HTTP_IF_NONE_MATCH')
+    if inm is not None:
+        tags = parse_etags(inm)
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    ims = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    return ims is not None and int(mtime) <= ims
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload(response, name, full_path):
+    mode = (getattr(settings, 'MEDIA_SENDFILE_MODE', '') or '').lower()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+        return True
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+        return True
+    return False
+
+
+def serve_media(request, path, storage=None):
+    """Serve ``path`` from local media storage with range and cache support."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=405, headers={'Allow': 'GET, HEAD'})
+    storage = storage or default_storage
+    name = path.lstrip('/')
+    if is_private(name):
+        raise Http404()
+    try:
+        full_path = storage.path(name)
+    except (SuspiciousFileOperation, NotImplementedError, ValueError):
+        raise Http404()
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404()
+    if not os.path.isfile(full_path):
+        raise Http404()
+
+    etag = make_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            'public, max-age=31536000, immutable' if is_immutable(name)
+            else f"public, max-age={int(getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600))}"
+        ),
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for k, v in headers.items():
+            response[k] = v
+        return response
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat.st_size
+
+    # Let the front-end server do the transfer (it also handles Range).
+    response = HttpResponse(content_type=content_type)
+    if _offload(response, name, full_path):
+        for k, v in headers.items():
+            response[k] = v
+        return response
+
+    byte_range = None
+    if _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+        for k, v in headers.items():
+            response[k] = v
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        body = [] if request.method == 'HEAD' else _iter_range(full_path, start, length)
+        response = StreamingHttpResponse(body, status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+    for k, v in headers.items():
+        response[k] = v
+    return response
@@ -0,0 +1,257 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts guarded by one lock, so recording
+costs a dict update. ``MetricsMiddleware`` (myportfolio/middleware/metrics.py)
+records requests, latency and database queries per URL name; the metered
+cache backends (myportfolio/cache.py) count hits and misses per key prefix;
+``blog.mailmetrics.record`` counts emails, ``RateLimitMiddleware`` its
+rejections and ``myportfolio.pdfpool`` PDF rendering jobs.
+
+Each gunicorn worker keeps its own numbers. With ``METRICS_DIR`` set, every
+process writes a snapshot (``metrics-<pid>.json``) there at most every
+``METRICS_FLUSH_INTERVAL`` seconds and on exit, and ``/metrics`` adds up the
+snapshots of all processes, including ones that have since exited, so
+counters never go backwards while the server runs. gunicorn's
+``on_starting`` hook empties the directory. Without ``METRICS_DIR`` the
+endpoint reports the answering process only.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = {}
+_state = {'pid': os.getpid(), 'flushed_at': time.monotonic()}
+
+
+def enabled():
+    return bool(getattr(settings, 'METRICS_ENABLED', True))
+
+
+def _check_pid():
+    # A forked worker must not report its parent's numbers as its own
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        for metric in _registry.values():
+            metric.values.clear()
+        _state['pid'] = pid
+        _state['flushed_at'] = time.monotonic()
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with _lock:
+            _check_pid()
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def merge(self, total, values):
+        for key, value in values:
+            key = tuple(key)
+            total[key] = total.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with _lock:
+            _check_pid()
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+        _maybe_flush()
+
+    def merge(self, total, values):
+        for key, (counts, value_sum, count) in values:
+            key = tuple(key)
+            entry = total.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+            entry[2] += count
+
+
+REQUESTS = Counter(
+    'django_http_requests_total', 'HTTP requests by URL name, method and status code.',
+    ('view', 'method', 'status'))
+REQUEST_LATENCY = Histogram(
+    'django_http_request_duration_seconds', 'Time spent handling requests, by URL name.', ('view',))
+DB_QUERIES = Counter(
+    'django_db_queries_total', 'Database queries run while handling requests, by URL name.', ('view',))
+CACHE_GETS = Counter(
+    'django_cache_gets_total', 'Cache lookups by key prefix and result (hit or miss).',
+    ('prefix', 'result'))
+EMAILS = Counter(
+    'emails_total', 'Emails handed to the mail backend, by kind and status (sent or failed).',
+    ('kind', 'status'))
+RATELIMIT_REJECTIONS = Counter(
+    'ratelimit_rejections_total', 'Requests turned away by the rate limiter, by policy.', ('policy',))
+PDF_JOBS = Counter(
+    'pdf_jobs_total', 'PDF rendering jobs by renderer and outcome (ok, failed, timeout or busy).',
+    ('renderer', 'status'))
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', '') or ''
+
+
+def snapshot():
+    """This process's values as a JSON-friendly dict."""
+    with _lock:
+        _check_pid()
+        return {
+            name: [[list(key), [value[0][:], value[1], value[2]] if isinstance(value, list) else value]
+                   for key, value in metric.values.items()]
+            for name, metric in _registry.items()
+        }
+
+
+def _maybe_flush():
+    interval = float(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+    if _metrics_dir() and time.monotonic() - _state['flushed_at'] >= interval:
+        flush()
+
+
+def flush():
+    """Write this process's snapshot to ``METRICS_DIR``, if one is set."""
+    directory = _metrics_dir()
+    if not directory:
+        return False
+    _state['flushed_at'] = time.monotonic()
+    data = snapshot()
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        logger.exception('Could not write metrics to %s', path)
+        return False
+
+
+atexit.register(flush)
+
+
+def clear_dir(directory):
+    """Remove every process snapshot from ``directory`` (at server start)."""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def collect():
+    """Values merged over all processes: ``{name: {labels: value}}``."""
+    directory = _metrics_dir()
+    if directory and flush():
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Half-written or removed meanwhile; it is picked up next scrape
+                continue
+    else:
+        snapshots = [snapshot()]
+    merged = {name: {} for name in _registry}
+    for data in snapshots:
+        for name, values in data.items():
+            metric = _registry.get(name)
+            if metric is not None:
+                metric.merge(merged[name], values)
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+def render():
+    """The merged metrics in the Prometheus text exposition format."""
+    merged = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(merged[name].items()):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(metric.labelnames, key)} {_number(value)}')
+                continue
+            counts, value_sum, count = value
+            cumulative = 0
+            for bound, n in zip(metric.buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, key, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(metric.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, key)} {_number(round(value_sum, 6))}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, key)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget this process's values (for tests)."""
+    with _lock:
+        for metric in _registry.values():
+            metric.values.clear()
@@ -0,0 +1,63 @@
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_header_parameters
+
+from myportfolio.uploads import EarlyReject, FieldSniffer, HoneypotUploadHandler
+
+logger = logging.getLogger(__name__)
+
+
+class EarlyRejectMiddleware:
+    """Turn away spam POSTs to the public forms before the body is parsed.
+
+    For the URL names in ``EARLY_REJECT_URLS`` it rejects, in order:
+
+      * bodies larger than ``UPLOAD_MAX_REQUEST_SIZE`` (by Content-Length,
+        without reading anything) with a 400;
+      * multipart bodies whose honeypot field is filled in, with a 400 as
+        soon as the parser reaches the first file part (see
+        ``myportfolio.uploads``).
+
+    Must come before ``CsrfViewMiddleware``, which reads ``request.POST``;
+    ``RateLimitMiddleware`` goes first so flooding clients get their 429
+    before any of this.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.urls = set(getattr(settings, 'EARLY_REJECT_URLS', ()))
+        self.max_size = int(getattr(settings, 'UPLOAD_MAX_REQUEST_SIZE', 0))
+        self.honeypots = tuple(getattr(settings, 'HONEYPOT_FIELDS', ('hp',)))
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST' or not request.resolver_match:
+            return None
+        if request.resolver_match.view_name not in self.urls:
+            return None
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return HttpResponse('Invalid Content-Length.', status=400, content_type='text/plain')
+        if self.max_size and length > self.max_size:
+            logger.info('Rejected %d-byte POST to %s before reading it', length, request.path)
+            return HttpResponse('Request too large.', status=400, content_type='text/plain')
+
+        content_type, params = parse_header_parameters(request.META.get('CONTENT_TYPE', ''))
+        boundary = params.get('boundary')
+        if content_type != 'multipart/form-data' or not boundary:
+            return None
+        sniffer = FieldSniffer(request._stream, boundary.encode('latin-1'))
+        request._stream = sniffer
+        request.upload_handlers.insert(0, HoneypotUploadHandler(request, sniffer, self.honeypots))
+        try:
+            # Parse now, while a rejection can still become a clean response
+            request.POST
+        except EarlyReject as exc:
+            logger.info('Rejected POST to %s early: %s', request.path, exc.reason)
+            return HttpResponse(exc.reason, status=exc.status, content_type='text/plain')
+        return None
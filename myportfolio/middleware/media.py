@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from myportfolio.media import serve_media
+
+
+class MediaServingMiddleware:
+    """Serve ``MEDIA_URL`` from local storage in production.
+
+    Short-circuits media requests before sessions, CSRF and auth run, so a
+    large PDF download costs a single ``os.stat`` plus the file transfer (or
+    nothing at all with ``MEDIA_SENDFILE_MODE``). Disabled, and removed from
+    the middleware chain entirely, unless ``SERVE_MEDIA`` is True.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVE_MEDIA', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.prefix = settings.MEDIA_URL
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.prefix):
+            return serve_media(request, request.path_info[len(self.prefix):])
+        return self.get_response(request)
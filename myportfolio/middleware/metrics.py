@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from myportfolio import metrics
+
+# Anything else is reported as "other" to keep the label set bounded
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and their database queries per URL name.
+
+    Goes first in ``MIDDLEWARE`` so the timing covers every other
+    middleware, and rate-limited or rejected requests are counted too.
+    Requests that never reach the URL resolver (static and media files)
+    are labelled ``unmatched``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        metrics.REQUESTS.inc(view=view, method=method, status=response.status_code)
+        metrics.REQUEST_LATENCY.observe(duration, view=view)
+        if queries[0]:
+            metrics.DB_QUERIES.inc(queries[0], view=view)
+        return response
@@ -0,0 +1,83 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from myportfolio.profiling import check_token, profiler_for
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PARAM = '_profile'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+
+class RequestProfilerMiddleware:
+    """Profile a request when asked to with a staff token, or at random.
+
+    Pass a token from the "Request profiles" admin page as the ``_profile``
+    query parameter or the ``X-Profile-Token`` header; tokens expire after
+    ``PROFILE_TOKEN_MAX_AGE`` seconds. ``PROFILE_SAMPLE_RATE`` (0 to 1)
+    additionally profiles that share of all requests. Profiled responses
+    carry ``X-Profile-Id``. With ``PROFILING_ENABLED=False`` the middleware
+    removes itself from the chain; otherwise an unprofiled request costs a
+    dictionary lookup or two.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'PROFILE_SAMPLE_RATE', 0))
+        self.mode = getattr(settings, 'PROFILE_MODE', 'sample')
+        self.interval = float(getattr(settings, 'PROFILE_INTERVAL', 0.001))
+        self.max_age = int(getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 60 * 60))
+        self.keep = int(getattr(settings, 'PROFILE_KEEP', 500))
+
+    def _trigger(self, request):
+        token = request.META.get(TOKEN_HEADER)
+        if not token and TOKEN_PARAM in request.META.get('QUERY_STRING', ''):
+            token = request.GET.get(TOKEN_PARAM)
+        if token and check_token(token, self.max_age):
+            return 'token'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = profiler_for(self.mode, self.interval)
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration = time.perf_counter() - started
+        profile = self._save(request, response, trigger, profiler, duration)
+        if profile is not None:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def _save(self, request, response, trigger, profiler, duration):
+        from portfolio.models import RequestProfile
+        match = getattr(request, 'resolver_match', None)
+        try:
+            output = profiler.output()
+            profile = RequestProfile.objects.create(
+                method=request.method, path=request.path[:500],
+                url_name=(match.view_name if match else '')[:200],
+                status_code=getattr(response, 'status_code', 0),
+                duration_ms=duration * 1000, trigger=trigger, mode=profiler.mode,
+                samples=profiler.samples, output=output,
+            )
+            stale = RequestProfile.objects.values_list('pk', flat=True)[self.keep:]
+            RequestProfile.objects.filter(pk__in=list(stale)).delete()
+            return profile
+        except Exception:
+            logger.exception('Could not store the profile of %s', request.path)
+            return None
@@ -1,33 +1,194 @@
-from django.core.cache import cache
-from django.http import HttpResponse
-from django.utils.deprecation import MiddlewareMixin
+"""Per-client rate limiting with policies per URL name.
+
+Each policy is a rate such as ``'5/10m'`` (five requests per ten minutes)
+keyed by URL name in ``RATELIMIT_POLICIES``; POSTs to any other URL fall
+back to ``RATELIMIT_DEFAULT`` and namespaces in ``RATELIMIT_EXEMPT`` (the
+admin, apart from its login) are never limited.
+
+Counting uses a sliding window: one counter per client and fixed window,
+bumped with the cache's atomic ``add``/``incr``, and the previous window's
+count weighted by how much of it still overlaps. No read-modify-write, so
+concurrent requests can't slip past the limit. Production needs Redis or
+memcached as the cache (``REDIS_URL``, provisioned by render.yaml) so every
+gunicorn worker shares the counters; with a local-memory cache each worker
+counts on its own, which is only good enough for development, and the
+middleware warns about it when ``DEBUG`` is off.
+
+Clients are identified by ``REMOTE_ADDR``, or, behind
+``RATELIMIT_TRUSTED_PROXIES`` reverse proxies (Render has one), by the
+address those proxies appended to ``X-Forwarded-For``. Responses carry
+``RateLimit-Limit``, ``RateLimit-Remaining`` and ``RateLimit-Reset``;
+rejected requests get a 429 with ``Retry-After``.
+"""
+import logging
+import math
+import re
 import time
+import warnings
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from myportfolio import metrics
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+
+
+def parse_rate(rate):
+    """``'5/10m'`` -> ``(5, 600)``; raises ValueError for anything else."""
+    match = _RATE.match(str(rate))
+    if not match:
+        raise ValueError(f'Invalid rate {rate!r}; expected e.g. "5/m" or "30/10s"')
+    count, multiplier, unit = match.groups()
+    if int(count) < 1:
+        raise ValueError(f'Invalid rate {rate!r}; allow at least one request')
+    return int(count), int(multiplier or 1) * _UNITS[unit]
+
+
+class Policy:
+    def __init__(self, name, rate, methods=('POST',)):
+        self.name = name
+        self.limit, self.period = parse_rate(rate)
+        self.methods = {m.upper() for m in methods}
+
+    @classmethod
+    def from_setting(cls, name, value):
+        if isinstance(value, dict):
+            return cls(name, value['rate'], value.get('methods', ('POST',)))
+        return cls(name, value)
+
+
+def client_ip(request, trusted_proxies=None):
+    """The client address, trusting only the last ``trusted_proxies`` hops."""
+    if trusted_proxies is None:
+        trusted_proxies = int(getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 0))
+    remote = request.META.get('REMOTE_ADDR') or 'anonymous'
+    if trusted_proxies <= 0:
+        return remote
+    forwarded = [p.strip() for p in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if p.strip()]
+    # Each trusted proxy appends the address it received the request from;
+    # anything further left is client-supplied and can be forged.
+    if len(forwarded) >= trusted_proxies:
+        return forwarded[-trusted_proxies]
+    return forwarded[0] if forwarded else remote
 
 
-class SimpleRateLimitMiddleware(MiddlewareMixin):
-    """Very small per-IP rate limit middleware.
+def hit(cache, policy, client, now=None):
+    """Count one request; returns ``(allowed, remaining, seconds)``.
 
-    Configure limit by adding to settings.MIDDLEWARE.
-    This defaults to 1 request per 2 seconds per IP for POST endpoints.
+    ``seconds`` is when the current window resets, or for a rejected
+    request how long until one more would be allowed.
     """
+    now = time.time() if now is None else now
+    window = int(now // policy.period)
+    key = f'rl:{policy.name}:{client}:{window}'
+    # add() is a no-op if the key exists, so incr() never races a set()
+    cache.add(key, 0, timeout=policy.period * 2)
+    try:
+        current = cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.add(key, 1, timeout=policy.period * 2)
+        current = 1
+    previous = cache.get(f'rl:{policy.name}:{client}:{window - 1}', 0)
+    elapsed = now - window * policy.period
+    weighted = previous * (1 - elapsed / policy.period) + current
+    remaining = max(0, policy.limit - math.ceil(weighted))
+    if weighted <= policy.limit:
+        return True, remaining, policy.period - elapsed
+    # Rejected requests don't count, so a client that honours Retry-After gets in
+    current -= 1
+    cache.decr(key)
+    if current < policy.limit:
+        # Room once enough of the previous window has slid out
+        wait = policy.period * (1 - (policy.limit - current - 1) / previous) - elapsed
+    else:
+        # Full: wait for the next window, then for this one to slide out
+        wait = policy.period - elapsed + policy.period * (1 - (policy.limit - 1) / current)
+    return False, 0, max(0.0, wait)
 
-    def process_request(self, request):
-        if request.method != 'POST':
+
+def shared_cache():
+    """The ``RATELIMIT_CACHE`` cache: Redis, shared by every worker, in production."""
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def cooldown(cache, name, client, seconds):
+    """Allow ``client`` one ``name`` action per ``seconds``; False while cooling down.
+
+    A single atomic ``cache.add``, so it needs no session. Pass
+    ``shared_cache()`` so it holds across workers: a per-process cache lets a
+    client alternating between workers skip it.
+    """
+    return cache.add(f'rl:cooldown:{name}:{client}', 1, timeout=seconds)
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'RATELIMIT_ENABLED', True)
+        self.cache = shared_cache()
+        self.policies = {
+            name: Policy.from_setting(name, value)
+            for name, value in getattr(settings, 'RATELIMIT_POLICIES', {}).items()
+        }
+        default = getattr(settings, 'RATELIMIT_DEFAULT', '')
+        self.default = Policy('default', default) if default else None
+        self.exempt = set(getattr(settings, 'RATELIMIT_EXEMPT', ()))
+        if self.enabled and isinstance(self.cache, LocMemCache) and not settings.DEBUG:
+            warnings.warn(
+                'RATELIMIT_CACHE is a local-memory cache: each worker process counts on its own, '
+                'so clients get the limit once per worker. Set REDIS_URL to share the counters.',
+                RuntimeWarning,
+            )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, '_ratelimit', None)
+        if state:
+            policy, remaining, reset = state
+            response.headers.setdefault('RateLimit-Limit', str(policy.limit))
+            response.headers.setdefault('RateLimit-Remaining', str(remaining))
+            response.headers.setdefault('RateLimit-Reset', str(max(1, math.ceil(reset))))
+        return response
+
+    def policy_for(self, request):
+        match = request.resolver_match
+        name = match.view_name if match else ''
+        policy = self.policies.get(name)
+        if policy is None:
+            if match and (set(match.namespaces) & self.exempt or name in self.exempt):
+                return None
+            policy = self.default
+        if policy is None or request.method not in policy.methods:
+            return None
+        return policy
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        policy = self.policy_for(request)
+        if policy is None:
             return None
-        ip = request.META.get('REMOTE_ADDR') or 'anonymous'
-        key = f'rl:{ip}'
-        now = time.time()
-        window = 2  # seconds
-        allowed = 1
-        data = cache.get(key)
-        if data:
-            timestamps = data
-            # purge old
-            timestamps = [t for t in timestamps if now - t < window]
-        else:
-            timestamps = []
-        if len(timestamps) >= allowed:
-            return HttpResponse('Too many requests, slow down.', status=429)
-        timestamps.append(now)
-        cache.set(key, timestamps, timeout=window)
-        return None
+        try:
+            allowed, remaining, reset = hit(self.cache, policy, client_ip(request))
+        except Exception:
+            # A cache outage shouldn't take the site down with it
+            logger.exception('Rate limit check failed; allowing request')
+            return None
+        request._ratelimit = (policy, remaining, reset)
+        if allowed:
+            return None
+        metrics.RATELIMIT_REJECTIONS.inc(policy=policy.name)
+        response = HttpResponse('Too many requests, slow down.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(max(1, math.ceil(reset)))
+        return response
+
+
+# Old name, still referenced by existing MIDDLEWARE settings
+SimpleRateLimitMiddleware = RateLimitMiddleware
@@ -0,0 +1,243 @@
+"""PDF rendering in child processes with hard limits.
+
+WeasyPrint and ReportLab used to run inside the gunicorn worker, so a
+pathological stylesheet or a very long project list could pin it for as
+long as rendering took. ``render_file`` now runs a renderer from
+``portfolio.pdfrender`` in a separate process that writes the PDF to a
+temporary file:
+
+- the process is killed after ``PDF_JOB_TIMEOUT`` seconds (``PDFTimeout``);
+- its address space and the size of the PDF are capped at
+  ``PDF_MEMORY_LIMIT_MB`` and its CPU time at the timeout, so a runaway job
+  dies on its own as well;
+- at most ``PDF_MAX_JOBS`` jobs run at once on the host, counted with lock
+  files in ``PDF_SLOT_DIR`` so the cap holds across gunicorn workers. A
+  caller that gets no slot within ``PDF_QUEUE_WAIT`` seconds gets
+  ``PDFBusy`` instead of queueing behind a crawler.
+
+Each job gets a fresh process from a ``forkserver`` (a clean process
+started once, without the web worker's threads and connections; see
+``PDF_START_METHOD``), rather than a reused pool worker, so a job that is
+killed or fails leaves nothing behind for the next one. Like ``spawn``, it
+re-imports the main module, so scripts calling this need an
+``if __name__ == '__main__'`` guard (gunicorn and manage.py have one).
+Renderers get plain data and never touch Django.
+With ``PDF_POOL_ENABLED=False`` jobs run in the calling thread (still
+slot-capped), e.g. on platforms without ``fork``.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from myportfolio.metrics import PDF_JOBS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SLOT_POLL_INTERVAL = 0.05
+
+_local_slots = {}
+_local_slots_lock = threading.Lock()
+
+
+class PDFBusy(Exception):
+    """Every rendering slot stayed taken for ``PDF_QUEUE_WAIT`` seconds."""
+
+
+class PDFRenderError(Exception):
+    """The renderer raised, ran out of memory or was killed."""
+
+
+class PDFTimeout(PDFRenderError):
+    """The renderer ran longer than ``PDF_JOB_TIMEOUT`` seconds."""
+
+
+class ResultFile(io.FileIO):
+    """The rendered PDF; the temporary file is removed when this is closed."""
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        try:
+            os.unlink(self.name)
+        except OSError:
+            pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _FileSlot:
+    def __init__(self, f):
+        self._file = f
+
+    def release(self):
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+
+
+class _LocalSlot:
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+
+    def release(self):
+        self._semaphore.release()
+
+
+def _acquire_local(max_jobs, wait):
+    with _local_slots_lock:
+        semaphore = _local_slots.setdefault(max_jobs, threading.BoundedSemaphore(max_jobs))
+    if not semaphore.acquire(timeout=wait):
+        return None
+    return _LocalSlot(semaphore)
+
+
+def acquire_slot(wait=None):
+    """One of the ``PDF_MAX_JOBS`` rendering slots; raises ``PDFBusy``."""
+    max_jobs = max(1, int(_setting('PDF_MAX_JOBS', 2)))
+    wait = float(_setting('PDF_QUEUE_WAIT', 5) if wait is None else wait)
+    directory = _setting('PDF_SLOT_DIR', '') or os.path.join(tempfile.gettempdir(), 'myportfolio-pdf')
+    if fcntl is None:
+        slot = _acquire_local(max_jobs, wait)
+        if slot is None:
+            raise PDFBusy(f'all {max_jobs} PDF slots busy')
+        return slot
+    os.makedirs(directory, exist_ok=True)
+    deadline = time.monotonic() + wait
+    while True:
+        for i in range(max_jobs):
+            f = open(os.path.join(directory, f'slot-{i}.lock'), 'ab')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            return _FileSlot(f)
+        if time.monotonic() >= deadline:
+            raise PDFBusy(f'all {max_jobs} PDF slots busy')
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+def _limit(memory_bytes, cpu_seconds):
+    if resource is None:
+        return
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        # The parent may read the PDF into memory: no bigger than the child could be
+        resource.setrlimit(resource.RLIMIT_FSIZE, (memory_bytes, memory_bytes))
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+
+
+def _child(conn, func, out_path, args, memory_bytes, cpu_seconds):
+    """Entry point of the rendering process: sends None or ``(type, message)``."""
+    try:
+        _limit(memory_bytes, cpu_seconds)
+        func(out_path, *args)
+        conn.send(None)
+    except BaseException as exc:
+        try:
+            conn.send((type(exc).__name__, str(exc)[:500]))
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+def _context():
+    method = _setting('PDF_START_METHOD', 'forkserver')
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def _run_process(func, out_path, args, timeout):
+    memory_mb = int(_setting('PDF_MEMORY_LIMIT_MB', 1024))
+    ctx = _context()
+    reader, writer = ctx.Pipe(duplex=False)
+    proc = ctx.Process(
+        target=_child, name=f'pdf-{func.__name__}', daemon=True,
+        args=(writer, func, out_path, args, memory_mb * 1024 * 1024, int(timeout) + 1),
+    )
+    proc.start()
+    writer.close()
+    try:
+        # Readable once the child reports or exits
+        if not reader.poll(timeout):
+            raise PDFTimeout(f'{func.__name__} took longer than {timeout:g}s')
+        try:
+            error = reader.recv()
+        except EOFError:
+            proc.join(1)
+            # Died without reporting: killed by a signal or out of memory
+            error = ('ProcessExited', f'exit code {proc.exitcode}')
+    finally:
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        reader.close()
+    if error is not None:
+        raise PDFRenderError('%s: %s' % error)
+
+
+def _run_inline(func, out_path, args):
+    try:
+        func(out_path, *args)
+    except Exception as exc:
+        raise PDFRenderError(f'{type(exc).__name__}: {exc}') from exc
+
+
+def render_file(func, *args, timeout=None, wait=None):
+    """Run ``func(out_path, *args)`` under the limits above; returns a ``ResultFile``.
+
+    ``func`` must be a module-level function (it is pickled for the child).
+    Raises ``PDFBusy``, ``PDFTimeout`` or ``PDFRenderError``.
+    """
+    timeout = float(_setting('PDF_JOB_TIMEOUT', 30) if timeout is None else timeout)
+    renderer = func.__name__
+    try:
+        slot = acquire_slot(wait)
+    except PDFBusy:
+        PDF_JOBS.inc(renderer=renderer, status='busy')
+        raise
+    try:
+        fd, path = tempfile.mkstemp(prefix='render-', suffix='.pdf')
+        os.close(fd)
+        try:
+            if _setting('PDF_POOL_ENABLED', True):
+                _run_process(func, path, args, timeout)
+            else:
+                _run_inline(func, path, args)
+        except BaseException as exc:
+            os.unlink(path)
+            timed_out = isinstance(exc, PDFTimeout)
+            logger.warning('PDF job %s failed: %s', renderer, exc)
+            PDF_JOBS.inc(renderer=renderer, status='timeout' if timed_out else 'failed')
+            raise
+        PDF_JOBS.inc(renderer=renderer, status='ok')
+        return ResultFile(path)
+    finally:
+        slot.release()
+
+
+def render_bytes(func, *args, timeout=None, wait=None):
+    """Like ``render_file``, but returns the PDF as bytes."""
+    with render_file(func, *args, timeout=timeout, wait=wait) as f:
+        return f.read()
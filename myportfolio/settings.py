@@ -104,12 +104,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myportfolio.middleware.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'myportfolio.middleware.media.MediaServingMiddleware',
+    'myportfolio.middleware.profiling.RequestProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Before CSRF, which parses the body: floods and spam uploads are
+    # rejected before it is read (see myportfolio/uploads.py)
+    'myportfolio.middleware.ratelimit.RateLimitMiddleware',
+    'myportfolio.middleware.earlyreject.EarlyRejectMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'myportfolio.middleware.ratelimit.SimpleRateLimitMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -174,6 +180,23 @@ else:
     # Local filesystem as a safe default for development and when credentials missing
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
+# Optional content-addressed deduplication for uploaded media. When enabled,
+# the backend chosen above is wrapped so identical files (e.g. the same logo
+# uploaded as logo, logo_light and favicon) are stored once and reference
+# counted; see myportfolio.storage.ContentAddressedStorage. After bulk
+# changes that skip model signals, `manage.py gc_media_blobs` recounts them.
+MEDIA_DEDUP = os.environ.get('MEDIA_DEDUP', 'False') == 'True'
+_MEDIA_STORAGE = (
+    {'BACKEND': 'myportfolio.storage.ContentAddressedStorage', 'OPTIONS': {'backend': DEFAULT_FILE_STORAGE}}
+    if MEDIA_DEDUP else {'BACKEND': DEFAULT_FILE_STORAGE}
+)
+if MEDIA_DEDUP:
+    # Production overrides STORAGES below; this covers local development.
+    STORAGES = {
+        'default': _MEDIA_STORAGE,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -236,9 +259,35 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'portfolio' / 'static']
 # Where `collectstatic` will collect files for production
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic concatenates and minifies the bundles into
+# bundles/<name>.js|css and writes the above-the-fold subset of
+# CRITICAL_CSS_SOURCE for each template to critical/<template>.css. Both lists
+# live in myportfolio/bundling.py (DEFAULT_BUNDLES, DEFAULT_CRITICAL_TEMPLATES);
+# set STATIC_BUNDLES / CRITICAL_CSS_TEMPLATES here only to override them. The
+# {% bundle_js %} / {% bundle_css %} tags use them once they are in the
+# manifest and fall back to the individual source files otherwise.
+STATIC_BUNDLING = os.environ.get('STATIC_BUNDLING', 'True') == 'True'
+CRITICAL_CSS_SOURCE = 'css/styles.css'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Serve MEDIA_URL from local storage outside DEBUG (Cloudinary serves its
+# own URLs). MEDIA_SENDFILE_MODE='x-accel-redirect' or 'x-sendfile' hands the
+# transfer to nginx/Apache; with nginx, map MEDIA_ACCEL_REDIRECT_PREFIX to an
+# `internal` location aliased to MEDIA_ROOT.
+SERVE_MEDIA = os.environ.get(
+    'SERVE_MEDIA',
+    str(not DEBUG and DEFAULT_FILE_STORAGE == 'django.core.files.storage.FileSystemStorage'),
+) == 'True'
+MEDIA_SENDFILE_MODE = os.environ.get('MEDIA_SENDFILE_MODE', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 60 * 60))
+# Never served by path: contact attachments go out as signed, expiring links.
+MEDIA_PRIVATE_PREFIXES = tuple(
+    p.strip() for p in os.environ.get('MEDIA_PRIVATE_PREFIXES', 'messages/').split(',') if p.strip()
+)
+
 # Static files storage is configured in the production block below.
 # (Avoid setting STATICFILES_STORAGE unconditionally here so the
 # `STORAGES` config used for production can control the backend.)
@@ -264,11 +313,101 @@ EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_USE_SSL = os.environ.get('EMAIL_USE_SSL', 'False') == 'True'
 EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 10))
 
+# Contact uploads: spool anything above this size to a temporary file
+# instead of memory, cap the bytes embedded in the owner notification and
+# link to the remaining files with signed URLs (see portfolio.attachments).
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 512 * 1024))
+CONTACT_EMAIL_ATTACHMENT_MAX_BYTES = int(os.environ.get('CONTACT_EMAIL_ATTACHMENT_MAX_BYTES', 2 * 1024 * 1024))
+CONTACT_ATTACHMENT_LINK_MAX_AGE = int(os.environ.get('CONTACT_ATTACHMENT_LINK_MAX_AGE', 60 * 60 * 24 * 7))
+# POSTs to these public forms are checked before their body is parsed
+# (myportfolio/middleware/earlyreject.py): anything over
+# UPLOAD_MAX_REQUEST_SIZE bytes is refused unread, and multipart bodies with
+# a filled-in honeypot are dropped before their file parts are read.
+EARLY_REJECT_URLS = ['portfolio:contact', 'portfolio:recommend', 'portfolio:subscribe', 'blog:subscribe']
+HONEYPOT_FIELDS = ['hp']
+UPLOAD_MAX_REQUEST_SIZE = int(os.environ.get('UPLOAD_MAX_REQUEST_SIZE', 25 * 1024 * 1024))
+# Request profiling (myportfolio/profiling.py): staff trigger a profile with
+# a signed token from the "Request profiles" admin page (?_profile=<token>
+# or an X-Profile-Token header); PROFILE_SAMPLE_RATE also profiles that
+# share of all requests. PROFILE_MODE is "sample" (stack sampling every
+# PROFILE_INTERVAL seconds, flamegraph-ready) or "cprofile". The newest
+# PROFILE_KEEP profiles are kept.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.001))
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 60 * 60))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 500))
+
+# Spam filter for contact messages and recommendations (portfolio/spam.py):
+# submissions scoring at least SPAM_SCORE_THRESHOLD are stored but send no
+# email. Label submissions in the admin and run `manage.py train_spam_model`;
+# web processes load the new model within SPAM_MODEL_REFRESH seconds.
+SPAM_FILTER_ENABLED = os.environ.get('SPAM_FILTER_ENABLED', 'True') == 'True'
+SPAM_SCORE_THRESHOLD = float(os.environ.get('SPAM_SCORE_THRESHOLD', 0.95))
+SPAM_MODEL_REFRESH = float(os.environ.get('SPAM_MODEL_REFRESH', 300))
+
 # Allow lightweight async email delivery using a thread when Celery or
 # another worker is not configured. Set USE_EMAIL_THREADING=False to force
-# synchronous delivery (useful for debugging).
+# synchronous delivery (useful for debugging). Either way, email triggered by
+# a request is sent after its transaction commits (blog.utils.deliver_mail).
 USE_EMAIL_THREADING = os.environ.get('USE_EMAIL_THREADING', 'True') == 'True'
 USE_CELERY = os.environ.get('USE_CELERY', 'False') == 'True'
+# Background email runs on a bounded per-process pool (blog.mailpool): at
+# most EMAIL_WORKER_THREADS threads and EMAIL_QUEUE_SIZE queued jobs. When
+# the queue stays full for EMAIL_QUEUE_PUT_TIMEOUT seconds, email from a
+# request is saved to the outbox for run_mail_worker instead of being sent on
+# the request thread (other callers send it themselves). Queued email is
+# drained for up to EMAIL_DRAIN_TIMEOUT seconds when a worker exits (keep it
+# below gunicorn's graceful timeout).
+EMAIL_WORKER_THREADS = int(os.environ.get('EMAIL_WORKER_THREADS', 4))
+EMAIL_QUEUE_SIZE = int(os.environ.get('EMAIL_QUEUE_SIZE', 1000))
+EMAIL_QUEUE_PUT_TIMEOUT = float(os.environ.get('EMAIL_QUEUE_PUT_TIMEOUT', 1.0))
+EMAIL_DRAIN_TIMEOUT = float(os.environ.get('EMAIL_DRAIN_TIMEOUT', 25))
+# New-post notifications are sent over one SMTP connection in batches of
+# this many messages (see blog/dispatch.py).
+POST_NOTIFICATION_BATCH_SIZE = int(os.environ.get('POST_NOTIFICATION_BATCH_SIZE', 50))
+# Cap on notification emails per second per sending process (0 = no limit);
+# keeps bulk sends within the SMTP provider's rate limits.
+POST_NOTIFICATION_RATE_LIMIT = float(os.environ.get('POST_NOTIFICATION_RATE_LIMIT', 0))
+# Subscribers on digest delivery get one email per period listing the posts
+# published since the last run (blog/digest.py). Run `manage.py send_digest`
+# from cron, or let Celery beat call it every BLOG_DIGEST_INTERVAL seconds.
+BLOG_DIGEST_INTERVAL = int(os.environ.get('BLOG_DIGEST_INTERVAL', 7 * 24 * 60 * 60))
+CELERY_BEAT_SCHEDULE = {
+    'send-blog-digest': {
+        'task': 'blog.tasks.send_digest_task',
+        'schedule': BLOG_DIGEST_INTERVAL,
+    },
+}
+# Compiled (render-once) email templates kept per process; see blog/emails.py.
+EMAIL_TEMPLATE_CACHE_SIZE = int(os.environ.get('EMAIL_TEMPLATE_CACHE_SIZE', 64))
+# Email delivery metrics (blog/mailmetrics.py): counters and latency
+# histograms per kind of email, aggregated in memory and written to hourly
+# rows at most every MAIL_METRICS_FLUSH_INTERVAL seconds. Shown in the admin
+# under "Mail delivery metrics".
+MAIL_METRICS_ENABLED = os.environ.get('MAIL_METRICS_ENABLED', 'True') == 'True'
+MAIL_METRICS_FLUSH_INTERVAL = float(os.environ.get('MAIL_METRICS_FLUSH_INTERVAL', 60))
+# Load testing: EMAIL_BACKEND=blog.backends.SimulatedEmailBackend sends
+# nothing but waits EMAIL_SIMULATED_CONNECT_LATENCY seconds per connection
+# and EMAIL_SIMULATED_LATENCY (+ up to EMAIL_SIMULATED_JITTER) per message,
+# and rejects EMAIL_SIMULATED_FAILURE_RATE of them. See `benchmark_email`.
+EMAIL_SIMULATED_LATENCY = float(os.environ.get('EMAIL_SIMULATED_LATENCY', 0))
+EMAIL_SIMULATED_CONNECT_LATENCY = float(os.environ.get('EMAIL_SIMULATED_CONNECT_LATENCY', 0))
+EMAIL_SIMULATED_JITTER = float(os.environ.get('EMAIL_SIMULATED_JITTER', 0))
+EMAIL_SIMULATED_FAILURE_RATE = float(os.environ.get('EMAIL_SIMULATED_FAILURE_RATE', 0))
+
+# Durable email: when enabled, outgoing mail is written to blog.OutboxEmail
+# and delivered by `python manage.py run_mail_worker`, which retries failures
+# with exponential backoff (OUTBOX_BACKOFF_BASE * 2**n seconds, capped at
+# OUTBOX_BACKOFF_MAX) up to OUTBOX_MAX_ATTEMPTS times. Requires the worker
+# process to be running.
+USE_EMAIL_OUTBOX = os.environ.get('USE_EMAIL_OUTBOX', 'False') == 'True'
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_BACKOFF_BASE = int(os.environ.get('OUTBOX_BACKOFF_BASE', 30))
+OUTBOX_BACKOFF_MAX = int(os.environ.get('OUTBOX_BACKOFF_MAX', 60 * 60))
+OUTBOX_LOCK_TIMEOUT = int(os.environ.get('OUTBOX_LOCK_TIMEOUT', 10 * 60))
 
 # Auto-switch to SMTP if EMAIL_HOST is provided and EMAIL_BACKEND not explicitly set
 if not os.environ.get('EMAIL_BACKEND') and EMAIL_HOST:
@@ -278,12 +417,107 @@ if not os.environ.get('EMAIL_BACKEND') and EMAIL_HOST:
 if DEFAULT_FROM_EMAIL == 'no-reply@example.com' and EMAIL_HOST_USER:
     DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
-# Simple cache for rate-limiting middleware; local-memory by default
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Cache (also holds the rate-limit counters and the contact cooldown). In
+# production REDIS_URL must be set (render.yaml provisions a Key Value
+# instance) so every gunicorn worker shares one cache and the limits hold
+# site-wide. The local-memory fallback is per worker and meant for
+# development; RateLimitMiddleware warns when it is used with DEBUG off.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'myportfolio.cache.MeteredRedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'myportfolio.cache.MeteredLocMemCache',
+        }
     }
+
+# PDF rendering (myportfolio/pdfpool.py): WeasyPrint and ReportLab run in a
+# separate process per job, killed after PDF_JOB_TIMEOUT seconds and capped
+# at PDF_MEMORY_LIMIT_MB of address space. At most PDF_MAX_JOBS run at once
+# across all workers on the host (lock files in PDF_SLOT_DIR); a download
+# that gets no slot within PDF_QUEUE_WAIT seconds is answered with a 503.
+PDF_POOL_ENABLED = os.environ.get('PDF_POOL_ENABLED', 'True') == 'True'
+PDF_START_METHOD = os.environ.get('PDF_START_METHOD', 'forkserver')
+PDF_MAX_JOBS = int(os.environ.get('PDF_MAX_JOBS', 2))
+PDF_JOB_TIMEOUT = float(os.environ.get('PDF_JOB_TIMEOUT', 30))
+PDF_MEMORY_LIMIT_MB = int(os.environ.get('PDF_MEMORY_LIMIT_MB', 1024))
+PDF_QUEUE_WAIT = float(os.environ.get('PDF_QUEUE_WAIT', 5))
+PDF_SLOT_DIR = os.environ.get('PDF_SLOT_DIR', '')
+
+# Résumé PDF (portfolio/resume.py): built by WeasyPrint once per content
+# version on a Celery worker or a build thread, then served from media
+# storage. A download that finds a build in progress waits up to
+# RESUME_PDF_WAIT_SECONDS for it; a build running longer than
+# RESUME_PDF_BUILD_TIMEOUT is presumed dead and may be claimed again.
+RESUME_PDF_BACKGROUND = os.environ.get('RESUME_PDF_BACKGROUND', 'True') == 'True'
+RESUME_PDF_WAIT_SECONDS = float(os.environ.get('RESUME_PDF_WAIT_SECONDS', 15))
+RESUME_PDF_BUILD_TIMEOUT = float(os.environ.get('RESUME_PDF_BUILD_TIMEOUT', 120))
+RESUME_PDF_KEEP = int(os.environ.get('RESUME_PDF_KEEP', 3))
+
+# Logging (myportfolio/logqueue.py): with LOGGING_QUEUE the handlers in
+# LOGGING run on a background thread behind a bounded queue of
+# LOGGING_QUEUE_SIZE records, so writing logs and mailing admins never
+# blocks a request. Admin error emails are sent once per error fingerprint
+# every ADMIN_EMAIL_DEDUP_SECONDS, and at most ADMIN_EMAIL_MAX_PER_HOUR.
+LOGGING_CONFIG = 'myportfolio.logqueue.configure_logging'
+LOGGING_QUEUE = os.environ.get('LOGGING_QUEUE', 'True') == 'True'
+LOGGING_QUEUE_SIZE = int(os.environ.get('LOGGING_QUEUE_SIZE', 10000))
+ADMIN_EMAIL_DEDUP_SECONDS = int(os.environ.get('ADMIN_EMAIL_DEDUP_SECONDS', 600))
+ADMIN_EMAIL_MAX_PER_HOUR = int(os.environ.get('ADMIN_EMAIL_MAX_PER_HOUR', 20))
+
+# Readiness probes at /ready/ (myportfolio/health.py). Results are cached
+# per process for READINESS_CACHE_SECONDS; the storage and email probes,
+# which call outside services, for READINESS_SLOW_CACHE_SECONDS. A failing
+# optional probe reports "degraded" but keeps the worker in rotation.
+READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', 5))
+READINESS_SLOW_CACHE_SECONDS = float(os.environ.get('READINESS_SLOW_CACHE_SECONDS', 60))
+READINESS_PROBE_TIMEOUT = float(os.environ.get('READINESS_PROBE_TIMEOUT', 3))
+READINESS_OPTIONAL_PROBES = ['email']
+
+# Prometheus metrics at /metrics (myportfolio/metrics.py): requests and
+# latency per URL name, DB queries, cache hits per key prefix, emails and
+# rate-limit rejections. Each gunicorn worker writes its numbers to
+# METRICS_DIR every METRICS_FLUSH_INTERVAL seconds so any worker can answer
+# for all of them; leave it empty for a single process. Scrapers send
+# METRICS_TOKEN as a bearer token; without one only localhost may scrape.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Anonymous visitors never get a server-side session: flash messages live in
+# a signed cookie and the contact cooldown in RATELIMIT_CACHE (shared by all
+# workers once REDIS_URL is set), so django_session only holds logged-in
+# staff.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Rate limiting (myportfolio/middleware/ratelimit.py). Rates are
+# "<requests>/<period>", e.g. "5/10m"; policies are keyed by URL name and
+# apply to POSTs unless given as {'rate': ..., 'methods': [...]}. Other
+# POSTs get RATELIMIT_DEFAULT ('' to disable); RATELIMIT_EXEMPT namespaces
+# are never limited. Behind a reverse proxy set RATELIMIT_TRUSTED_PROXIES to
+# the number of proxies (1 on Render) so clients are told apart by
+# X-Forwarded-For instead of the proxy's address.
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True') == 'True'
+RATELIMIT_CACHE = 'default'
+RATELIMIT_TRUSTED_PROXIES = int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 0))
+RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '30/m')
+RATELIMIT_POLICIES = {
+    'portfolio:contact': '5/10m',
+    'portfolio:subscribe': '5/10m',
+    'portfolio:recommend': '5/10m',
+    'blog:subscribe': '5/10m',
+    'blog:manage_subscription': '5/10m',
+    'admin:login': '10/5m',
+    'admin_password_reset': '5/h',
 }
+RATELIMIT_EXEMPT = ['admin']
 
 # reCAPTCHA settings (optional)
 RECAPTCHA_SECRET = os.environ.get('RECAPTCHA_SECRET')
@@ -370,10 +604,9 @@ if not DEBUG:
     STORAGES = {
         # Explicit default file storage for user/uploaded media. Use the
         # backend selected by DEFAULT_FILE_STORAGE above (Cloudinary when
-        # credentials are provided, otherwise local filesystem).
-        "default": {
-            "BACKEND": DEFAULT_FILE_STORAGE,
-        },
+        # credentials are provided, otherwise local filesystem), wrapped by
+        # the deduplicating storage when MEDIA_DEDUP is on.
+        "default": _MEDIA_STORAGE,
         "staticfiles": {
             # Prefer the manifest-backed backend for filename hashing. As a safe
             # fallback (for environments where the manifest hasn't been generated
@@ -405,6 +638,7 @@ if not DEBUG:
 
     # Basic logging: stream logs to console so Render captures them in service logs.
     # This keeps configuration minimal while providing useful startup/runtime messages.
+    # Handlers run on a background thread (see LOGGING_QUEUE above).
     LOGGING = {
         'version': 1,
         'disable_existing_loggers': False,
@@ -420,7 +654,7 @@ if not DEBUG:
             },
             'mail_admins': {
                 'level': 'ERROR',
-                'class': 'django.utils.log.AdminEmailHandler',
+                'class': 'myportfolio.logqueue.DedupAdminEmailHandler',
                 'include_html': True,
             },
         },
@@ -1,3 +1,11 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import Storage
+from django.db import transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
 from whitenoise.storage import CompressedManifestStaticFilesStorage
 
 
@@ -29,3 +37,161 @@ class NonStrictManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
         except ValueError:
             # Manifest entry missing — fall back to the unhashed filename.
             return filename
+
+    def post_process(self, paths, dry_run=False, **options):
+        """Generate JS/CSS bundles and critical CSS before hashing.
+
+        The generated files (see ``myportfolio.bundling``) are added to
+        ``paths`` so they are hashed, compressed and written to the manifest
+        exactly like collected source files.
+        """
+        if not dry_run and getattr(settings, 'STATIC_BUNDLING', True):
+            from myportfolio.bundling import build_static_bundles
+
+            for name in build_static_bundles(self):
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+
+class StoredName(str):
+    """A name ``ContentAddressedStorage._save`` just took a reference for.
+
+    It reaches the model field unchanged (``FieldFile.save`` keeps what the
+    storage returned), so ``portfolio.signals`` can tell a re-upload of the
+    bytes a row already points at, which must give its old reference back,
+    from a save that left the file alone.
+    """
+
+
+class ContentAddressedStorage(Storage):
+    """Deduplicating media storage that names files by their SHA-256.
+
+    Wraps the media backend passed as ``backend`` (the ``STORAGES`` OPTIONS),
+    falling back to ``DEFAULT_FILE_STORAGE``. Every saved file is stored once
+    as ``blobs/<aa>/<sha256><ext>``; saving content that already exists only
+    bumps a reference count in ``portfolio.MediaBlob`` instead of writing the
+    bytes again. ``delete()`` decrements that count and removes the blob
+    from the wrapped backend when the last reference goes away, so deleting
+    one of several identical uploads (e.g. the same image used as ``logo``
+    and ``favicon``) never breaks the others.
+
+    Django never calls ``delete()`` itself when a row is deleted or a file
+    is replaced, so ``portfolio.signals`` does it for every FileField stored
+    here; ``manage.py gc_media_blobs`` recounts references from the
+    FileFields and collects what is left unreferenced.
+
+    Private uploads (``MEDIA_PRIVATE_PREFIXES``) and files that predate the
+    dedup backend have no ``MediaBlob`` row and are passed straight through
+    to the wrapped backend.
+    """
+
+    prefix = 'blobs'
+
+    def __init__(self, backend=None, options=None, prefix=None):
+        backend = (
+            backend
+            or getattr(settings, 'DEFAULT_FILE_STORAGE', None)
+            or 'django.core.files.storage.FileSystemStorage'
+        )
+        self.backend = backend
+        self.inner = import_string(backend)(**(options or {}))
+        if prefix is not None:
+            self.prefix = prefix
+
+    @staticmethod
+    def _blobs():
+        from django.apps import apps
+        return apps.get_model('portfolio', 'MediaBlob')
+
+    @staticmethod
+    def _digest(content):
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            digest.update(chunk)
+            size += len(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return digest.hexdigest(), size
+
+    def blob_name(self, sha256, original_name):
+        # The extension only keeps content types guessable (media serving,
+        # Cloudinary); identical bytes are matched on sha256 alone in _save()
+        ext = os.path.splitext(original_name)[1].lower()[:16]
+        return f'{self.prefix}/{sha256[:2]}/{sha256}{ext}'
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save(), so there is nothing to
+        # de-collide here.
+        return name
+
+    def _save(self, name, content):
+        from myportfolio.media import is_private
+        if is_private(name):
+            # Kept under its own path so MEDIA_PRIVATE_PREFIXES still hides it
+            return self.inner.save(name, content)
+        sha256, size = self._digest(content)
+        MediaBlob = self._blobs()
+        # Known content, whatever its name or extension: a single UPDATE, no
+        # bytes written.
+        with transaction.atomic():
+            known = MediaBlob.objects.select_for_update().filter(sha256=sha256).order_by('pk').first()
+            if known is not None:
+                MediaBlob.objects.filter(pk=known.pk).update(refcount=F('refcount') + 1)
+                return StoredName(known.name)
+        target = self.blob_name(sha256, name)
+        if self.inner.exists(target):
+            stored = target
+        else:
+            stored = self.inner.save(target, content)
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.get_or_create(
+                name=stored, defaults={'sha256': sha256, 'size': size, 'refcount': 1}
+            )
+            if not created:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+        return StoredName(stored)
+
+    def delete(self, name):
+        if not name:
+            return
+        MediaBlob = self._blobs()
+        with transaction.atomic():
+            if MediaBlob.objects.filter(name=name, refcount__gt=1).update(refcount=F('refcount') - 1):
+                return
+            deleted, _ = MediaBlob.objects.filter(name=name).delete()
+        if deleted or not name.startswith(f'{self.prefix}/'):
+            self.inner.delete(name)
+
+    # Everything else is served by the wrapped backend.
+
+    def _open(self, name, mode='rb'):
+        return self.inner.open(name, mode)
+
+    def exists(self, name):
+        return self.inner.exists(name)
+
+    def url(self, name):
+        return self.inner.url(name)
+
+    def size(self, name):
+        return self.inner.size(name)
+
+    def path(self, name):
+        return self.inner.path(name)
+
+    def listdir(self, path):
+        return self.inner.listdir(path)
+
+    def get_accessed_time(self, name):
+        return self.inner.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.inner.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.inner.get_modified_time(name)
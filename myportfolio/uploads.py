@@ -0,0 +1,106 @@
+"""Reject spam uploads before their file parts are read.
+
+Django only runs a form's honeypot check after ``MultiPartParser`` has read
+the whole body and spooled every upload to memory or disk. For the public
+forms, ``EarlyRejectMiddleware`` (myportfolio/middleware/earlyreject.py)
+wraps the request stream in a ``FieldSniffer``, which notes the plain fields
+as they stream past, and puts a ``HoneypotUploadHandler`` first in
+``request.upload_handlers``. When the parser reaches the first file part the
+handler checks the honeypot fields seen so far and aborts with
+``EarlyReject`` if one was filled in, so the (possibly megabytes of) file
+data behind it is never read. This relies on the templates rendering the
+honeypot before any file input.
+"""
+import re
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+_NAME = re.compile(rb'\bname="([^"]*)"', re.I)
+
+
+class EarlyReject(Exception):
+    """Abort a request while its body is being parsed."""
+
+    def __init__(self, reason, status=400):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+
+class FieldSniffer:
+    """Read-through wrapper around the request stream that records the
+    non-file multipart fields that come before the first file part.
+
+    Stops looking (and buffering) at the first file part or after ``limit``
+    bytes, whichever comes first.
+    """
+
+    def __init__(self, stream, boundary, limit=64 * 1024):
+        self.stream = stream
+        self.delimiter = b'--' + boundary
+        self.limit = limit
+        self.fields = {}
+        self.done = False
+        self._buf = b''
+        self._seen = 0
+
+    def read(self, *args, **kwargs):
+        data = self.stream.read(*args, **kwargs)
+        self._scan(data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        data = self.stream.readline(*args, **kwargs)
+        self._scan(data)
+        return data
+
+    def _scan(self, data):
+        if self.done or not data:
+            return
+        self._seen += len(data)
+        self._buf += data
+        parts = self._buf.split(self.delimiter)
+        # The last piece may still be incomplete
+        self._buf = parts.pop()
+        for part in parts:
+            head, sep, body = part.partition(b'\r\n\r\n')
+            if not sep:
+                continue
+            if b'filename=' in head:
+                self._stop()
+                return
+            match = _NAME.search(head)
+            if match:
+                if body.endswith(b'\r\n'):
+                    body = body[:-2]
+                self.fields[match.group(1).decode('latin-1')] = body.decode('utf-8', 'replace')
+        head, sep, _ = self._buf.partition(b'\r\n\r\n')
+        if (sep and b'filename=' in head) or self._seen > self.limit:
+            self._stop()
+
+    def _stop(self):
+        self.done = True
+        self._buf = b''
+
+
+class HoneypotUploadHandler(FileUploadHandler):
+    """Fails the upload at the first file part if a honeypot was filled in."""
+
+    def __init__(self, request=None, sniffer=None, honeypots=('hp',)):
+        super().__init__(request)
+        self.sniffer = sniffer
+        self.honeypots = honeypots
+        self.checked = False
+
+    def new_file(self, *args, **kwargs):
+        if not self.checked and self.sniffer is not None:
+            self.checked = True
+            if any(self.sniffer.fields.get(name) for name in self.honeypots):
+                raise EarlyReject('Spam detected')
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
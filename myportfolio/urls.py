@@ -46,6 +46,8 @@ urlpatterns = [
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Outside DEBUG, local media is served by myportfolio.middleware.media
+# (enabled with SERVE_MEDIA) before it reaches the URL resolver.
 
 # Custom error handlers (use our safe server_error view to provide a minimal context
 # so the 500 template can render even when context processors or DB access fail.)
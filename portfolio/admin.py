@@ -1,12 +1,13 @@
 from django.contrib import admin
-from .models import Message, Project, Testimonial, Tag, Profile, ExperienceItem, EducationItem, CertificationItem, AwardItem, SiteSettings, AchievementItem, SkillItem, GalleryItem, Subscription, Service
-from django.core.mail import send_mail
+from .models import SPAM, HAM, Message, Project, Testimonial, Tag, Profile, ExperienceItem, EducationItem, CertificationItem, AwardItem, SiteSettings, AchievementItem, SkillItem, GalleryItem, Service, MediaBlob, SpamModel, RequestProfile, ResumePDF
+from blog.utils import deliver_mail
 from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.urls import path
 from django.template.response import TemplateResponse
 from django import forms
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 
 
 class ReplyForm(forms.Form):
@@ -14,13 +15,25 @@ class ReplyForm(forms.Form):
 	body = forms.CharField(widget=forms.Textarea, initial='Thanks for contacting me. I will reply shortly.')
 
 
+def mark_spam(modeladmin, request, queryset):
+	updated = queryset.update(spam_label=SPAM)
+	modeladmin.message_user(request, f'{updated} item(s) marked as spam. Run train_spam_model to update the filter.')
+mark_spam.short_description = 'Mark selected as spam'
+
+
+def mark_not_spam(modeladmin, request, queryset):
+	updated = queryset.update(spam_label=HAM)
+	modeladmin.message_user(request, f'{updated} item(s) marked as not spam. Run train_spam_model to update the filter.')
+mark_not_spam.short_description = 'Mark selected as not spam'
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-	list_display = ('name', 'email', 'created_at', 'processed')
-	list_filter = ('processed', 'created_at')
+	list_display = ('name', 'email', 'created_at', 'processed', 'spam_score', 'spam_label')
+	list_filter = ('processed', 'spam_label', 'created_at')
 	search_fields = ('name', 'email', 'message')
-	readonly_fields = ('created_at','key')
-	actions = ['mark_processed']
+	readonly_fields = ('created_at','key','spam_score')
+	actions = ['mark_processed', mark_spam, mark_not_spam]
 
 	def get_urls(self):
 		urls = super().get_urls()
@@ -36,10 +49,10 @@ class MessageAdmin(admin.ModelAdmin):
 			if form.is_valid():
 				subject = form.cleaned_data['subject']
 				body = form.cleaned_data['body']
-				send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [message.email])
+				deliver_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [message.email])
 				message.processed = True
 				message.save()
-				self.message_user(request, 'Reply sent and message marked processed.')
+				self.message_user(request, 'Reply queued for sending and message marked processed.')
 				return redirect('..')
 		else:
 			form = ReplyForm()
@@ -94,13 +107,13 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Testimonial)
 class TestimonialAdmin(admin.ModelAdmin):
-	list_display = ('name', 'role', 'email', 'featured', 'order', 'created_at')
+	list_display = ('name', 'role', 'email', 'featured', 'order', 'created_at', 'spam_score', 'spam_label')
 	search_fields = ('name', 'role', 'email', 'content')
-	list_filter = ('featured', 'created_at')
-	readonly_fields = ('key',)
+	list_filter = ('featured', 'spam_label', 'created_at')
+	readonly_fields = ('key','spam_score')
 	list_editable = ('featured','order')
 
-	actions = ['notify_selected_featured']
+	actions = ['notify_selected_featured', mark_spam, mark_not_spam]
 
 	def save_model(self, request, obj, form, change):
 		# Detect if 'featured' changed to True and notify user if email provided
@@ -125,8 +138,8 @@ class TestimonialAdmin(admin.ModelAdmin):
 					f"Thanks again for your kind words. Your recommendation has just been featured on my portfolio.\n\n"
 					f"Best regards,\nDenis"
 				)
-				send_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [obj.email], fail_silently=True)
-				self.message_user(request, f"Notified {obj.email} about featuring.")
+				deliver_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [obj.email], fail_silently=True, idempotency_key=f'testimonial:{obj.pk}:featured')
+				self.message_user(request, f"Queued a featuring notice to {obj.email}.")
 			except Exception:
 				self.message_user(request, f"Could not notify {obj.email}.", level='warning')
 
@@ -142,11 +155,11 @@ class TestimonialAdmin(admin.ModelAdmin):
 						f"Thanks again for your kind words. Your recommendation has just been featured on my portfolio.\n\n"
 						f"Best regards,\nDenis"
 					)
-					send_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [t.email], fail_silently=True)
+					deliver_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [t.email], fail_silently=True)
 					count += 1
 				except Exception:
 					pass
-		self.message_user(request, f"Sent notifications to {count} user(s).")
+		self.message_user(request, f"Queued notifications to {count} user(s).")
 	notify_selected_featured.short_description = "Notify users for selected featured testimonials"
 
 
@@ -438,10 +451,114 @@ class GalleryItemAdmin(admin.ModelAdmin):
 		self.message_user(request, f"{updated} item(s) unpublished.")
 
 
-@admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
-	list_display = ('email','active','created_at')
-	list_filter = ('active','created_at')
-	search_fields = ('email',)
-	readonly_fields = ('created_at','token')
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+	list_display = ('name','size','refcount','created_at')
+	search_fields = ('name','sha256')
+	readonly_fields = ('name','sha256','size','refcount','created_at')
+
+	def has_add_permission(self, request):
+		# Rows are managed by ContentAddressedStorage
+		return False
+
+
+@admin.register(SpamModel)
+class SpamModelAdmin(admin.ModelAdmin):
+	list_display = ('created_at', 'spam_count', 'ham_count', 'token_count')
+	readonly_fields = ('created_at', 'spam_count', 'ham_count', 'prior')
+	exclude = ('weights',)
+
+	def token_count(self, obj):
+		return len(obj.weights or {})
+	token_count.short_description = 'Tokens'
+
+	def has_add_permission(self, request):
+		# Rows are written by `manage.py train_spam_model`
+		return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+	list_display = ('created_at', 'url_name', 'method', 'path', 'status_code', 'duration_ms', 'trigger', 'mode', 'samples')
+	list_filter = ('url_name', 'trigger', 'mode', 'status_code')
+	search_fields = ('path', 'url_name')
+	date_hierarchy = 'created_at'
+	readonly_fields = ('created_at', 'method', 'path', 'url_name', 'status_code', 'duration_ms', 'trigger', 'mode', 'samples', 'top_frames', 'download', 'output')
+	change_list_template = 'admin/portfolio/requestprofile/change_list.html'
+
+	def get_urls(self):
+		urls = super().get_urls()
+		custom = [
+			path('token/', self.admin_site.admin_view(self.token_view), name='portfolio_requestprofile_token'),
+			path('<int:profile_id>/folded/', self.admin_site.admin_view(self.folded_view), name='portfolio_requestprofile_folded'),
+		]
+		return custom + urls
+
+	def token_view(self, request):
+		from myportfolio.profiling import make_token
+		context = dict(
+			self.admin_site.each_context(request),
+			title='Profile a request',
+			token=make_token(),
+			max_age=getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 60 * 60),
+			opts=self.model._meta,
+		)
+		return TemplateResponse(request, 'admin/portfolio/requestprofile/token.html', context)
+
+	def folded_view(self, request, profile_id):
+		profile = self.get_object(request, profile_id)
+		if profile is None or profile.mode != RequestProfile.SAMPLE:
+			return redirect('..')
+		response = HttpResponse(profile.output, content_type='text/plain; charset=utf-8')
+		response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+		return response
+
+	def top_frames(self, obj):
+		if obj.mode != RequestProfile.SAMPLE:
+			return ''
+		from myportfolio.profiling import self_time
+		rows = self_time(obj.output)
+		if not rows:
+			return ''
+		return format_html(
+			'<table><tr><th>Samples</th><th>Frame</th></tr>{}</table>',
+			format_html_join('', '<tr><td>{}</td><td><code>{}</code></td></tr>', ((count, frame) for frame, count in rows)),
+		)
+	top_frames.short_description = 'Top frames (self time)'
+
+	def download(self, obj):
+		if not obj.pk or obj.mode != RequestProfile.SAMPLE:
+			return ''
+		from django.urls import reverse
+		url = reverse('admin:portfolio_requestprofile_folded', args=[obj.pk])
+		return format_html('<a href="{}">profile-{}.folded</a> (open in speedscope.app or pipe to flamegraph.pl)', url, obj.pk)
+	download.short_description = 'Flamegraph'
+
+	def has_add_permission(self, request):
+		# Rows are written by RequestProfilerMiddleware
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+
+def rebuild_resume(modeladmin, request, queryset):
+	from .resume import invalidate
+	row = invalidate()
+	modeladmin.message_user(request, f'Queued résumé PDF #{row.pk}.')
+rebuild_resume.short_description = 'Rebuild the résumé PDF now'
+
+
+@admin.register(ResumePDF)
+class ResumePDFAdmin(admin.ModelAdmin):
+	list_display = ('id', 'status', 'size', 'created_at', 'built_at', 'source')
+	list_filter = ('status',)
+	readonly_fields = ('status', 'source', 'file', 'size', 'etag', 'error', 'created_at', 'started_at', 'built_at')
+	actions = [rebuild_resume]
+
+	def has_add_permission(self, request):
+		# Rows are queued by portfolio.signals when the content changes
+		return False
 
+	def has_change_permission(self, request, obj=None):
+		return False
@@ -0,0 +1,101 @@
+"""Contact attachment helpers: bounded email attachments and signed links.
+
+Uploaded files are persisted to storage first (Django writes them in
+chunks), and the owner notification is built from the stored copies rather
+than from the request's upload objects. Small files are read back from
+storage and attached, up to a total budget; anything beyond the budget is
+replaced by a signed, expiring download link, so the memory held for one
+contact submission stays bounded no matter how many files were uploaded.
+"""
+import os
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+SIGNING_SALT = 'portfolio.attachment'
+
+
+def attachment_budget():
+    """Total bytes of stored attachments that may be embedded in one email."""
+    return int(getattr(settings, 'CONTACT_EMAIL_ATTACHMENT_MAX_BYTES', 2 * 1024 * 1024))
+
+
+def link_max_age():
+    return int(getattr(settings, 'CONTACT_ATTACHMENT_LINK_MAX_AGE', 60 * 60 * 24 * 7))
+
+
+def stored_attachments(message):
+    """Return ``(kind, pk, FieldFile)`` for every file stored for ``message``."""
+    files = []
+    if message.attachment:
+        files.append(('m', message.pk, message.attachment))
+    for att in message.attachments.all():
+        if att.file:
+            files.append(('a', att.pk, att.file))
+    return files
+
+
+def make_token(kind, pk):
+    return signing.dumps({'k': kind, 'id': pk}, salt=SIGNING_SALT, compress=True)
+
+
+def resolve_token(token):
+    """Return the FieldFile a token points at, or None if invalid/expired."""
+    from .models import Message, MessageAttachment
+
+    try:
+        data = signing.loads(token, salt=SIGNING_SALT, max_age=link_max_age())
+    except signing.BadSignature:
+        return None
+    try:
+        if data.get('k') == 'm':
+            f = Message.objects.get(pk=data.get('id')).attachment
+        elif data.get('k') == 'a':
+            f = MessageAttachment.objects.get(pk=data.get('id')).file
+        else:
+            return None
+    except (Message.DoesNotExist, MessageAttachment.DoesNotExist):
+        return None
+    return f or None
+
+
+def build_download_url(base_url, kind, pk):
+    path = reverse('portfolio:attachment_download', kwargs={'token': make_token(kind, pk)})
+    return base_url.rstrip('/') + path
+
+
+def attach_or_link(email_msg, message, base_url, refs=None):
+    """Attach stored files to ``email_msg`` within the byte budget.
+
+    Files that don't fit are listed in the body as signed download links.
+    When a ``refs`` list is given, files within the budget are appended to
+    it as ``{'name', 'filename'}`` storage references (for the outbox to
+    attach at delivery) instead of being read now.
+    Returns the list of links that were added.
+    """
+    remaining = attachment_budget()
+    links = []
+    for kind, pk, field_file in stored_attachments(message):
+        filename = os.path.basename(field_file.name)
+        try:
+            size = field_file.size
+        except Exception:
+            size = None
+        if size is not None and size <= remaining:
+            if refs is not None:
+                refs.append({'name': field_file.name, 'filename': filename})
+                remaining -= size
+                continue
+            try:
+                with field_file.storage.open(field_file.name, 'rb') as fh:
+                    email_msg.attach(filename, fh.read(), None)
+                remaining -= size
+                continue
+            except Exception:
+                pass
+        links.append((filename, build_download_url(base_url, kind, pk)))
+    if links:
+        lines = '\n'.join(f'- {name}: {url}' for name, url in links)
+        email_msg.body = f'{email_msg.body}\n\nAttachments (download links, valid for {link_max_age() // 86400} day(s)):\n{lines}'
+    return links
@@ -0,0 +1,74 @@
+"""Recount references to deduplicated media and collect unreferenced blobs.
+
+With ``MEDIA_DEDUP`` on, ``portfolio.MediaBlob.refcount`` is kept up to date
+as rows are saved and deleted (``portfolio.signals``). Changes that bypass
+model signals (``QuerySet.update``/``delete``, ``bulk_update``, raw SQL) and
+uploads made before those hooks existed leave it wrong. This command counts
+the references actually held by FileFields, fixes every row that disagrees
+and deletes blobs nothing points at.
+
+Blobs newer than ``--grace-seconds`` are never deleted: their row may still
+be on its way (the file is stored before the row is saved).
+
+Usage:
+  python manage.py gc_media_blobs --dry-run
+  python manage.py gc_media_blobs --grace-seconds 86400
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myportfolio.storage import ContentAddressedStorage
+from portfolio.management.commands.migrate_media import file_fields
+from portfolio.models import MediaBlob
+
+
+def count_references():
+    """``{name: references}`` over every FileField stored in deduplicated storage."""
+    counts = Counter()
+    for model, name in file_fields():
+        if not isinstance(model._meta.get_field(name).storage, ContentAddressedStorage):
+            continue
+        values = model._base_manager.exclude(**{f'{name}__isnull': True}).exclude(**{name: ''})
+        counts.update(values.values_list(name, flat=True).iterator())
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Fix MediaBlob reference counts from the FileFields and delete unreferenced blobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=3600,
+                            help='Never delete blobs younger than this (default 3600).')
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything.')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('Media storage is not deduplicated (MEDIA_DEDUP is off).')
+        counts = count_references()
+        cutoff = timezone.now() - timedelta(seconds=options['grace_seconds'])
+        fixed = removed = 0
+        for blob in MediaBlob.objects.order_by('pk').iterator():
+            references = counts.get(blob.name, 0)
+            if references == blob.refcount:
+                continue
+            if references:
+                fixed += 1
+                if not options['dry_run']:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=references)
+                continue
+            if blob.created_at > cutoff:
+                continue
+            removed += 1
+            self.stdout.write(f'Unreferenced: {blob.name}')
+            if not options['dry_run']:
+                blob.delete()
+                default_storage.inner.delete(blob.name)
+        prefix = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {fixed} reference count(s); {removed} unreferenced blob(s) '
+            f'{"to delete" if options["dry_run"] else "deleted"}'
+        ))
@@ -0,0 +1,284 @@
+"""Copy uploaded media between two Django storage backends.
+
+Replaces the one-file-at-a-time ``tools/migrate_media_to_cloudinary.py``
+script with a resumable, concurrent copy:
+
+  * every FileField/ImageField on every installed model is discovered
+    automatically and only the distinct file names are copied;
+  * files are hashed and uploaded on a thread pool, and identical content is
+    uploaded once (later names reuse the first upload);
+  * progress is checkpointed to a JSON manifest so a rerun skips work that
+    already finished;
+  * new names are written back with ``bulk_update`` in batches, which does
+    not call ``save()`` and therefore fires no model signals (no blog
+    "new post" emails are sent during a migration).
+
+Usage:
+  python manage.py migrate_media --to cloudinary_storage.storage.MediaCloudinaryStorage
+  python manage.py migrate_media --from-option location=/old/media \\
+      --to django.core.files.storage.FileSystemStorage --to-option location=/new/media
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils.module_loading import import_string
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def resolve_storage(spec, options=None):
+    """Return a storage instance from a STORAGES alias or a dotted class path."""
+    options = options or {}
+    if '.' not in spec:
+        if options:
+            raise CommandError('Storage options can only be used with a dotted class path.')
+        try:
+            return storages[spec]
+        except Exception as exc:
+            raise CommandError(f'Unknown storage alias {spec!r}: {exc}')
+    try:
+        cls = import_string(spec)
+    except ImportError as exc:
+        raise CommandError(f'Could not import storage {spec!r}: {exc}')
+    return cls(**options)
+
+
+def file_fields():
+    """Yield (model, field_name) for every concrete file field in the project."""
+    for model in apps.get_models():
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+class MediaMigrator:
+    """Copy all referenced media from ``source`` to ``dest`` storage.
+
+    The manifest is a small JSON document::
+
+        {"files": {"<old name>": {"sha256": "...", "name": "<new name>"}},
+         "hashes": {"<sha256>": "<new name>"}}
+
+    Entries are only recorded once the upload succeeded, so an interrupted
+    run can be restarted and will pick up where it stopped.
+    """
+
+    def __init__(self, source, dest, manifest_path, workers=8, batch_size=200,
+                 dry_run=False, log=None):
+        self.source = source
+        self.dest = dest
+        self.manifest_path = manifest_path
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.dry_run = dry_run
+        self.log = log or (lambda msg: None)
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+        self.stats = {'copied': 0, 'deduplicated': 0, 'skipped': 0, 'missing': 0, 'failed': 0, 'rows_updated': 0}
+
+    # -- manifest -----------------------------------------------------------
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            data = {}
+        except ValueError as exc:
+            raise CommandError(f'Manifest {self.manifest_path} is not valid JSON: {exc}')
+        data.setdefault('files', {})
+        data.setdefault('hashes', {})
+        return data
+
+    def _save_manifest(self):
+        """Atomically replace the manifest so a crash never leaves it truncated."""
+        if self.dry_run:
+            return
+        tmp = f'{self.manifest_path}.tmp'
+        with self._lock:
+            payload = json.dumps(self.manifest, indent=1, sort_keys=True)
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(payload)
+        os.replace(tmp, self.manifest_path)
+
+    # -- discovery ----------------------------------------------------------
+
+    def collect_references(self):
+        """Map each stored file name to the (model, field, pk) rows using it."""
+        refs = {}
+        for model, field_name in file_fields():
+            rows = (
+                model._default_manager.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list('pk', field_name)
+            )
+            for pk, name in rows.iterator(chunk_size=2000):
+                refs.setdefault(name, []).append((model, field_name, pk))
+        return refs
+
+    # -- copying ------------------------------------------------------------
+
+    def _hash(self, name):
+        digest = hashlib.sha256()
+        with self.source.open(name, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _upload(self, name):
+        with self.source.open(name, 'rb') as fh:
+            return self.dest.save(name, fh)
+
+    def _record(self, name, sha, new_name):
+        with self._lock:
+            self.manifest['files'][name] = {'sha256': sha, 'name': new_name}
+            self.manifest['hashes'].setdefault(sha, new_name)
+
+    def copy_files(self, names):
+        """Hash ``names`` and upload one copy of each distinct content."""
+        pending = [n for n in names if n not in self.manifest['files']]
+        self.stats['skipped'] += len(names) - len(pending)
+        if not pending:
+            return
+
+        # Phase 1: hash everything in parallel so duplicates are known
+        # before anything is uploaded.
+        by_hash = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._hash, name): name for name in pending}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    sha = fut.result()
+                except FileNotFoundError:
+                    self.stats['missing'] += 1
+                    self.log(f'missing: {name}')
+                    continue
+                except Exception as exc:
+                    self.stats['failed'] += 1
+                    self.log(f'failed to read {name}: {exc!r}')
+                    continue
+                by_hash.setdefault(sha, []).append(name)
+        for group in by_hash.values():
+            group.sort()
+
+        # Content already uploaded by a previous run needs no new upload.
+        for sha in list(by_hash):
+            known = self.manifest['hashes'].get(sha)
+            if known:
+                for name in by_hash.pop(sha):
+                    self._record(name, sha, known)
+                    self.stats['deduplicated'] += 1
+        self._save_manifest()
+
+        if self.dry_run:
+            for sha, group in by_hash.items():
+                self.log(f'dry-run: would upload {group[0]} ({len(group) - 1} duplicate(s))')
+            return
+
+        # Phase 2: upload one representative per hash.
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._upload, group[0]): (sha, group) for sha, group in by_hash.items()}
+            for fut in as_completed(futures):
+                sha, group = futures[fut]
+                try:
+                    new_name = fut.result()
+                except Exception as exc:
+                    self.stats['failed'] += len(group)
+                    self.log(f'failed to upload {group[0]}: {exc!r}')
+                    continue
+                for i, name in enumerate(group):
+                    self._record(name, sha, new_name)
+                    self.stats['copied' if i == 0 else 'deduplicated'] += 1
+                done += 1
+                if done % 50 == 0:
+                    self._save_manifest()
+        self._save_manifest()
+
+    # -- database -----------------------------------------------------------
+
+    def update_rows(self, refs):
+        """Point model fields at their new names using batched bulk_update."""
+        changes = {}
+        for old_name, rows in refs.items():
+            entry = self.manifest['files'].get(old_name)
+            if not entry or entry['name'] == old_name:
+                continue
+            for model, field_name, pk in rows:
+                changes.setdefault((model, field_name), []).append((pk, entry['name']))
+        for (model, field_name), pairs in changes.items():
+            if self.dry_run:
+                self.log(f'dry-run: would update {len(pairs)} {model._meta.label}.{field_name} row(s)')
+                continue
+            objs = []
+            for pk, new_name in pairs:
+                obj = model(pk=pk)
+                setattr(obj, field_name, new_name)
+                objs.append(obj)
+            # bulk_update issues UPDATE statements directly: no save(), no
+            # pre/post_save signals and no auto_now bumps.
+            model._default_manager.bulk_update(objs, [field_name], batch_size=self.batch_size)
+            self.stats['rows_updated'] += len(objs)
+
+    def run(self):
+        refs = self.collect_references()
+        self.log(f'{len(refs)} distinct file(s) referenced')
+        self.copy_files(sorted(refs))
+        self.update_rows(refs)
+        return self.stats
+
+
+def _parse_options(pairs):
+    opts = {}
+    for pair in pairs or []:
+        if '=' not in pair:
+            raise CommandError(f'Expected key=value, got {pair!r}')
+        key, value = pair.split('=', 1)
+        opts[key.strip()] = value
+    return opts
+
+
+class Command(BaseCommand):
+    help = 'Copy media referenced by model file fields from one storage backend to another (resumable, concurrent).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='source', default='default',
+                            help='Source storage: a STORAGES alias or dotted class path (default: "default")')
+        parser.add_argument('--to', dest='dest', required=True,
+                            help='Destination storage: a STORAGES alias or dotted class path')
+        parser.add_argument('--from-option', action='append', default=[], metavar='KEY=VALUE',
+                            help='Keyword argument for the source storage class (repeatable)')
+        parser.add_argument('--to-option', action='append', default=[], metavar='KEY=VALUE',
+                            help='Keyword argument for the destination storage class (repeatable)')
+        parser.add_argument('--manifest', default='media_migration.json',
+                            help='Checkpoint manifest path; reruns skip files recorded here')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent uploads')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows per bulk_update batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be copied without writing')
+
+    def handle(self, *args, **options):
+        source = resolve_storage(options['source'], _parse_options(options['from_option']))
+        dest = resolve_storage(options['dest'], _parse_options(options['to_option']))
+        migrator = MediaMigrator(
+            source, dest, options['manifest'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            log=lambda msg: self.stdout.write(msg),
+        )
+        stats = migrator.run()
+        summary = ', '.join(f'{k}={v}' for k, v in stats.items())
+        if stats['failed']:
+            self.stderr.write(self.style.WARNING(f'Finished with failures: {summary}. Rerun to retry.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Done: {summary}'))
@@ -0,0 +1,49 @@
+"""Retrain the contact/recommendation spam filter from admin labels.
+
+Reads every ``Message`` and ``Testimonial`` an admin marked "Spam" or "Not
+spam", fits the naive Bayes weights (``portfolio.spam.train``) and saves
+them as a new ``SpamModel`` row, which the web processes pick up within
+``SPAM_MODEL_REFRESH`` seconds. Older models beyond ``--keep`` are deleted.
+
+Usage:
+  python manage.py train_spam_model
+  python manage.py train_spam_model --min-samples 20 --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio import spam
+from portfolio.models import SpamModel
+
+
+class Command(BaseCommand):
+    help = 'Train the spam filter from messages and recommendations labelled in the admin.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-samples', type=int, default=5,
+                            help='Labelled examples needed of each class (default 5).')
+        parser.add_argument('--max-features', type=int, default=20000)
+        parser.add_argument('--keep', type=int, default=3, help='Trained models to keep.')
+        parser.add_argument('--dry-run', action='store_true', help='Train and report without saving.')
+
+    def handle(self, *args, **options):
+        samples = list(spam.training_samples())
+        n_spam = sum(1 for _, is_spam in samples if is_spam)
+        n_ham = len(samples) - n_spam
+        if min(n_spam, n_ham) < options['min_samples']:
+            raise CommandError(
+                f'Need at least {options["min_samples"]} spam and not-spam examples; '
+                f'have {n_spam} and {n_ham}. Label more submissions in the admin.'
+            )
+        model = spam.train(samples, max_features=options['max_features'])
+        correct = sum(1 for tokens, is_spam in samples if spam.is_spam(spam.probability(model, tokens)) == is_spam)
+        self.stdout.write(
+            f'{n_spam} spam / {n_ham} not spam, {len(model.weights)} tokens; '
+            f'{correct}/{len(samples)} training examples classified correctly'
+        )
+        if options['dry_run']:
+            return
+        model.save()
+        stale = SpamModel.objects.values_list('pk', flat=True)[max(1, options['keep']):]
+        SpamModel.objects.filter(pk__in=list(stale)).delete()
+        spam.reset()
+        self.stdout.write(self.style.SUCCESS(f'Saved {model}'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_merge_portfolio_subscriptions'),
+        ('portfolio', '0043_mediablob'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Subscription',
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('blog.subscriber',),
+        ),
+    ]
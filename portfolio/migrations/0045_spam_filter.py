@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0044_subscription_proxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('spam_count', models.PositiveIntegerField(default=0)),
+                ('ham_count', models.PositiveIntegerField(default=0)),
+                ('prior', models.FloatField(default=0.0)),
+                ('weights', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name': 'Spam model',
+                'verbose_name_plural': 'Spam models',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='spam_label',
+            field=models.CharField(blank=True, choices=[('spam', 'Spam'), ('ham', 'Not spam')], max_length=4),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='spam_score',
+            field=models.FloatField(blank=True, editable=False, help_text='Spam probability when received (portfolio.spam)', null=True),
+        ),
+        migrations.AddField(
+            model_name='testimonial',
+            name='spam_label',
+            field=models.CharField(blank=True, choices=[('spam', 'Spam'), ('ham', 'Not spam')], max_length=4),
+        ),
+        migrations.AddField(
+            model_name='testimonial',
+            name='spam_score',
+            field=models.FloatField(blank=True, editable=False, help_text='Spam probability when received (portfolio.spam)', null=True),
+        ),
+    ]
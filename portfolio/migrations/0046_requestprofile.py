@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0045_spam_filter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('url_name', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('status_code', models.PositiveSmallIntegerField(default=0)),
+                ('duration_ms', models.FloatField(default=0.0)),
+                ('trigger', models.CharField(choices=[('token', 'Staff token'), ('sampled', 'Random sample')], max_length=10)),
+                ('mode', models.CharField(default='sample', max_length=10)),
+                ('samples', models.PositiveIntegerField(default=0, help_text='Stack samples, or calls for cProfile')),
+                ('output', models.TextField(blank=True, help_text='Collapsed stacks (sample) or a pstats report (cprofile)')),
+            ],
+            options={
+                'verbose_name': 'Request profile',
+                'verbose_name_plural': 'Request profiles',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0046_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumePDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('building', 'Building'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('source', models.CharField(blank=True, help_text='Fingerprint of the templates it was built from', max_length=64)),
+                ('file', models.FileField(blank=True, upload_to='resume/')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('etag', models.CharField(blank=True, max_length=64)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Résumé PDF',
+                'verbose_name_plural': 'Résumé PDFs',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 import uuid
 from django.urls import reverse
+from blog.models import Subscriber
+
+
+# Labels admins give submissions; they are the training data for portfolio.spam
+SPAM = 'spam'
+HAM = 'ham'
+SPAM_LABEL_CHOICES = [(SPAM, 'Spam'), (HAM, 'Not spam')]
 
 
 class Message(models.Model):
@@ -11,6 +18,9 @@ class Message(models.Model):
     key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
+    spam_label = models.CharField(max_length=4, blank=True, choices=SPAM_LABEL_CHOICES)
+    spam_score = models.FloatField(null=True, blank=True, editable=False,
+                                   help_text='Spam probability when received (portfolio.spam)')
 
     class Meta:
         ordering = ['-created_at']
@@ -80,6 +90,9 @@ class Testimonial(models.Model):
     created_at = models.DateField(auto_now_add=True)
     featured = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0, help_text="Lower numbers appear first on listings")
+    spam_label = models.CharField(max_length=4, blank=True, choices=SPAM_LABEL_CHOICES)
+    spam_score = models.FloatField(null=True, blank=True, editable=False,
+                                   help_text='Spam probability when received (portfolio.spam)')
 
     class Meta:
         ordering = ['order', '-created_at', 'id']
@@ -411,15 +424,115 @@ class GalleryItem(models.Model):
         return self.external_url or ''
 
 
-class Subscription(models.Model):
-    """Simple newsletter/update subscription list."""
-    email = models.EmailField(unique=True)
+class Subscription(Subscriber):
+    """The site-wide subscriber list, seen from the portfolio app.
+
+    A proxy for ``blog.Subscriber`` so both subscribe forms share one
+    audience (one row and one token per address); the old table was merged
+    by ``blog`` migration 0010.
+    """
+
+    class Meta:
+        proxy = True
+
+
+class MediaBlob(models.Model):
+    """Reference-counted blob written by ``myportfolio.storage.ContentAddressedStorage``.
+
+    One row per unique stored file; ``refcount`` tracks how many saves point
+    at it so the blob is only removed when the last reference is deleted.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
-    active = models.BooleanField(default=True)
-    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, null=True)
 
     class Meta:
         ordering = ['-created_at']
+        verbose_name = 'Media blob'
+        verbose_name_plural = 'Media blobs'
+
+    def __str__(self):
+        return f"{self.name} (x{self.refcount})"
+
+
+class SpamModel(models.Model):
+    """Naive Bayes weights written by ``manage.py train_spam_model``.
+
+    ``weights`` maps each token to its log-likelihood ratio (spam vs. not
+    spam) and ``prior`` is the log ratio of the class counts; the newest row
+    is the one ``portfolio.spam`` scores with.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    spam_count = models.PositiveIntegerField(default=0)
+    ham_count = models.PositiveIntegerField(default=0)
+    prior = models.FloatField(default=0.0)
+    weights = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Spam model'
+        verbose_name_plural = 'Spam models'
+
+    def __str__(self):
+        return f"Spam model of {self.created_at:%Y-%m-%d %H:%M} ({self.spam_count} spam / {self.ham_count} ham)"
+
+
+class RequestProfile(models.Model):
+    """A profiled request (see ``myportfolio.profiling``)."""
+    TOKEN = 'token'
+    SAMPLED = 'sampled'
+    TRIGGER_CHOICES = [(TOKEN, 'Staff token'), (SAMPLED, 'Random sample')]
+    SAMPLE = 'sample'
+    CPROFILE = 'cprofile'
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    url_name = models.CharField(max_length=200, blank=True, db_index=True)
+    status_code = models.PositiveSmallIntegerField(default=0)
+    duration_ms = models.FloatField(default=0.0)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    mode = models.CharField(max_length=10, default=SAMPLE)
+    samples = models.PositiveIntegerField(default=0, help_text='Stack samples, or calls for cProfile')
+    output = models.TextField(blank=True, help_text='Collapsed stacks (sample) or a pstats report (cprofile)')
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Request profile'
+        verbose_name_plural = 'Request profiles'
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class ResumePDF(models.Model):
+    """One build of the résumé PDF served at /about.pdf (see ``portfolio.resume``).
+
+    A new row is queued whenever the profile, its items or the site settings
+    change; the newest row is the current version.
+    """
+    PENDING = 'pending'
+    BUILDING = 'building'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (BUILDING, 'Building'), (READY, 'Ready'), (FAILED, 'Failed')]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    source = models.CharField(max_length=64, blank=True, help_text='Fingerprint of the templates it was built from')
+    file = models.FileField(upload_to='resume/', blank=True)
+    size = models.PositiveIntegerField(default=0)
+    etag = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Résumé PDF'
+        verbose_name_plural = 'Résumé PDFs'
 
     def __str__(self):
-        return f"{self.email} ({'active' if self.active else 'inactive'})"
+        return f"Résumé PDF #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,112 @@
+"""PDF renderers run by ``myportfolio.pdfpool`` in a separate process.
+
+Nothing here touches Django: the child process gets plain data (the HTML of
+the About page, the project list) and writes the PDF to ``out_path``. Keep
+it that way, so a job never needs the database or settings and stays cheap
+to start.
+"""
+import importlib.util
+
+
+def available(module):
+    """Whether ``module`` is installed, without importing it here."""
+    return importlib.util.find_spec(module) is not None
+
+
+def weasyprint_pdf(out_path, html, base_url=None, stylesheet=None):
+    """The résumé: ``html`` rendered by WeasyPrint."""
+    import weasyprint  # type: ignore
+    stylesheets = [weasyprint.CSS(filename=stylesheet)] if stylesheet else None
+    weasyprint.HTML(string=html, base_url=base_url).write_pdf(out_path, stylesheets=stylesheets)
+
+
+def portfolio_pdf(out_path, projects, site_url):
+    """The project listing drawn with ReportLab.
+
+    ``projects`` is a list of ``(title, tech, description)`` strings, newest
+    first.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import simpleSplit
+
+    c = canvas.Canvas(out_path, pagesize=A4)
+    width, height = A4
+
+    # Margins
+    margin_x = 20 * mm
+    margin_y = 20 * mm
+    y = height - margin_y
+
+    # Title
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(margin_x, y, "Denis Lokwo — Portfolio")
+    y -= 12 * mm
+
+    # Intro
+    c.setFont("Helvetica", 11)
+    intro = (
+        "Selected projects and highlights. For live demos and full details, visit the website."
+    )
+    for line in simpleSplit(intro, "Helvetica", 11, width - 2 * margin_x):
+        c.drawString(margin_x, y, line)
+        y -= 6 * mm
+
+    y -= 4 * mm
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(margin_x, y, "Projects")
+    y -= 8 * mm
+
+    c.setFont("Helvetica", 11)
+    for title, tech, desc in projects:
+        # Ensure there is space, else new page
+        min_block = 18 * mm
+        if y < margin_y + min_block:
+            c.showPage()
+            y = height - margin_y
+            c.setFont("Helvetica", 11)
+
+        # Title line
+        for line in simpleSplit(title, "Helvetica", 11, width - 2 * margin_x):
+            c.drawString(margin_x, y, line)
+            y -= 6 * mm
+
+        # Technologies
+        if tech:
+            for line in simpleSplit(f"Tech: {tech}", "Helvetica", 10, width - 2 * margin_x):
+                c.drawString(margin_x, y, line)
+                y -= 5 * mm
+
+        # Description (short)
+        if desc:
+            lines = simpleSplit(desc, "Helvetica", 10, width - 2 * margin_x)
+            for line in lines[:5]:
+                c.drawString(margin_x, y, line)
+                y -= 5 * mm
+
+        y -= 3 * mm
+
+    # Footer note
+    if y < margin_y + 12 * mm:
+        c.showPage()
+        y = height - margin_y
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawString(margin_x, margin_y, f"Generated from Denis Lokwo Portfolio — {site_url}")
+
+    c.showPage()
+    c.save()
+
+
+def portfolio_fallback_pdf(out_path):
+    """Minimal one-page PDF for when the full listing cannot be rendered."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(out_path, pagesize=A4)
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(50, 800, "Denis Lokwo — Portfolio")
+    c.setFont("Helvetica", 12)
+    c.drawString(50, 780, "Portfolio PDF temporarily simplified.")
+    c.showPage()
+    c.save()
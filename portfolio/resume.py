@@ -0,0 +1,275 @@
+"""Résumé PDF (/about.pdf), built once per content version.
+
+Rendering ``about.html`` through WeasyPrint takes seconds of CPU, so it no
+longer happens per download. Saving a Profile, one of its items or the
+SiteSettings queues a new ``ResumePDF`` row (``invalidate``, from
+``portfolio.signals``). A Celery worker, or a dedicated build thread in
+the web process without Celery, builds it and stores the file in media
+storage along with its size and a SHA-256 ETag. A template or stylesheet
+change (a deploy) also counts as a new version, noticed on the next
+download.
+
+Builds are claimed with a conditional UPDATE, so however many workers are
+asked to build a version, only one does. A download that finds the current
+version still building polls for it for up to ``RESUME_PDF_WAIT_SECONDS``
+rather than starting another build. If it is still not ready after that, or
+the build failed, the previous PDF is served; only when there is none does
+the view fall back to the uploaded or static résumé.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import HttpRequest
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import ResumePDF
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE = 'about.html'
+POLL_INTERVAL = 0.2
+BUILD_QUEUE_SIZE = 8
+
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+_invalidate_lock = threading.Lock()
+_executor = {}
+_source = {}
+
+
+def _stylesheet():
+    css_dir = settings.BASE_DIR / 'portfolio' / 'static' / 'css'
+    # A dedicated print stylesheet avoids the modern CSS in styles.css that
+    # WeasyPrint warns about
+    for name in ('print.css', 'styles.css'):
+        if (css_dir / name).exists():
+            return css_dir / name
+    return None
+
+
+def source_key():
+    """Fingerprint of the template and stylesheet, computed once per process."""
+    if 'key' not in _source:
+        from django.template.loader import get_template
+        digest = hashlib.sha256()
+        try:
+            origin = get_template(TEMPLATE).origin.name
+            with open(origin, 'rb') as f:
+                digest.update(f.read())
+        except Exception:
+            digest.update(TEMPLATE.encode())
+        stylesheet = _stylesheet()
+        if stylesheet is not None:
+            digest.update(stylesheet.read_bytes())
+        _source['key'] = digest.hexdigest()[:16]
+    return _source['key']
+
+
+def _site_request():
+    """A bare GET /about/ for rendering outside a request, and its base URL."""
+    from django.contrib.auth.models import AnonymousUser
+    # The first host that ALLOWED_HOSTS itself accepts
+    host = next(iter(settings.ALLOWED_HOSTS or ['localhost']))
+    host = 'localhost' if host == '*' else host.lstrip('.')
+    scheme = 'http' if settings.DEBUG else 'https'
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = '/about/'
+    request.META.update({
+        'HTTP_HOST': host, 'SERVER_NAME': host, 'SERVER_PORT': '80' if settings.DEBUG else '443',
+        'wsgi.url_scheme': scheme,
+    })
+    if scheme == 'https':
+        request.is_secure = lambda: True
+    request.user = AnonymousUser()
+    return request, f'{scheme}://{host}/'
+
+
+def render_html():
+    request, base_url = _site_request()
+    return render_to_string(TEMPLATE, request=request), base_url
+
+
+def render_pdf(html, base_url=None):
+    """PDF bytes for ``html``, rendered in a ``myportfolio.pdfpool`` process
+    (raises ImportError if WeasyPrint is unavailable)."""
+    from myportfolio.pdfpool import render_bytes
+    from .pdfrender import available, weasyprint_pdf
+    if not available('weasyprint'):
+        raise ImportError('weasyprint')
+    stylesheet = _stylesheet()
+    # A background build can wait for a slot, within the lifetime of its claim
+    wait = float(getattr(settings, 'RESUME_PDF_BUILD_TIMEOUT', 120)) / 2
+    return render_bytes(weasyprint_pdf, html, base_url, str(stylesheet) if stylesheet else None,
+                        wait=wait)
+
+
+def current():
+    return ResumePDF.objects.first()
+
+
+def invalidate():
+    """Queue a build of the current content unless one is already waiting to start."""
+    with _invalidate_lock:
+        row = current()
+        if row is None or row.status != ResumePDF.PENDING:
+            row = ResumePDF.objects.create(source=source_key())
+    schedule(row.pk)
+    return row
+
+
+def schedule(pk):
+    """Build ``pk`` in the background (inline with ``RESUME_PDF_BACKGROUND=False``)."""
+    with _scheduled_lock:
+        if pk in _scheduled:
+            return
+        _scheduled.add(pk)
+
+    def _run():
+        try:
+            build(pk)
+        finally:
+            with _scheduled_lock:
+                _scheduled.discard(pk)
+
+    if not getattr(settings, 'RESUME_PDF_BACKGROUND', True):
+        _run()
+        return
+    if getattr(settings, 'USE_CELERY', False):
+        try:
+            from .tasks import build_resume_pdf_task
+            build_resume_pdf_task.delay(pk)
+            with _scheduled_lock:
+                _scheduled.discard(pk)
+            return
+        except Exception:
+            # Celery missing or broker unreachable: build locally
+            pass
+
+    def _run_in_pool():
+        try:
+            _run()
+        finally:
+            # The builder thread outlives the job; don't keep its connection open
+            close_old_connections()
+
+    if not _builder().submit(_run_in_pool):
+        # Queue full: left PENDING for the next download's nudge to retry
+        with _scheduled_lock:
+            _scheduled.discard(pk)
+
+
+def _builder():
+    """This process's single build thread (fork-safe).
+
+    Not ``blog.mailpool``: its caller-runs backpressure could render on a
+    request thread, and multi-second builds would hold up email.
+    """
+    pid = os.getpid()
+    if _executor.get('pid') != pid:
+        with _scheduled_lock:
+            if _executor.get('pid') != pid:
+                from blog.mailpool import BoundedExecutor
+                _executor['pool'] = BoundedExecutor(max_workers=1, max_queue=BUILD_QUEUE_SIZE, put_timeout=0,
+                                                    name='resume-pdf', caller_runs=False)
+                _executor['pid'] = pid
+    return _executor['pool']
+
+
+def _claim(pk):
+    timeout = float(getattr(settings, 'RESUME_PDF_BUILD_TIMEOUT', 120))
+    stale = timezone.now() - timedelta(seconds=timeout)
+    # A build that has been running for longer than that is presumed dead
+    claimable = Q(status=ResumePDF.PENDING) | Q(status=ResumePDF.BUILDING, started_at__lt=stale)
+    return ResumePDF.objects.filter(claimable, pk=pk).update(
+        status=ResumePDF.BUILDING, started_at=timezone.now()) == 1
+
+
+def build(pk):
+    """Render and store version ``pk`` if nobody else is; returns the row or None."""
+    if ResumePDF.objects.filter(pk__gt=pk).exists():
+        # Superseded (another worker queued a version at the same time); the
+        # newer one renders the same content
+        ResumePDF.objects.filter(pk=pk, status=ResumePDF.PENDING).delete()
+        return None
+    if not _claim(pk):
+        return None
+    row = ResumePDF.objects.get(pk=pk)
+    row.source = source_key()
+    try:
+        html, base_url = render_html()
+        pdf = render_pdf(html, base_url)
+    except Exception as exc:
+        if isinstance(exc, ImportError):
+            logger.warning('WeasyPrint is not installed; resume PDF #%s not built', pk)
+        else:
+            logger.exception('Could not build resume PDF #%s', pk)
+        row.status = ResumePDF.FAILED
+        row.error = f'{type(exc).__name__}: {exc}'[:2000]
+        row.built_at = timezone.now()
+        row.save(update_fields=['source', 'status', 'error', 'built_at'])
+        return row
+    row.etag = hashlib.sha256(pdf).hexdigest()
+    row.size = len(pdf)
+    row.file.save(f'resume-{pk}-{row.etag[:12]}.pdf', ContentFile(pdf), save=False)
+    row.status = ResumePDF.READY
+    row.built_at = timezone.now()
+    row.save(update_fields=['source', 'etag', 'size', 'file', 'status', 'built_at'])
+    prune()
+    return row
+
+
+def prune(keep=None):
+    """Delete all but the newest ``keep`` finished builds and their files."""
+    keep = int(getattr(settings, 'RESUME_PDF_KEEP', 3) if keep is None else keep)
+    done = ResumePDF.objects.filter(status__in=(ResumePDF.READY, ResumePDF.FAILED))
+    for row in done[keep:]:
+        if row.file:
+            try:
+                row.file.delete(save=False)
+            except Exception:
+                logger.exception('Could not delete %s', row.file.name)
+        row.delete()
+
+
+def _wait(row, timeout):
+    deadline = time.monotonic() + timeout
+    nudge_at = time.monotonic() + min(timeout / 2, 5)
+    while row.status in (ResumePDF.PENDING, ResumePDF.BUILDING) and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        try:
+            row.refresh_from_db()
+        except ResumePDF.DoesNotExist:
+            # Superseded: wait for the version that replaced it
+            row = current()
+            if row is None:
+                return None
+        if row.status == ResumePDF.PENDING and nudge_at and time.monotonic() >= nudge_at:
+            # Nobody has picked it up (lost job, restarted worker): ask once
+            # more; _claim still lets only one build run
+            nudge_at = None
+            schedule(row.pk)
+    return row
+
+
+def get_resume(timeout=None):
+    """The ``ResumePDF`` to serve, or None when no build has ever succeeded."""
+    if timeout is None:
+        timeout = float(getattr(settings, 'RESUME_PDF_WAIT_SECONDS', 15))
+    row = current()
+    if row is None or row.source != source_key():
+        row = invalidate()
+    if row is not None and row.status in (ResumePDF.PENDING, ResumePDF.BUILDING):
+        row = _wait(row, timeout)
+    if row is not None and row.status == ResumePDF.READY:
+        return row
+    return ResumePDF.objects.filter(status=ResumePDF.READY).first()
@@ -0,0 +1,83 @@
+import functools
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from myportfolio.storage import ContentAddressedStorage, StoredName
+
+from .models import (
+    AchievementItem, AwardItem, CertificationItem, EducationItem, ExperienceItem, Profile, SiteSettings, SkillItem,
+)
+
+# Everything about.html (and so the résumé PDF) is rendered from
+RESUME_SOURCES = (
+    Profile, ExperienceItem, EducationItem, CertificationItem, AwardItem, AchievementItem, SkillItem, SiteSettings,
+)
+
+
+def rebuild_resume(sender, **kwargs):
+    """Queue a new résumé PDF once the change is committed (see ``portfolio.resume``)."""
+    if kwargs.get('raw'):
+        # loaddata
+        return
+    from .resume import invalidate
+    transaction.on_commit(invalidate)
+
+
+for _model in RESUME_SOURCES:
+    post_save.connect(rebuild_resume, sender=_model, dispatch_uid=f'resume_post_save_{_model.__name__}')
+    post_delete.connect(rebuild_resume, sender=_model, dispatch_uid=f'resume_post_delete_{_model.__name__}')
+
+
+# Reference counts of deduplicated media (myportfolio.storage). Django
+# leaves the old file in place when a row is deleted or a FileField is
+# replaced; with ContentAddressedStorage that reference is released once
+# the change is committed, and the blob goes with its last reference.
+
+@functools.lru_cache(maxsize=None)
+def _file_fields(model):
+    return tuple(f for f in model._meta.concrete_fields if isinstance(f, models.FileField))
+
+
+def _dedup_fields(instance):
+    return [f for f in _file_fields(type(instance)) if isinstance(f.storage, ContentAddressedStorage)]
+
+
+def _release(storage, name):
+    transaction.on_commit(lambda: storage.delete(name))
+
+
+def remember_stored_files(sender, instance, raw=False, **kwargs):
+    fields = _dedup_fields(instance)
+    if raw or not fields or instance._state.adding or instance.pk is None:
+        return
+    old = sender._base_manager.filter(pk=instance.pk).values(*[f.attname for f in fields]).first()
+    instance._stored_files = old or {}
+
+
+def release_replaced_files(sender, instance, raw=False, **kwargs):
+    old = instance.__dict__.pop('_stored_files', None) or {}
+    for field in _dedup_fields(instance):
+        file = getattr(instance, field.attname)
+        uploaded = isinstance(file.name, StoredName)
+        if uploaded:
+            # Counted once: later saves of this instance don't re-upload
+            file.name = str(file.name)
+        previous = old.get(field.attname)
+        if raw or not previous:
+            continue
+        # Same bytes uploaded again still took a new reference
+        if previous != file.name or uploaded:
+            _release(field.storage, previous)
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in _dedup_fields(instance):
+        name = getattr(instance, field.attname).name
+        if name:
+            _release(field.storage, name)
+
+
+pre_save.connect(remember_stored_files, dispatch_uid='media_blobs_pre_save')
+post_save.connect(release_replaced_files, dispatch_uid='media_blobs_post_save')
+post_delete.connect(release_deleted_files, dispatch_uid='media_blobs_post_delete')
@@ -0,0 +1,130 @@
+"""Local naive Bayes spam filter for contact messages and recommendations.
+
+Admins label submissions "Spam" / "Not spam" with the admin actions;
+``manage.py train_spam_model`` turns the labelled rows into a
+``SpamModel`` (per-token log-likelihood ratios plus a class prior). The
+``contact`` and ``recommend`` views then score every submission: tokenise,
+sum the weights of the known tokens and squash the total into a
+probability. That is one regex pass and a dict lookup per word, about
+40 microseconds for an 80-word message. Submissions scoring at least
+``SPAM_SCORE_THRESHOLD`` are saved for review but send no email.
+
+Until a model has been trained every score is None and nothing is held
+back. Each process reloads the newest model at most every
+``SPAM_MODEL_REFRESH`` seconds.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .models import SPAM, Message, SpamModel, Testimonial
+
+_TOKEN = re.compile(r"[a-z0-9$€£']{2,}")
+_URL = re.compile(r'https?://|www\.')
+# Keeps the exp() in the logistic function in range
+_MAX_LOGIT = 30.0
+
+_lock = threading.Lock()
+_cached = {'model': None, 'loaded_at': None}
+
+
+def features(name='', email='', text=''):
+    """Tokens for one submission: words, the sender's domain and link markers."""
+    text = f'{name} {text}'.lower()
+    tokens = _TOKEN.findall(text)
+    domain = email.rpartition('@')[2].lower()
+    if domain:
+        tokens.append(f'@{domain}')
+    links = len(_URL.findall(text))
+    if links:
+        tokens.append('__link__')
+        if links > 2:
+            tokens.append('__many_links__')
+    return tokens
+
+
+def training_samples():
+    """Yield ``(tokens, is_spam)`` for every labelled message and recommendation."""
+    for name, email, text, label in Message.objects.exclude(spam_label='').values_list(
+            'name', 'email', 'message', 'spam_label').iterator():
+        yield features(name, email, text), label == SPAM
+    for name, email, role, text, label in Testimonial.objects.exclude(spam_label='').values_list(
+            'name', 'email', 'role', 'content', 'spam_label').iterator():
+        yield features(name, email, f'{role} {text}'), label == SPAM
+
+
+def train(samples, max_features=20000):
+    """Fit multinomial naive Bayes (Laplace smoothing) on ``(tokens, is_spam)`` pairs.
+
+    Returns an unsaved ``SpamModel``. Only the ``max_features`` most
+    telling tokens are kept.
+    """
+    counts = {True: Counter(), False: Counter()}
+    docs = {True: 0, False: 0}
+    for tokens, is_spam in samples:
+        counts[is_spam].update(tokens)
+        docs[is_spam] += 1
+    vocabulary = set(counts[True]) | set(counts[False])
+    spam_total = sum(counts[True].values()) + len(vocabulary)
+    ham_total = sum(counts[False].values()) + len(vocabulary)
+    weights = {
+        token: math.log((counts[True][token] + 1) / spam_total) - math.log((counts[False][token] + 1) / ham_total)
+        for token in vocabulary
+    }
+    if len(weights) > max_features:
+        keep = sorted(weights, key=lambda t: abs(weights[t]), reverse=True)[:max_features]
+        weights = {t: weights[t] for t in keep}
+    prior = math.log((docs[True] + 1) / (docs[False] + 1))
+    return SpamModel(
+        spam_count=docs[True], ham_count=docs[False], prior=prior,
+        weights={t: round(w, 4) for t, w in weights.items()},
+    )
+
+
+def probability(model, tokens):
+    weights = model.weights
+    logit = model.prior + sum(weights.get(t, 0.0) for t in tokens)
+    logit = max(-_MAX_LOGIT, min(_MAX_LOGIT, logit))
+    return 1.0 / (1.0 + math.exp(-logit))
+
+
+def current_model():
+    """The newest trained model (or None), reloaded every SPAM_MODEL_REFRESH seconds."""
+    refresh = float(getattr(settings, 'SPAM_MODEL_REFRESH', 300))
+    now = time.monotonic()
+    loaded_at = _cached['loaded_at']
+    if loaded_at is None or now - loaded_at >= refresh:
+        with _lock:
+            if _cached['loaded_at'] is None or now - _cached['loaded_at'] >= refresh:
+                _cached['model'] = SpamModel.objects.first()
+                _cached['loaded_at'] = now
+    return _cached['model']
+
+
+def reset():
+    """Forget the cached model so the next score reloads it."""
+    with _lock:
+        _cached['model'] = None
+        _cached['loaded_at'] = None
+
+
+def score_submission(name='', email='', text=''):
+    """Spam probability for a submission, or None when no model is trained."""
+    if not getattr(settings, 'SPAM_FILTER_ENABLED', True):
+        return None
+    try:
+        model = current_model()
+    except Exception:
+        # A missing table (before migrate) must not break the form
+        return None
+    if model is None:
+        return None
+    return probability(model, features(name, email, text))
+
+
+def is_spam(score):
+    return score is not None and score >= float(getattr(settings, 'SPAM_SCORE_THRESHOLD', 0.95))
@@ -0,0 +1,15 @@
+"""Optional Celery tasks for the portfolio app.
+
+Defined only when Celery is installed; ``portfolio.resume`` falls back to
+the local background pool otherwise.
+"""
+try:
+    from celery import shared_task
+
+    @shared_task
+    def build_resume_pdf_task(pk):
+        from .resume import build
+        row = build(pk)
+        return row.status if row is not None else None
+except Exception:
+    pass
@@ -40,6 +40,74 @@ def absolute_url(context, url_path: str) -> str:
     return url_path
 
 
+_CRITICAL_CSS_CACHE = {}
+
+
+def _bundle_built(name: str) -> bool:
+    """True when collectstatic produced ``name`` (it is in the manifest)."""
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    return name in (getattr(staticfiles_storage, 'hashed_files', None) or {})
+
+
+def _critical_css(template_name: str) -> str:
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    from myportfolio.bundling import critical_name
+
+    name = critical_name(template_name)
+    if not _bundle_built(name):
+        return ''
+    hashed = staticfiles_storage.hashed_files[name]
+    if hashed not in _CRITICAL_CSS_CACHE:
+        try:
+            with staticfiles_storage.open(hashed) as fh:
+                css = fh.read().decode('utf-8')
+        except Exception:
+            css = ''
+        _CRITICAL_CSS_CACHE[hashed] = css.replace('</', '<\\/')
+    return _CRITICAL_CSS_CACHE[hashed]
+
+
+@register.simple_tag
+def bundle_js(name: str) -> str:
+    """Script tag(s) for a STATIC_BUNDLES entry.
+    Uses the minified bundle after collectstatic, the source files otherwise.
+    Usage: {% bundle_js 'home' %}
+    """
+    from django.utils.html import format_html, format_html_join
+    from myportfolio.bundling import bundle_config, bundle_name
+
+    if _bundle_built(bundle_name(name, 'js')):
+        return format_html('<script src="{}"></script>', static(bundle_name(name, 'js')))
+    sources = bundle_config().get(name, {}).get('js', [])
+    return format_html_join('\n', '<script src="{}"></script>', ((static(s),) for s in sources))
+
+
+@register.simple_tag(takes_context=True)
+def bundle_css(context, name: str = 'site') -> str:
+    """Stylesheet for a STATIC_BUNDLES entry with critical CSS inlined.
+    When collectstatic generated critical CSS for the page being rendered it
+    is inlined and the full bundle is loaded without blocking first paint.
+    Usage: {% bundle_css 'site' %}
+    """
+    from django.utils.html import format_html, format_html_join
+    from myportfolio.bundling import bundle_config, bundle_name
+
+    if not _bundle_built(bundle_name(name, 'css')):
+        sources = bundle_config().get(name, {}).get('css', [])
+        return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(s),) for s in sources))
+    href = static(bundle_name(name, 'css'))
+    template = getattr(context, 'template', None)
+    critical = _critical_css(template.name) if template is not None and template.name else ''
+    if not critical:
+        return format_html('<link rel="stylesheet" href="{}">', href)
+    return format_html(
+        '<style>{}</style>\n'
+        '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '<noscript><link rel="stylesheet" href="{}"></noscript>',
+        mark_safe(critical), href, href,
+    )
+
+
 def _tech_badge_svg(label: str, size: int = 18, color_a: str = "#6366f1", color_b: str = "#60a5fa") -> str:
     label = (label or "").strip()[:3]
     svg = f'''
@@ -1,13 +1,29 @@
-from django.test import TestCase, override_settings
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from .models import Message, Subscription, Testimonial
 from django.core import mail
 from django.conf import settings
 from django.core.cache import cache
+import os
 import time
+import unittest
+import warnings
 
+# Delivery metrics are aggregated per process and flushed on exit, after the
+# test database is gone; only MailMetricsTests turns them on. Résumé PDFs are
+# built inline: a pool thread could not see the test transaction's rows.
+_mail_metrics_off = override_settings(MAIL_METRICS_ENABLED=False, RESUME_PDF_BACKGROUND=False)
 
-@override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.SimpleRateLimitMiddleware'])
+
+def setUpModule():
+	_mail_metrics_off.enable()
+
+
+def tearDownModule():
+	_mail_metrics_off.disable()
+
+
+@override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
 class ContactFormTests(TestCase):
 	def setUp(self):
 		cache.clear()
@@ -48,6 +64,28 @@ class ContactFormTests(TestCase):
 		resp3 = self.client.post(reverse('portfolio:contact'), data)
 		self.assertEqual(Message.objects.filter(email='carol@example.com').count(), 2)
 
+	def test_anonymous_contact_uses_no_session(self):
+		from django.contrib.sessions.models import Session
+		data = {'name': 'Dan', 'email': 'dan@example.com', 'message': 'Hi', 'hp': ''}
+		resp = self.client.post(reverse('portfolio:contact'), data, follow=True)
+		self.assertContains(resp, 'your message was sent')
+		self.assertEqual(Session.objects.count(), 0)
+		self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+		# The cooldown follows the client, not a session cookie
+		self.client.cookies.clear()
+		self.client.post(reverse('portfolio:contact'), data)
+		self.assertEqual(Message.objects.filter(email='dan@example.com').count(), 1)
+
+	def test_cooldown_lives_in_the_rate_limit_cache(self):
+		from django.core.cache import caches
+		shared = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}
+		with self.settings(CACHES={**settings.CACHES, 'ratelimit': shared}, RATELIMIT_CACHE='ratelimit'):
+			data = {'name': 'Eve', 'email': 'eve@example.com', 'message': 'Hi', 'hp': ''}
+			self.client.post(reverse('portfolio:contact'), data)
+			self.assertTrue(caches['ratelimit'].get('rl:cooldown:contact:127.0.0.1'))
+			self.assertIsNone(cache.get('rl:cooldown:contact:127.0.0.1'))
+			caches['ratelimit'].clear()
+
 class PortfolioPDFTests(TestCase):
 	def test_portfolio_pdf_endpoint(self):
 		url = reverse('portfolio:portfolio_pdf')
@@ -80,13 +118,14 @@ class AboutPDFTests(TestCase):
 			)
 
 
-@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
-				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.SimpleRateLimitMiddleware'])
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', USE_EMAIL_THREADING=False,
+				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
 class SubscriptionTests(TestCase):
 	def test_subscribe_flow_sends_confirmation_and_confirms(self):
 		# Subscribe
 		email = 'user@example.com'
-		resp = self.client.post(reverse('portfolio:subscribe'), {'email': email, 'hp': '', 'next': '/'})
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(reverse('portfolio:subscribe'), {'email': email, 'hp': '', 'next': '/'})
 		# Redirect back to next or subscribe page
 		self.assertIn(resp.status_code, (302, 303))
 		# Created subscription inactive with token
@@ -101,7 +140,8 @@ class SubscriptionTests(TestCase):
 		# Confirm
 		old_token = str(sub.token)
 		confirm_url = reverse('portfolio:subscribe_confirm', kwargs={'token': old_token})
-		resp2 = self.client.get(confirm_url)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp2 = self.client.get(confirm_url)
 		self.assertIn(resp2.status_code, (302, 303))
 		sub.refresh_from_db()
 		self.assertTrue(sub.active)
@@ -129,8 +169,8 @@ class SubscriptionTests(TestCase):
 		self.assertNotEqual(str(token_before), str(sub.token))
 
 
-@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
-				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.SimpleRateLimitMiddleware'])
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', USE_EMAIL_THREADING=False,
+				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
 class RecommendationTests(TestCase):
 	def test_recommend_sends_admin_notification(self):
 		mail.outbox = []
@@ -141,7 +181,8 @@ class RecommendationTests(TestCase):
 			'content': 'Great work delivered on time!',
 			'hp': ''
 		}
-		resp = self.client.post(reverse('portfolio:recommend'), data)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(reverse('portfolio:recommend'), data)
 		self.assertIn(resp.status_code, (302, 303))
 		# Two emails: admin notification and user acknowledgment
 		self.assertGreaterEqual(len(mail.outbox), 2)
@@ -166,6 +207,174 @@ class RecommendationTests(TestCase):
 		self.assertEqual(len(mail.outbox), 0)
 
 
+
+@override_settings(RATELIMIT_POLICIES={'portfolio:contact': '2/m'}, RATELIMIT_DEFAULT='')
+class RateLimitTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	def test_policy_rejects_with_headers(self):
+		url = reverse('portfolio:contact')
+		first = self.client.post(url, {'name': ''})
+		self.assertEqual(first['RateLimit-Limit'], '2')
+		self.assertEqual(first['RateLimit-Remaining'], '1')
+		self.client.post(url, {'name': ''})
+		resp = self.client.post(url, {'name': ''})
+		self.assertEqual(resp.status_code, 429)
+		self.assertGreaterEqual(int(resp['Retry-After']), 1)
+		self.assertEqual(resp['RateLimit-Remaining'], '0')
+		# GETs and exempt namespaces are not limited
+		self.assertEqual(self.client.get(url).status_code, 200)
+		self.assertNotEqual(self.client.post(reverse('admin:index')).status_code, 429)
+
+	@override_settings(RATELIMIT_TRUSTED_PROXIES=1)
+	def test_clients_are_told_apart_behind_a_proxy(self):
+		url = reverse('portfolio:contact')
+		for _ in range(2):
+			self.client.post(url, {'name': ''}, HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.7')
+		# A forged leftmost entry doesn't give the same client a fresh budget
+		resp = self.client.post(url, {'name': ''}, HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')
+		self.assertEqual(resp.status_code, 429)
+		resp = self.client.post(url, {'name': ''}, HTTP_X_FORWARDED_FOR='203.0.113.8')
+		self.assertNotEqual(resp.status_code, 429)
+
+	def test_sliding_window_is_atomic(self):
+		import threading
+		from myportfolio.middleware.ratelimit import Policy, hit
+		policy = Policy('t', '2/10s')
+		self.assertTrue(hit(cache, policy, 'c', now=100)[0])
+		self.assertTrue(hit(cache, policy, 'c', now=101)[0])
+		allowed, _, wait = hit(cache, policy, 'c', now=102)
+		self.assertFalse(allowed)
+		self.assertAlmostEqual(wait, 13.0)
+		# Half of the previous window still counts: one more fits, not two
+		self.assertTrue(hit(cache, policy, 'c', now=115)[0])
+		self.assertFalse(hit(cache, policy, 'c', now=115)[0])
+		results = []
+		burst = Policy('burst', '5/m')
+		threads = [threading.Thread(target=lambda: results.append(hit(cache, burst, 'b')[0])) for _ in range(20)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		self.assertEqual(results.count(True), 5)
+
+	def test_per_process_cache_is_flagged_outside_debug(self):
+		from myportfolio.middleware.ratelimit import RateLimitMiddleware
+		with self.assertWarnsRegex(RuntimeWarning, 'REDIS_URL'):
+			RateLimitMiddleware(lambda request: None)
+		with self.settings(DEBUG=True), warnings.catch_warnings():
+			warnings.simplefilter('error')
+			RateLimitMiddleware(lambda request: None)
+
+
+@override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
+class EarlyRejectTests(TestCase):
+	def setUp(self):
+		import tempfile
+		cache.clear()
+		self.media = tempfile.mkdtemp()
+		self.override = override_settings(MEDIA_ROOT=self.media)
+		self.override.enable()
+
+	def tearDown(self):
+		import shutil
+		self.override.disable()
+		shutil.rmtree(self.media, ignore_errors=True)
+
+	def _body(self, hp, size):
+		from django.test.client import BOUNDARY, encode_multipart
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		data = {'hp': hp, 'name': 'Eve', 'email': 'eve@example.com', 'message': 'Hi',
+			'attachment': SimpleUploadedFile('big.pdf', b'%PDF' + b'x' * size, content_type='application/pdf')}
+		return encode_multipart(BOUNDARY, data), f'multipart/form-data; boundary={BOUNDARY}'
+
+	def test_honeypot_stops_parser_before_file_data(self):
+		import io
+		from django.http.multipartparser import MultiPartParser
+		from django.core.files.uploadhandler import TemporaryFileUploadHandler
+		from myportfolio.uploads import EarlyReject, FieldSniffer, HoneypotUploadHandler
+		from django.test.client import BOUNDARY
+		body, content_type = self._body('bot', 3 * 1024 * 1024)
+		stream = io.BytesIO(body)
+		sniffer = FieldSniffer(stream, BOUNDARY.encode())
+		handlers = [HoneypotUploadHandler(None, sniffer), TemporaryFileUploadHandler()]
+		meta = {'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body))}
+		with self.assertRaises(EarlyReject):
+			MultiPartParser(meta, sniffer, handlers).parse()
+		self.assertEqual(sniffer.fields['hp'], 'bot')
+		self.assertLess(stream.tell(), 256 * 1024)
+
+	def test_spam_upload_and_oversized_body_get_400(self):
+		url = reverse('portfolio:contact')
+		body, content_type = self._body('bot', 1024)
+		resp = self.client.generic('POST', url, body, content_type=content_type)
+		self.assertEqual(resp.status_code, 400)
+		body, content_type = self._body('', 1024)
+		with self.settings(UPLOAD_MAX_REQUEST_SIZE=512):
+			# A fresh client, as middleware reads its settings when loaded
+			self.assertEqual(Client().generic('POST', url, body, content_type=content_type).status_code, 400)
+		resp = self.client.generic('POST', url, body, content_type=content_type)
+		self.assertEqual(resp.status_code, 302)
+		self.assertTrue(Message.objects.get(email='eve@example.com').attachment)
+
+
+@override_settings(USE_EMAIL_THREADING=False, SPAM_SCORE_THRESHOLD=0.9,
+				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
+class SpamFilterTests(TestCase):
+	def setUp(self):
+		from portfolio import spam
+		cache.clear()
+		spam.reset()
+		self.addCleanup(spam.reset)
+		mail.outbox = []
+
+	def _label(self):
+		for i in range(6):
+			Message.objects.create(name=f'Promo {i}', email=f'win{i}@bulk.example', spam_label='spam',
+				message=f'Cheap SEO backlinks casino bonus, click http://spam.example/{i} now')
+			Message.objects.create(name=f'Client {i}', email=f'cto{i}@company.example', spam_label='ham',
+				message=f'We need a Django developer for project {i}, could you send a quote?')
+
+	def test_trained_model_holds_back_spam_email(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from portfolio.models import SpamModel
+		self._label()
+		out = StringIO()
+		call_command('train_spam_model', stdout=out)
+		self.assertIn('6 spam / 6 not spam', out.getvalue())
+		self.assertEqual(SpamModel.objects.count(), 1)
+		url = reverse('portfolio:contact')
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(url, {'name': 'Promo', 'email': 'x@bulk.example', 'hp': '',
+				'message': 'Casino bonus and cheap backlinks: http://spam.example/a'})
+		self.assertEqual(resp.status_code, 302)
+		held = Message.objects.get(email='x@bulk.example')
+		self.assertGreaterEqual(held.spam_score, 0.9)
+		self.assertEqual(len(mail.outbox), 0)
+		cache.clear()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(url, {'name': 'Ann', 'email': 'ann@company.example', 'hp': '',
+				'message': 'Could you quote a Django project for us?'})
+		self.assertLess(Message.objects.get(email='ann@company.example').spam_score, 0.5)
+		self.assertEqual(len(mail.outbox), 2)
+
+	def test_admin_labels_and_training_needs_examples(self):
+		from django.contrib.auth import get_user_model
+		from django.core.management import CommandError, call_command
+		from portfolio import spam
+		msg = Message.objects.create(name='Bot', email='b@bulk.example', message='buy now')
+		admin_user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+		self.client.force_login(admin_user)
+		self.client.post(reverse('admin:portfolio_message_changelist'),
+			{'action': 'mark_spam', '_selected_action': [msg.pk]})
+		msg.refresh_from_db()
+		self.assertEqual(msg.spam_label, 'spam')
+		self.assertIsNone(spam.score_submission('Bot', 'b@bulk.example', 'buy now'))
+		with self.assertRaises(CommandError):
+			call_command('train_spam_model')
+
 class HomePageTests(TestCase):
 	def setUp(self):
 		cache.clear()
@@ -185,3 +394,1238 @@ class HomePageTests(TestCase):
 		# Contains next back to testimonials
 		self.assertIn('next=' + reverse('portfolio:testimonials'), resp.content.decode('utf-8'))
 
+
+
+class MediaMigrationTests(TestCase):
+	def setUp(self):
+		import tempfile
+		from django.core.files.storage import FileSystemStorage
+		self.src_dir = tempfile.mkdtemp()
+		self.dst_dir = tempfile.mkdtemp()
+		self.source = FileSystemStorage(location=self.src_dir)
+		self.dest = FileSystemStorage(location=self.dst_dir)
+		self.manifest = os.path.join(self.dst_dir, 'manifest.json')
+
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.src_dir, ignore_errors=True)
+		shutil.rmtree(self.dst_dir, ignore_errors=True)
+
+	def _migrator(self):
+		from portfolio.management.commands.migrate_media import MediaMigrator
+		return MediaMigrator(self.source, self.dest, self.manifest, workers=4)
+
+	def test_copies_deduplicates_and_resumes(self):
+		from django.core.files.base import ContentFile
+		from .models import GalleryItem
+		same = b'logo-bytes' * 100
+		a = self.source.save('gallery/a.png', ContentFile(same))
+		b = self.source.save('gallery/b.png', ContentFile(same))
+		c = self.source.save('gallery/c.png', ContentFile(b'other'))
+		g1 = GalleryItem.objects.create(title='A', image=a)
+		g2 = GalleryItem.objects.create(title='B', image=b)
+		g3 = GalleryItem.objects.create(title='C', image=c)
+
+		stats = self._migrator().run()
+		self.assertEqual(stats['copied'], 2)
+		self.assertEqual(stats['deduplicated'], 1)
+		self.assertEqual(sorted(self.dest.listdir('gallery')[1]), ['a.png', 'c.png'])
+		g1.refresh_from_db(); g2.refresh_from_db(); g3.refresh_from_db()
+		# Both rows with identical content now point at the single upload
+		self.assertEqual(g1.image.name, g2.image.name)
+		self.assertEqual(g3.image.name, 'gallery/c.png')
+
+		# A rerun finds everything in the manifest and uploads nothing
+		stats = self._migrator().run()
+		self.assertEqual(stats['copied'], 0)
+		self.assertEqual(stats['skipped'], 2)
+
+	def test_bulk_update_does_not_fire_post_signals(self):
+		from unittest import mock
+		from django.core.files.base import ContentFile
+		from django.db.models.signals import post_save, pre_save
+		from blog.models import Post
+		name = self.source.save('blog/t.png', ContentFile(b'thumb'))
+		self.dest.save('blog/t.png', ContentFile(b'taken'))  # force a renamed upload
+		post = Post.objects.create(title='T', slug='t', author='me', content='x', thumbnail=name)
+		receiver = mock.Mock()
+		for signal in (pre_save, post_save):
+			signal.connect(receiver, sender=Post, weak=False)
+			self.addCleanup(signal.disconnect, receiver, sender=Post)
+		self._migrator().run()
+		post.refresh_from_db()
+		self.assertNotEqual(post.thumbnail.name, 'blog/t.png')
+		# A per-row save() would have run the notification and blob receivers
+		receiver.assert_not_called()
+
+
+class ContentAddressedStorageTests(TestCase):
+	def setUp(self):
+		import tempfile
+		from myportfolio.storage import ContentAddressedStorage
+		self.root = tempfile.mkdtemp()
+		self.storage = ContentAddressedStorage(
+			backend='django.core.files.storage.FileSystemStorage', options={'location': self.root})
+
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.root, ignore_errors=True)
+
+	def test_identical_content_stored_once_and_refcounted(self):
+		from django.core.files.base import ContentFile
+		from .models import MediaBlob
+		first = self.storage.save('site/logo.png', ContentFile(b'same-image'))
+		second = self.storage.save('site/favicon.png', ContentFile(b'same-image'))
+		other = self.storage.save('site/other.png', ContentFile(b'different'))
+		self.assertEqual(first, second)
+		self.assertNotEqual(first, other)
+		self.assertTrue(first.startswith('blobs/'))
+		self.assertEqual(MediaBlob.objects.get(name=first).refcount, 2)
+		self.assertEqual(self.storage.open(first).read(), b'same-image')
+
+		# Deleting one reference keeps the shared blob available
+		self.storage.delete(first)
+		self.assertTrue(self.storage.exists(first))
+		self.assertEqual(MediaBlob.objects.get(name=first).refcount, 1)
+		# The last delete removes both the row and the bytes
+		self.storage.delete(second)
+		self.assertFalse(self.storage.exists(first))
+		self.assertFalse(MediaBlob.objects.filter(name=first).exists())
+
+		# Same bytes under another extension are still one blob
+		png = self.storage.save('site/logo.png', ContentFile(b'logo'))
+		self.assertEqual(self.storage.save('site/logo.JPG', ContentFile(b'logo')), png)
+		self.assertEqual(MediaBlob.objects.get(sha256=MediaBlob.objects.get(name=png).sha256).refcount, 2)
+		# Private uploads keep their path
+		self.assertEqual(self.storage.save('messages/cv.pdf', ContentFile(b'logo')), 'messages/cv.pdf')
+
+	def test_deleted_and_replaced_files_release_their_blobs(self):
+		from io import StringIO
+		from django.core.files.base import ContentFile
+		from django.core.management import call_command
+		from .models import MediaBlob, ResumePDF
+		storages = dict(settings.STORAGES, default={
+			'BACKEND': 'myportfolio.storage.ContentAddressedStorage',
+			'OPTIONS': {'backend': 'django.core.files.storage.FileSystemStorage', 'options': {'location': self.root}},
+		})
+		with self.settings(STORAGES=storages):
+			from django.core.files.storage import default_storage
+			a, b = ResumePDF(), ResumePDF()
+			a.file.save('a.pdf', ContentFile(b'same'))
+			b.file.save('b.pdf', ContentFile(b'same'))
+			shared = a.file.name
+			self.assertEqual(MediaBlob.objects.get(name=shared).refcount, 2)
+			with self.captureOnCommitCallbacks(execute=True):
+				a.delete()
+			self.assertEqual(MediaBlob.objects.get(name=shared).refcount, 1)
+			with self.captureOnCommitCallbacks(execute=True):
+				b.file.save('c.pdf', ContentFile(b'other'))
+			self.assertFalse(MediaBlob.objects.filter(name=shared).exists())
+			self.assertFalse(default_storage.exists(shared))
+
+			# Uploading the bytes a row already holds, or saving it again
+			# untouched, leaves a single reference
+			with self.captureOnCommitCallbacks(execute=True):
+				b.file.save('c.pdf', ContentFile(b'other'))
+				b.save()
+			self.assertEqual(MediaBlob.objects.get(name=b.file.name).refcount, 1)
+
+			# The GC command repairs drifted counts and collects orphans
+			MediaBlob.objects.filter(name=b.file.name).update(refcount=5)
+			orphan = default_storage.save('site/orphan.png', ContentFile(b'orphan'))
+			call_command('gc_media_blobs', grace_seconds=0, stdout=StringIO())
+			self.assertEqual(MediaBlob.objects.get(name=b.file.name).refcount, 1)
+			self.assertFalse(MediaBlob.objects.filter(name=orphan).exists())
+			self.assertFalse(default_storage.exists(orphan))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', USE_EMAIL_THREADING=False,
+				   CONTACT_EMAIL_ATTACHMENT_MAX_BYTES=1024,
+				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
+class ContactAttachmentTests(TestCase):
+	def setUp(self):
+		import tempfile
+		cache.clear()
+		self.media = tempfile.mkdtemp()
+		self.override = override_settings(MEDIA_ROOT=self.media)
+		self.override.enable()
+
+	def tearDown(self):
+		import shutil
+		self.override.disable()
+		shutil.rmtree(self.media, ignore_errors=True)
+
+	def test_small_files_attached_large_files_linked(self):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		from .models import MessageAttachment
+		mail.outbox = []
+		small = SimpleUploadedFile('brief.pdf', b'%PDF small', content_type='application/pdf')
+		large = SimpleUploadedFile('spec.pdf', b'%PDF ' + b'x' * 4096, content_type='application/pdf')
+		data = {'name': 'Dana', 'email': 'dana@example.com', 'message': 'Files', 'hp': '',
+				'attachment': small, 'attachments': [large]}
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(reverse('portfolio:contact'), data)
+		self.assertEqual(resp.status_code, 302)
+		self.assertEqual(MessageAttachment.objects.count(), 1)
+		owner = [m for m in mail.outbox if m.subject.startswith('Portfolio contact from')][0]
+		self.assertEqual([a[0] for a in owner.attachments], ['brief.pdf'])
+		self.assertIn('spec', owner.body)
+		link = [line for line in owner.body.splitlines() if '/contact/attachments/' in line][0]
+		url = link.split(': ', 1)[1].replace('http://testserver', '')
+		download = self.client.get(url)
+		self.assertEqual(download.status_code, 200)
+		self.assertEqual(b''.join(download.streaming_content), b'%PDF ' + b'x' * 4096)
+		# Tampered tokens are rejected
+		self.assertEqual(self.client.get(url[:-3] + 'abc/').status_code, 404)
+
+
+class MediaServingTests(TestCase):
+	def setUp(self):
+		import tempfile
+		self.media = tempfile.mkdtemp()
+		os.makedirs(os.path.join(self.media, 'resume'))
+		with open(os.path.join(self.media, 'resume', 'cv.pdf'), 'wb') as fh:
+			fh.write(b'0123456789')
+		self.override = override_settings(SERVE_MEDIA=True, MEDIA_ROOT=self.media, MEDIA_SENDFILE_MODE='')
+		self.override.enable()
+
+	def tearDown(self):
+		import shutil
+		self.override.disable()
+		shutil.rmtree(self.media, ignore_errors=True)
+
+	def test_full_conditional_and_range_requests(self):
+		resp = self.client.get('/media/resume/cv.pdf')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(b''.join(resp.streaming_content), b'0123456789')
+		self.assertEqual(resp['Accept-Ranges'], 'bytes')
+		etag = resp['ETag']
+		self.assertTrue(etag.startswith('"'))
+
+		self.assertEqual(self.client.get('/media/resume/cv.pdf', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+		part = self.client.get('/media/resume/cv.pdf', HTTP_RANGE='bytes=2-5')
+		self.assertEqual(part.status_code, 206)
+		self.assertEqual(part['Content-Range'], 'bytes 2-5/10')
+		self.assertEqual(b''.join(part.streaming_content), b'2345')
+
+		suffix = self.client.get('/media/resume/cv.pdf', HTTP_RANGE='bytes=-3')
+		self.assertEqual(b''.join(suffix.streaming_content), b'789')
+
+		# A stale If-Range validator gets the whole representation
+		stale = self.client.get('/media/resume/cv.pdf', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+		self.assertEqual(stale.status_code, 200)
+
+		self.assertEqual(self.client.get('/media/resume/cv.pdf', HTTP_RANGE='bytes=50-').status_code, 416)
+		self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+	def test_offload_and_immutable_names(self):
+		os.makedirs(os.path.join(self.media, 'blobs', 'ab'))
+		with open(os.path.join(self.media, 'blobs', 'ab', 'abcdef0123456789.png'), 'wb') as fh:
+			fh.write(b'png')
+		with self.settings(MEDIA_SENDFILE_MODE='x-accel-redirect'):
+			resp = self.client.get('/media/blobs/ab/abcdef0123456789.png')
+		self.assertEqual(resp['X-Accel-Redirect'], '/protected-media/blobs/ab/abcdef0123456789.png')
+		self.assertIn('immutable', resp['Cache-Control'])
+		self.assertEqual(resp.content, b'')
+		with open(os.path.join(self.media, 'resume', 'my cv#1.pdf'), 'wb') as fh:
+			fh.write(b'pdf')
+		with self.settings(MEDIA_SENDFILE_MODE='x-accel-redirect', MEDIA_IMMUTABLE_PATTERNS=(r'\.pdf$',)):
+			resp = self.client.get('/media/resume/my%20cv%231.pdf')
+		self.assertEqual(resp['X-Accel-Redirect'], '/protected-media/resume/my%20cv%231.pdf')
+		self.assertIn('immutable', resp['Cache-Control'])
+
+	def test_private_uploads_are_not_served(self):
+		os.makedirs(os.path.join(self.media, 'messages'))
+		with open(os.path.join(self.media, 'messages', 'cv.pdf'), 'wb') as fh:
+			fh.write(b'private')
+		self.assertEqual(self.client.get('/media/messages/cv.pdf').status_code, 404)
+		self.assertEqual(self.client.get('/media/resume/../messages/cv.pdf').status_code, 404)
+		self.assertEqual(self.client.get('/media/resume/cv.pdf').status_code, 200)
+
+
+class StaticBundlingTests(TestCase):
+	def test_minifiers_keep_strings_and_regexes(self):
+		from myportfolio.bundling import minify_css, minify_js
+		js = "var u = 'http://x'; // note\nvar r = /a\\/b[/]/g;\n/* block */\nvar t = `a // ${u}`;\nvar d = 4 / 2 / 1;\n"
+		out = minify_js(js)
+		self.assertIn("'http://x'", out)
+		self.assertIn('/a\\/b[/]/g', out)
+		self.assertIn('`a // ${u}`', out)
+		self.assertIn('4 / 2 / 1', out)
+		self.assertNotIn('note', out)
+		self.assertNotIn('block', out)
+		self.assertEqual(minify_css('/* c */ a:hover , .b > p { color : red ; }'), 'a:hover,.b>p{color:red}')
+		self.assertEqual(minify_css('a::before { content: "a  ,  b ; }"; }'), 'a::before{content:"a  ,  b ; }"}')
+		self.assertEqual(minify_css("q { quotes: '\\'  ' \"{ x }\" ; }"), "q{quotes:'\\'  ' \"{ x }\"}")
+
+	def test_critical_css_keeps_matching_rules(self):
+		from myportfolio.bundling import extract_critical_css
+		css = (':root{--c:red}.hero{animation:fadeUp 1s}.footer{color:blue}'
+			'@media (max-width:600px){.hero h1{font-size:2rem}.card{margin:0}}'
+			'@keyframes fadeUp{from{opacity:0}}@keyframes shimmer{to{opacity:1}}')
+		out = extract_critical_css(css, '<section class="hero"><h1>Hi</h1></section>')
+		self.assertIn(':root{--c:red}', out)
+		self.assertIn('.hero{animation:fadeUp 1s}', out)
+		self.assertIn('@media (max-width:600px){.hero h1{font-size:2rem}}', out)
+		self.assertIn('@keyframes fadeUp', out)
+		self.assertNotIn('.footer', out)
+		self.assertNotIn('.card', out)
+		self.assertNotIn('shimmer', out)
+
+	def test_collectstatic_builds_manifest_bundles(self):
+		import shutil
+		import tempfile
+		from django.contrib.staticfiles.storage import staticfiles_storage
+		from django.core.management import call_command
+		root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+		storages = dict(settings.STORAGES)
+		storages['staticfiles'] = {'BACKEND': 'myportfolio.storage.NonStrictManifestStaticFilesStorage'}
+		with self.settings(STATIC_ROOT=root, STORAGES=storages, CRITICAL_CSS_TEMPLATES=['home.html']):
+			call_command('collectstatic', interactive=False, verbosity=0)
+			hashed = staticfiles_storage.hashed_files
+			self.assertIn('bundles/site.js', hashed)
+			self.assertIn('bundles/site.css', hashed)
+			self.assertIn('critical/home.css', hashed)
+			self.assertTrue(os.path.exists(os.path.join(root, hashed['bundles/site.css'] + '.gz')))
+			resp = self.client.get(reverse('portfolio:home'))
+		html = resp.content.decode()
+		self.assertIn('<style>', html)
+		self.assertIn('rel="preload" href="/static/%s"' % hashed['bundles/site.css'], html)
+		self.assertIn('/static/%s' % hashed['bundles/home.js'], html)
+		# The home bundle already carries the site script
+		self.assertNotIn(hashed['bundles/site.js'], html)
+		self.assertEqual(html.count('<script src='), 1)
+		self.assertNotIn('css/styles.css', html)
+
+
+@override_settings(USE_EMAIL_THREADING=False, USE_CELERY=False, ALLOWED_HOSTS=['example.com'])
+class PostNotificationDispatchTests(TestCase):
+	def setUp(self):
+		from blog.models import Subscriber
+		self.subs = [Subscriber.objects.create(email=f'reader{i}@example.com') for i in range(3)]
+		Subscriber.objects.create(email='gone@example.com', active=False)
+
+	def test_publish_sends_one_personalised_email_per_subscriber(self):
+		from blog.models import Post
+		mail.outbox = []
+		with self.captureOnCommitCallbacks(execute=True):
+			Post.objects.create(title='Fast mail', slug='fast-mail', author='me', content='Body', published=True)
+		self.assertEqual(len(mail.outbox), 3)
+		by_recipient = {m.to[0]: m for m in mail.outbox}
+		self.assertNotIn('gone@example.com', by_recipient)
+		for sub in self.subs:
+			msg = by_recipient[sub.email]
+			url = 'https://example.com' + reverse('blog:unsubscribe', args=[sub.token])
+			self.assertIn(url, msg.body)
+			self.assertIn(url, msg.alternatives[0][0])
+			self.assertEqual(msg.extra_headers['List-Unsubscribe'], f'<{url}>')
+			self.assertIn('Fast mail', msg.body)
+			self.assertNotIn('{title}', msg.body)
+
+	def test_batches_share_one_smtp_session(self):
+		from blog.dispatch import PostNotificationDispatcher
+		from blog.models import Post
+		from blog.smtpsink import SMTPSink
+		from django.core.mail import get_connection
+		post = Post(title='Unsaved', slug='unsaved', author='me', content='x')
+		with SMTPSink() as sink:
+			conn = get_connection('django.core.mail.backends.smtp.EmailBackend', host=sink.host, port=sink.port,
+				username='', password='', use_tls=False, use_ssl=False)
+			dispatcher = PostNotificationDispatcher(post, connection=conn, batch_size=2)
+			with self.assertNumQueries(1):
+				stats = dispatcher.send()
+			received = sink.stats()
+		self.assertEqual(stats['sent'], 3)
+		self.assertEqual(stats['batches'], 2)
+		self.assertEqual(received['sessions'], 1)
+		self.assertEqual(received['messages'], 3)
+
+
+@override_settings(USE_EMAIL_THREADING=False, USE_CELERY=False, ALLOWED_HOSTS=['example.com', 'testserver'])
+class DigestTests(TestCase):
+	def setUp(self):
+		from blog.models import Subscriber
+		self.now = Subscriber.objects.create(email='now@example.com')
+		self.weekly = Subscriber.objects.create(email='weekly@example.com', delivery=Subscriber.DIGEST)
+		mail.outbox = []
+
+	def test_digest_subscribers_get_one_email_per_run(self):
+		from django.core.management import call_command
+		from blog.models import DigestItem, Post
+		with self.captureOnCommitCallbacks(execute=True):
+			Post.objects.create(title='First', slug='first', author='me', content='a', published=True)
+			Post.objects.create(title='Second', slug='second', author='me', content='b', published=True)
+		self.assertEqual([m.to[0] for m in mail.outbox], ['now@example.com'] * 2)
+		self.assertEqual(DigestItem.objects.filter(sent_at__isnull=True).count(), 2)
+
+		mail.outbox = []
+		# Claim, load posts, then one pass over digest subscribers
+		with self.assertNumQueries(6):
+			call_command('send_digest', stdout=open(os.devnull, 'w'))
+		self.assertEqual(len(mail.outbox), 1)
+		digest = mail.outbox[0]
+		self.assertEqual(digest.to, ['weekly@example.com'])
+		self.assertIn('First', digest.body)
+		self.assertIn('Second', digest.body)
+		self.assertIn(str(self.weekly.token), digest.extra_headers['List-Unsubscribe'])
+		# Nothing new: the next run sends nothing
+		call_command('send_digest', stdout=open(os.devnull, 'w'))
+		self.assertEqual(len(mail.outbox), 1)
+
+	def test_manage_page_switches_delivery(self):
+		from blog.models import Subscriber
+		url = reverse('blog:manage_subscription_token', args=[self.now.token])
+		resp = self.client.post(url, {'delivery': Subscriber.DIGEST})
+		self.assertContains(resp, 'Delivery updated')
+		self.now.refresh_from_db()
+		self.assertTrue(self.now.active)
+		self.assertEqual(self.now.delivery, Subscriber.DIGEST)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', USE_EMAIL_THREADING=False,
+				   MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
+class AudienceTests(TestCase):
+	def test_both_subscribe_forms_share_one_row(self):
+		from blog.models import Subscriber
+		self.client.post(reverse('portfolio:subscribe'), {'email': 'Both@Example.com', 'hp': ''})
+		self.client.post(reverse('blog:subscribe'), {'email': 'both@example.com'})
+		self.assertEqual(Subscriber.objects.count(), 1)
+		self.assertEqual(Subscription.objects.get().email, 'both@example.com')
+
+	def test_export_import_round_trip_in_batches(self):
+		import io
+		import tempfile
+		from django.core.management import call_command
+		from blog.models import Subscriber
+		Subscriber.objects.create(email='a@example.com', delivery=Subscriber.DIGEST)
+		Subscriber.objects.create(email='b@example.com', active=False)
+		out = io.StringIO()
+		call_command('export_subscribers', stdout=out)
+		lines = out.getvalue().splitlines()
+		self.assertEqual(lines[0], 'email,active,delivery,created_at,token')
+		self.assertEqual(len(lines), 3)
+		tokens = dict(Subscriber.objects.values_list('email', 'token'))
+		Subscriber.objects.all().delete()
+
+		extra = 'C@example.com,,,,\nnot-an-email,true,,,\na@example.com,true,,,\n'
+		with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+			fh.write(out.getvalue() + extra)
+		self.addCleanup(os.remove, fh.name)
+		# Two lookups + two inserts for two batches of 2
+		with self.assertNumQueries(4):
+			call_command('import_subscribers', fh.name, '--batch-size', '2', stdout=io.StringIO())
+		subs = {s.email: s for s in Subscriber.objects.all()}
+		self.assertEqual(sorted(subs), ['a@example.com', 'b@example.com', 'c@example.com'])
+		self.assertEqual(subs['a@example.com'].delivery, Subscriber.DIGEST)
+		self.assertEqual(subs['a@example.com'].token, tokens['a@example.com'])
+		self.assertFalse(subs['b@example.com'].active)
+		self.assertTrue(subs['c@example.com'].active)
+		result = io.StringIO()
+		call_command('import_subscribers', fh.name, stdout=result)
+		self.assertIn('0 new subscriber(s); 4 already present, 1 invalid', result.getvalue())
+
+
+class _FailingEmailBackend:
+	def __init__(self, *args, **kwargs):
+		pass
+	def open(self):
+		return True
+	def close(self):
+		pass
+	def send_messages(self, messages):
+		raise ConnectionError('smtp down')
+
+
+@override_settings(
+	USE_EMAIL_OUTBOX=True, USE_EMAIL_THREADING=False, ALLOWED_HOSTS=['example.com', 'testserver'],
+	MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'],
+)
+class EmailOutboxTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		mail.outbox = []
+
+	def test_contact_is_queued_then_delivered_by_worker(self):
+		from blog.models import OutboxEmail
+		from django.core.management import call_command
+		data = {'name': 'Ann', 'email': 'ann@example.com', 'message': 'Hi', 'hp': ''}
+		self.client.post(reverse('portfolio:contact'), data)
+		self.assertEqual(len(mail.outbox), 0)
+		keys = set(OutboxEmail.objects.values_list('idempotency_key', flat=True))
+		msg = Message.objects.get()
+		self.assertEqual(keys, {f'contact:{msg.pk}:owner', f'contact:{msg.pk}:ack'})
+
+		call_command('run_mail_worker', once=True, stdout=open(os.devnull, 'w'))
+		self.assertEqual(len(mail.outbox), 2)
+		self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 2)
+
+	def test_idempotency_key_prevents_duplicate_newsletters(self):
+		from blog.models import OutboxEmail, Post, Subscriber
+		sub = Subscriber.objects.create(email='r@example.com')
+		post = Post.objects.create(title='Once', slug='once', author='me', content='x', published=True)
+		post.published = False
+		post.save()
+		post.published = True
+		post.save()
+		rows = OutboxEmail.objects.all()
+		self.assertEqual(rows.count(), 1)
+		self.assertEqual(rows[0].idempotency_key, f'post:{post.pk}:subscriber:{sub.pk}')
+		self.assertIn(str(sub.token), rows[0].body)
+
+	def test_failed_delivery_backs_off_then_gives_up(self):
+		from blog.models import OutboxEmail
+		from blog.outbox import enqueue, process_batch
+		from django.utils import timezone
+		row, created = enqueue('Subject', 'Body', ['x@example.com'], idempotency_key='k1')
+		self.assertTrue(created)
+		self.assertFalse(enqueue('Subject', 'Body', ['x@example.com'], idempotency_key='k1')[1])
+		with self.settings(EMAIL_BACKEND='portfolio.tests._FailingEmailBackend', OUTBOX_MAX_ATTEMPTS=2):
+			self.assertEqual(process_batch(), (1, 0, 1))
+			row.refresh_from_db()
+			self.assertEqual(row.status, OutboxEmail.PENDING)
+			self.assertEqual(row.attempts, 1)
+			self.assertGreater(row.next_attempt_at, timezone.now())
+			self.assertIn('smtp down', row.last_error)
+			# Not due yet
+			self.assertEqual(process_batch(), (0, 0, 0))
+			OutboxEmail.objects.update(next_attempt_at=timezone.now())
+			process_batch()
+			row.refresh_from_db()
+			self.assertEqual(row.status, OutboxEmail.FAILED)
+			self.assertEqual(row.attempts, 2)
+
+
+@override_settings(
+	USE_EMAIL_THREADING=False, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+	MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'],
+)
+class AfterCommitEmailTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		mail.outbox = []
+
+	def test_contact_email_waits_for_commit(self):
+		data = {'name': 'Eve', 'email': 'eve@example.com', 'message': 'Hi', 'hp': ''}
+		with self.captureOnCommitCallbacks() as callbacks:
+			resp = self.client.post(reverse('portfolio:contact'), data)
+			self.assertEqual(resp.status_code, 302)
+			self.assertEqual(len(mail.outbox), 0)
+		for callback in callbacks:
+			callback()
+		self.assertCountEqual([m.to[0] for m in mail.outbox], ['eve@example.com', settings.CONTACT_EMAIL])
+
+	def test_rolled_back_transaction_sends_nothing(self):
+		from django.db import transaction
+		from blog.utils import deliver_mail
+		with self.captureOnCommitCallbacks(execute=True) as callbacks:
+			try:
+				with transaction.atomic():
+					deliver_mail('Subject', 'Body', None, ['x@example.com'])
+					raise RuntimeError
+			except RuntimeError:
+				pass
+		self.assertEqual(callbacks, [])
+		self.assertEqual(len(mail.outbox), 0)
+
+	def test_failed_send_is_recorded_for_retry(self):
+		from blog.models import OutboxEmail
+		from blog.outbox import process_batch
+		from django.utils import timezone
+		data = {'name': 'Rex', 'email': 'rex@example.com', 'message': 'Hi', 'hp': ''}
+		with self.settings(EMAIL_BACKEND='portfolio.tests._FailingEmailBackend'):
+			with self.captureOnCommitCallbacks(execute=True):
+				resp = self.client.post(reverse('portfolio:contact'), data)
+		self.assertEqual(resp.status_code, 302)
+		msg = Message.objects.get()
+		rows = OutboxEmail.objects.order_by('idempotency_key')
+		self.assertEqual([r.idempotency_key for r in rows], [f'contact:{msg.pk}:ack', f'contact:{msg.pk}:owner'])
+		self.assertTrue(all(r.status == OutboxEmail.PENDING and r.attempts == 1 and 'smtp down' in r.last_error for r in rows))
+		OutboxEmail.objects.update(next_attempt_at=timezone.now())
+		self.assertEqual(process_batch(), (2, 2, 0))
+		self.assertEqual(len(mail.outbox), 2)
+
+
+@override_settings(MAIL_METRICS_ENABLED=True, USE_EMAIL_THREADING=False,
+	MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != 'myportfolio.middleware.ratelimit.RateLimitMiddleware'])
+class MailMetricsTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	def tearDown(self):
+		from blog import mailmetrics
+		mailmetrics.flush()
+
+	def test_sends_are_aggregated_and_flushed(self):
+		from blog import mailmetrics
+		from blog.models import MailMetric
+		mailmetrics.record('emails/contact_ack', 0.03, sent=1)
+		mailmetrics.record('emails/contact_ack', 0.4, sent=1)
+		mailmetrics.record('emails/post_notification', 2.0, sent=9, failed=1, error='451 try later')
+		self.assertEqual(MailMetric.objects.count(), 0)
+		self.assertEqual(mailmetrics.flush(), 2)
+		ack = MailMetric.objects.get(kind='emails/contact_ack')
+		self.assertEqual((ack.attempted, ack.sent, ack.failed), (2, 2, 0))
+		self.assertEqual(ack.histogram, {'50': 1, '500': 1})
+		news = MailMetric.objects.get(kind='emails/post_notification')
+		self.assertEqual(news.histogram, {'250': 10})
+		self.assertEqual(news.recent_errors[0]['error'], '451 try later')
+		# A second flush merges into the same hourly row
+		mailmetrics.record('emails/contact_ack', 0.01, sent=1)
+		mailmetrics.flush()
+		self.assertEqual(MailMetric.objects.get(kind='emails/contact_ack').attempted, 3)
+		kinds = {k['kind']: k for k in mailmetrics.summary()['kinds']}
+		self.assertEqual(kinds['emails/post_notification']['failure_rate'], 10.0)
+		self.assertEqual(kinds['emails/contact_ack']['p50_ms'], '50')
+
+	def test_failures_show_on_staff_panel(self):
+		from django.contrib.auth import get_user_model
+		data = {'name': 'Mo', 'email': 'mo@example.com', 'message': 'Hi', 'hp': ''}
+		with self.settings(EMAIL_BACKEND='portfolio.tests._FailingEmailBackend'):
+			with self.captureOnCommitCallbacks(execute=True):
+				self.client.post(reverse('portfolio:contact'), data)
+		url = reverse('admin:blog_mailmetric_changelist')
+		self.assertEqual(self.client.get(url).status_code, 302)
+		admin_user = get_user_model().objects.create_superuser('ops', 'ops@example.com', 'pw')
+		self.client.force_login(admin_user)
+		resp = self.client.get(url)
+		self.assertContains(resp, 'emails/contact_ack')
+		self.assertContains(resp, 'smtp down')
+		self.assertContains(resp, 'Outbox emails awaiting retry')
+
+
+
+class SimulatedEmailTests(TransactionTestCase):
+	def setUp(self):
+		from blog.backends import SimulatedEmailBackend
+		SimulatedEmailBackend.stats.reset()
+
+	def test_backend_adds_latency_and_rejects_messages(self):
+		import smtplib
+		from django.core.mail import EmailMessage, get_connection
+		from blog.backends import SimulatedEmailBackend
+		msgs = [EmailMessage('Hi', 'x', None, [f'u{i}@example.com']) for i in range(3)]
+		conn = get_connection('blog.backends.SimulatedEmailBackend', latency=0.01)
+		started = time.monotonic()
+		self.assertEqual(conn.send_messages(msgs), 3)
+		self.assertGreaterEqual(time.monotonic() - started, 0.03)
+		with self.assertRaises(smtplib.SMTPDataError):
+			get_connection('blog.backends.SimulatedEmailBackend', failure_rate=1).send_messages(msgs)
+		self.assertEqual(get_connection('blog.backends.SimulatedEmailBackend', failure_rate=1, fail_silently=True).send_messages(msgs), 0)
+		stats = SimulatedEmailBackend.stats.snapshot()
+		self.assertEqual((stats['sent'], stats['failed'], stats['unique_recipients'], stats['sessions']), (3, 4, 3, 3))
+		self.assertEqual(len(stats['delivered_at']), 3)
+
+	def test_benchmark_reports_each_mode(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from blog.models import OutboxEmail, Post, Subscriber
+		out = StringIO()
+		call_command('benchmark_email', '--current-database', '--modes', 'sync,outbox', '--subscribers', '6',
+			'--latency-ms', '0', '--connect-latency-ms', '0', '--failure-rate', '0.2', stdout=out)
+		report = out.getvalue()
+		self.assertIn('sync: ', report)
+		self.assertIn('outbox: 6/6 delivered', report)
+		self.assertIn('p95', report)
+		self.assertFalse(Subscriber.objects.exists() or Post.objects.exists() or OutboxEmail.objects.exists())
+
+class MailExecutorTests(TestCase):
+	def test_backpressure_runs_overflow_in_caller_and_drains(self):
+		import threading
+		from blog.mailpool import BoundedExecutor
+		pool = BoundedExecutor(max_workers=1, max_queue=1, put_timeout=0.01, name='test')
+		release = threading.Event()
+		started = threading.Event()
+		done = []
+		def blocker():
+			started.set()
+			release.wait(5)
+			done.append('blocker')
+		self.assertTrue(pool.submit(blocker))
+		started.wait(5)
+		self.assertTrue(pool.submit(done.append, 'queued'))
+		# Worker busy and queue full: the caller runs the job itself
+		self.assertFalse(pool.submit(done.append, 'inline'))
+		self.assertEqual(done, ['inline'])
+		stats = pool.stats()
+		self.assertEqual(stats['in_flight'], 1)
+		self.assertEqual(stats['queue_depth'], 1)
+		self.assertEqual(stats['ran_inline'], 1)
+		self.assertLessEqual(stats['workers'], 1)
+
+		release.set()
+		self.assertTrue(pool.shutdown(timeout=5))
+		self.assertEqual(done, ['inline', 'blocker', 'queued'])
+		self.assertEqual(pool.stats()['completed'], 3)
+
+	def test_failures_are_counted_not_raised(self):
+		from blog.mailpool import BoundedExecutor
+		pool = BoundedExecutor(max_workers=2, max_queue=10, name='test')
+		pool.submit(lambda: 1 / 0)
+		self.assertTrue(pool.shutdown(timeout=5))
+		stats = pool.stats()
+		self.assertEqual(stats['failed'], 1)
+		self.assertEqual(stats['completed'], 0)
+		# After shutdown jobs still run, in the caller
+		ran = []
+		self.assertFalse(pool.submit(ran.append, 1))
+		self.assertEqual(ran, [1])
+
+	@override_settings(USE_EMAIL_THREADING=True, USE_EMAIL_OUTBOX=False)
+	def test_saturated_pool_parks_request_mail_in_the_outbox(self):
+		import threading
+		from unittest import mock
+		from blog.mailpool import BoundedExecutor
+		from blog.models import OutboxEmail
+		from blog.utils import deliver_mail
+		pool = BoundedExecutor(max_workers=1, max_queue=1, put_timeout=0.01, name='test')
+		release = threading.Event()
+		started = threading.Event()
+		pool.submit(lambda: (started.set(), release.wait(5)))
+		started.wait(5)
+		pool.submit(release.wait, 5)
+		sent_on = []
+		with mock.patch('blog.mailpool.get_mail_executor', return_value=pool), \
+				mock.patch('blog.outbox.send_or_record', side_effect=lambda row: sent_on.append(threading.get_ident())):
+			mail.outbox = []
+			with self.captureOnCommitCallbacks(execute=True):
+				deliver_mail('Hi', 'Body', None, ['a@example.com'])
+		# Nothing was sent on the request thread; the worker will pick it up
+		self.assertEqual(sent_on, [])
+		self.assertEqual(len(mail.outbox), 0)
+		row = OutboxEmail.objects.get(subject='Hi')
+		self.assertEqual((row.status, row.attempts), (OutboxEmail.PENDING, 0))
+		self.assertEqual(pool.stats()['dropped'], 1)
+		release.set()
+		self.assertTrue(pool.shutdown(timeout=5))
+
+
+try:
+	import celery as _celery
+except ImportError:
+	_celery = None
+
+
+@override_settings(USE_CELERY=True, USE_EMAIL_THREADING=False, POST_NOTIFICATION_BATCH_SIZE=2)
+class NotificationTaskTests(TestCase):
+	def setUp(self):
+		from blog.models import Subscriber
+		self.subs = [Subscriber.objects.create(email=f'r{i}@example.com') for i in range(5)]
+		mail.outbox = []
+
+	@unittest.skipUnless(_celery, 'celery is not installed')
+	def test_eager_chunks_record_progress(self):
+		from celery import current_app
+		from blog.models import Post, PostNotificationProgress
+		current_app.conf.task_always_eager = True
+		self.addCleanup(setattr, current_app.conf, 'task_always_eager', False)
+		with self.captureOnCommitCallbacks(execute=True):
+			post = Post.objects.create(title='Chunked', slug='chunked', author='me', content='x', published=True)
+		self.assertEqual(len(mail.outbox), 5)
+		progress = PostNotificationProgress.objects.get(post=post)
+		self.assertEqual((progress.total, progress.sent, progress.failed, progress.remaining), (5, 5, 0, 0))
+		self.assertIsNotNone(progress.finished_at)
+
+	def test_chunk_skips_unsubscribed_and_respects_rate_limit(self):
+		from blog.dispatch import send_notification_chunk, start_progress
+		from blog.models import Post, PostNotificationProgress
+		post = Post.objects.create(title='Draft', slug='draft', author='me', content='x', published=False)
+		start_progress(post, 3)
+		self.subs[0].active = False
+		self.subs[0].save()
+		ids = [s.pk for s in self.subs[:3]]
+		started = time.monotonic()
+		with self.settings(POST_NOTIFICATION_RATE_LIMIT=20, POST_NOTIFICATION_BATCH_SIZE=1):
+			stats = send_notification_chunk(post, ids)
+		self.assertGreaterEqual(time.monotonic() - started, 1 / 20)
+		self.assertEqual(stats['sent'], 2)
+		progress = PostNotificationProgress.objects.get(post=post)
+		self.assertEqual((progress.sent, progress.skipped, progress.remaining), (2, 1, 0))
+
+	def test_progress_is_shown_in_post_admin(self):
+		from django.contrib.auth import get_user_model
+		from blog.dispatch import start_progress
+		from blog.models import Post
+		post = Post.objects.create(title='Shown', slug='shown', author='me', content='x', published=False)
+		start_progress(post, 5)
+		admin_user = get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw')
+		self.client.force_login(admin_user)
+		resp = self.client.get(reverse('admin:blog_post_change', args=[post.pk]))
+		self.assertContains(resp, 'Notification progress')
+		self.assertContains(self.client.get(reverse('admin:blog_post_changelist')), '0/5')
+
+
+class CompiledEmailTests(TestCase):
+	def setUp(self):
+		from blog.emails import clear_cache
+		clear_cache()
+
+	def test_substitution_matches_full_render_and_escapes_html(self):
+		from django.template.loader import render_to_string
+		from blog.emails import CompiledEmail
+		ctx = {'brand_name': 'Acme & Co'}
+		email = CompiledEmail('emails/contact_ack', ctx, fields=('name', 'message'))
+		values = {'name': 'Zoë', 'message': 'Hello'}
+		text, html = email.render(**values)
+		self.assertEqual(html, render_to_string('emails/contact_ack.html', dict(ctx, **values)))
+		text, html = email.render(name='<b>Eve</b>', message='a & b')
+		self.assertIn('&lt;b&gt;Eve&lt;/b&gt;', html)
+		self.assertIn('a &amp; b', html)
+		self.assertIn('Hi <b>Eve</b>,', text)
+		self.assertNotIn('@@EMAILFIELD', text + html)
+
+	def test_compiled_emails_are_cached_per_static_context(self):
+		from unittest import mock
+		from blog import emails
+		with mock.patch.object(emails, 'render_to_string', wraps=emails.render_to_string) as render:
+			for i in range(5):
+				emails.compiled_email('emails/subscribe_welcome', {'site_name': 'A'}, fields=('unsubscribe_url',)).render(unsubscribe_url=f'/u/{i}/')
+			self.assertEqual(render.call_count, 2)
+			emails.compiled_email('emails/subscribe_welcome', {'site_name': 'B'}, fields=('unsubscribe_url',))
+			self.assertEqual(render.call_count, 4)
+
+	def test_missing_template_uses_fallback(self):
+		from blog.emails import CompiledEmail
+		email = CompiledEmail('emails/does_not_exist', {'x': 1}, fields=('url',), fallback=lambda c: f"Go: {c['url']}")
+		self.assertEqual(email.render(url='/a/?b=1&c=2'), ('Go: /a/?b=1&c=2', None))
+
+
+class RequestProfilerTests(TestCase):
+	def test_signed_token_profiles_the_request(self):
+		from myportfolio.profiling import make_token
+		from .models import RequestProfile
+		resp = self.client.get(reverse('portfolio:contact'), HTTP_X_PROFILE_TOKEN=make_token())
+		self.assertEqual(resp.status_code, 200)
+		profile = RequestProfile.objects.get(pk=resp['X-Profile-Id'])
+		self.assertEqual((profile.url_name, profile.trigger, profile.status_code), ('portfolio:contact', 'token', 200))
+		self.assertGreater(profile.duration_ms, 0)
+		with self.settings(PROFILE_MODE='cprofile'):
+			resp = Client().get(reverse('portfolio:contact') + '?_profile=' + make_token())
+		profile = RequestProfile.objects.get(pk=resp['X-Profile-Id'])
+		self.assertEqual(profile.mode, 'cprofile')
+		self.assertIn('function calls', profile.output)
+
+	def test_requests_without_a_valid_token_are_not_profiled(self):
+		from .models import RequestProfile
+		resp = self.client.get(reverse('portfolio:contact'))
+		self.assertNotIn('X-Profile-Id', resp)
+		resp = self.client.get(reverse('portfolio:contact'), HTTP_X_PROFILE_TOKEN='forged')
+		self.assertNotIn('X-Profile-Id', resp)
+		self.assertFalse(RequestProfile.objects.exists())
+
+	def test_admin_lists_profiles_and_issues_tokens(self):
+		from django.contrib.auth import get_user_model
+		from myportfolio.profiling import check_token
+		from .models import RequestProfile
+		profile = RequestProfile.objects.create(
+			method='GET', path='/about/', url_name='portfolio:about', status_code=200, duration_ms=12.5,
+			trigger=RequestProfile.TOKEN, samples=3, output='main (a.py:1);view (b.py:2) 2\nmain (a.py:1) 1',
+		)
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'a@example.com', 'pw'))
+		self.assertContains(self.client.get(reverse('admin:portfolio_requestprofile_changelist')), 'portfolio:about')
+		self.assertContains(self.client.get(reverse('admin:portfolio_requestprofile_change', args=[profile.pk])), 'view (b.py:2)')
+		resp = self.client.get(reverse('admin:portfolio_requestprofile_folded', args=[profile.pk]))
+		self.assertEqual(resp.content.decode(), profile.output)
+		resp = self.client.get(reverse('admin:portfolio_requestprofile_token'))
+		self.assertTrue(check_token(resp.context['token'], 60))
+
+
+class MetricsTests(TestCase):
+	def setUp(self):
+		from myportfolio import metrics
+		metrics.reset()
+		cache.clear()
+
+	def test_requests_queries_and_cache_lookups_are_exported(self):
+		self.client.get(reverse('portfolio:contact'))
+		self.client.get(reverse('portfolio:home'))
+		self.client.get(reverse('portfolio:home'))
+		resp = self.client.get(reverse('portfolio:metrics'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+		body = resp.content.decode()
+		self.assertIn('django_http_requests_total{view="portfolio:contact",method="GET",status="200"} 1', body)
+		self.assertIn('django_http_request_duration_seconds_count{view="portfolio:home"} 2', body)
+		self.assertIn('django_http_request_duration_seconds_bucket{view="portfolio:home",le="+Inf"} 2', body)
+		self.assertIn('django_db_queries_total{view="portfolio:contact"}', body)
+		self.assertIn('django_cache_gets_total{prefix="home_page",result="hit"} 1', body)
+		self.assertIn('django_cache_gets_total{prefix="home_page",result="miss"} 1', body)
+
+	def test_scrapes_need_the_token_or_localhost(self):
+		url = reverse('portfolio:metrics')
+		self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+		with self.settings(METRICS_TOKEN='s3cret'):
+			self.assertEqual(self.client.get(url).status_code, 403)
+			self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret', REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+	def test_snapshots_of_other_workers_are_added_up(self):
+		import json
+		import tempfile
+		from myportfolio import metrics
+		with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+			metrics.RATELIMIT_REJECTIONS.inc(policy='portfolio:contact')
+			with open(os.path.join(directory, 'metrics-1.json'), 'w') as f:
+				json.dump({
+					'ratelimit_rejections_total': [[['portfolio:contact'], 2]],
+					'emails_total': [[['contact', 'failed'], 1]],
+				}, f)
+			body = metrics.render()
+			self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+		self.assertIn('ratelimit_rejections_total{policy="portfolio:contact"} 3', body)
+		self.assertIn('emails_total{kind="contact",status="failed"} 1', body)
+
+
+class ReadinessTests(TestCase):
+	def setUp(self):
+		import shutil
+		import tempfile
+		from myportfolio import health
+		health.reset()
+		self.addCleanup(health.reset)
+		media = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+		override = override_settings(MEDIA_ROOT=media)
+		override.enable()
+		self.addCleanup(override.disable)
+
+	def test_ready_reports_each_probe_and_caches_results(self):
+		from unittest import mock
+		from myportfolio import health
+		resp = self.client.get(reverse('portfolio:ready'))
+		self.assertEqual(resp.status_code, 200)
+		data = resp.json()
+		self.assertEqual(data['status'], 'ok')
+		self.assertEqual(set(data['checks']), {'database', 'cache', 'storage', 'email'})
+		self.assertTrue(all(c['ok'] and c['latency_ms'] >= 0 for c in data['checks'].values()))
+		with mock.patch.dict(health.PROBES, database=mock.Mock()) as probes:
+			self.client.get(reverse('portfolio:ready'))
+			probes['database'].assert_not_called()
+
+	def test_failing_probes_fail_or_degrade_readiness(self):
+		from unittest import mock
+		from myportfolio import health
+		broken = mock.Mock(side_effect=OSError('smtp.example.com refused'))
+		with mock.patch.dict(health.PROBES, email=broken):
+			resp = self.client.get(reverse('portfolio:ready'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.json()['status'], 'degraded')
+		self.assertEqual(resp.json()['checks']['email']['error'], 'OSError')
+		self.assertNotIn('smtp.example.com', resp.content.decode())
+		health.reset()
+		with mock.patch.dict(health.PROBES, storage=broken):
+			resp = self.client.get(reverse('portfolio:ready'))
+		self.assertEqual(resp.status_code, 503)
+		self.assertEqual(resp.json()['status'], 'fail')
+		self.assertEqual(self.client.get(reverse('portfolio:health')).content, b'OK')
+
+
+class LogQueueTests(TestCase):
+	def test_handlers_run_on_the_dispatcher_thread(self):
+		import logging
+		import threading
+		from myportfolio.logqueue import LogDispatcher, queue_handlers
+
+		class Collect(logging.Handler):
+			def __init__(self):
+				super().__init__()
+				self.seen = []
+
+			def emit(self, record):
+				self.seen.append((threading.current_thread().name, record.getMessage()))
+
+		collect = Collect()
+		log = logging.getLogger('portfolio.tests.logqueue')
+		log.propagate = False
+		log.addHandler(collect)
+		self.addCleanup(lambda: [log.removeHandler(h) for h in list(log.handlers)])
+		dispatcher = LogDispatcher(maxsize=10)
+		self.addCleanup(dispatcher.stop)
+		queue_handlers([log], dispatcher)
+		items = ['a']
+		log.warning('items: %s', items)
+		items.append('b')
+		dispatcher.flush()
+		self.assertEqual(collect.seen, [('log-dispatcher', "items: ['a']")])
+
+	@override_settings(ADMINS=[('Admin', 'admin@example.com')], ADMIN_EMAIL_DEDUP_SECONDS=600, ADMIN_EMAIL_MAX_PER_HOUR=20)
+	def test_admin_emails_are_deduplicated_by_fingerprint(self):
+		import logging
+		from logging.handlers import BufferingHandler
+		from myportfolio.logqueue import DedupAdminEmailHandler, fingerprint
+		cache.clear()
+		captured = BufferingHandler(100)
+		log = logging.getLogger('portfolio.tests.adminmail')
+		log.propagate = False
+		for handler in (DedupAdminEmailHandler(), captured):
+			log.addHandler(handler)
+			self.addCleanup(log.removeHandler, handler)
+
+		def fail(exc_class):
+			try:
+				raise exc_class('boom')
+			except exc_class:
+				log.exception('Request failed')
+
+		for _ in range(3):
+			fail(ValueError)
+		fail(KeyError)
+		self.assertEqual(len(mail.outbox), 2)
+		# Once the ValueError's window has passed, its next email counts the repeats
+		cache.delete(f'logmail:{fingerprint(captured.buffer[0])}')
+		fail(ValueError)
+		self.assertEqual(len(mail.outbox), 3)
+		self.assertIn('(+2 similar)', mail.outbox[2].subject)
+		self.assertIn('2 more occurrence(s)', mail.outbox[2].body)
+
+	@override_settings(ADMINS=[('Admin', 'admin@example.com')], ADMIN_EMAIL_DEDUP_SECONDS=600)
+	def test_repeated_errors_are_not_rendered(self):
+		import logging
+		from unittest import mock
+		from myportfolio.logqueue import DedupAdminEmailHandler, LogDispatcher, queue_handlers
+		cache.clear()
+		handler = DedupAdminEmailHandler(include_html=True)
+		log = logging.getLogger('portfolio.tests.stormmail')
+		log.propagate = False
+		log.addHandler(handler)
+		self.addCleanup(lambda: [log.removeHandler(h) for h in list(log.handlers)])
+		dispatcher = LogDispatcher(maxsize=10)
+		self.addCleanup(dispatcher.stop)
+		queue_handlers([log], dispatcher)
+		with mock.patch.object(handler, 'render', wraps=handler.render) as render:
+			for _ in range(3):
+				try:
+					raise ValueError('boom')
+				except ValueError:
+					log.exception('Request failed')
+				dispatcher.flush()
+		self.assertEqual(render.call_count, 1)
+		self.assertEqual(len(mail.outbox), 1)
+
+
+	@override_settings(ADMINS=[('Admin', 'admin@example.com')])
+	def test_request_is_read_on_the_calling_thread(self):
+		import logging
+		import threading
+		from unittest import mock
+		from django.test import RequestFactory
+		from django.utils.functional import SimpleLazyObject
+		from myportfolio.logqueue import DedupAdminEmailHandler, LogDispatcher, queue_handlers
+		cache.clear()
+		user_loaded_on = []
+
+		def load_user():
+			from django.contrib.auth.models import AnonymousUser
+			user_loaded_on.append(threading.current_thread())
+			return AnonymousUser()
+
+		request = RequestFactory().get('/boom/')
+		request.user = SimpleLazyObject(load_user)
+		broken = logging.Handler()
+		broken.emit = mock.Mock(side_effect=RuntimeError('handler broke'))
+		broken.handleError = mock.Mock()
+		log = logging.getLogger('portfolio.tests.requestmail')
+		log.propagate = False
+		for handler in (DedupAdminEmailHandler(), broken):
+			log.addHandler(handler)
+		self.addCleanup(lambda: [log.removeHandler(h) for h in list(log.handlers)])
+		dispatcher = LogDispatcher(maxsize=10)
+		self.addCleanup(dispatcher.stop)
+		queue_handlers([log], dispatcher)
+		try:
+			raise ValueError('boom')
+		except ValueError:
+			log.exception('Internal Server Error: /boom/', extra={'request': request})
+		dispatcher.flush()
+		self.assertEqual(user_loaded_on, [threading.current_thread()])
+		self.assertEqual(len(mail.outbox), 1)
+		self.assertIn('EXTERNAL IP', mail.outbox[0].subject)
+		self.assertIn('ValueError', mail.outbox[0].body)
+		# The failing handler was reported, and did not stop the email
+		broken.handleError.assert_called_once()
+
+
+class ResumePDFTests(TestCase):
+	def setUp(self):
+		import shutil
+		import tempfile
+		from unittest import mock
+		patcher = mock.patch('portfolio.resume.render_pdf', return_value=b'%PDF-1.4 resume' + b'0' * 200)
+		self.render_pdf = patcher.start()
+		self.addCleanup(patcher.stop)
+		media = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+		override = override_settings(MEDIA_ROOT=media)
+		override.enable()
+		self.addCleanup(override.disable)
+
+	def test_pdf_is_built_once_and_served_with_etag(self):
+		from .models import ResumePDF
+		url = reverse('portfolio:about_pdf')
+		resp = self.client.get(url)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['Content-Type'], 'application/pdf')
+		self.assertEqual(int(resp['Content-Length']), len(b''.join(resp.streaming_content)))
+		etag = resp['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.client.get(url)
+		self.assertEqual(self.render_pdf.call_count, 1)
+		self.assertEqual(ResumePDF.objects.get().status, ResumePDF.READY)
+
+	def test_content_changes_queue_a_new_version(self):
+		from .models import Profile, ResumePDF
+		from .resume import build, get_resume
+		first = get_resume()
+		with self.captureOnCommitCallbacks(execute=True):
+			Profile.objects.create(name='Denis', title='Engineer')
+		self.assertEqual(ResumePDF.objects.count(), 2)
+		self.assertEqual(get_resume().pk, ResumePDF.objects.first().pk)
+		self.assertNotEqual(get_resume().pk, first.pk)
+		self.assertEqual(self.render_pdf.call_count, 2)
+		# A version that is already built (or being built) is not built again
+		self.assertIsNone(build(first.pk))
+
+	def test_background_builds_never_run_on_the_caller(self):
+		import threading
+		from unittest import mock
+		from . import resume
+		threads = []
+		release = threading.Event()
+
+		def slow_build(pk):
+			threads.append(threading.current_thread())
+			release.wait(5)
+
+		with self.settings(RESUME_PDF_BACKGROUND=True), mock.patch.object(resume, 'build', slow_build), \
+				mock.patch.object(resume, 'BUILD_QUEUE_SIZE', 1), mock.patch.dict(resume._executor, clear=True):
+			for pk in range(1000, 1005):
+				resume.schedule(pk)
+			release.set()
+			resume._builder().shutdown(timeout=5)
+		self.assertTrue(threads)
+		self.assertNotIn(threading.current_thread(), threads)
+		# What did not fit in the queue was dropped, and may be scheduled again
+		self.assertLess(len(threads), 5)
+		self.assertFalse(resume._scheduled)
+
+	def test_failed_build_falls_back_to_previous_version(self):
+		from .models import ResumePDF
+		from .resume import get_resume, invalidate
+		good = get_resume()
+		self.render_pdf.side_effect = RuntimeError('bad stylesheet')
+		with self.assertLogs('portfolio.resume', 'ERROR'):
+			invalidate()
+		self.assertEqual(ResumePDF.objects.first().status, ResumePDF.FAILED)
+		self.assertEqual(get_resume().pk, good.pk)
+
+
+def _sleeping_renderer(out_path, seconds):
+	time.sleep(seconds)
+
+
+def _greedy_renderer(out_path):
+	bytearray(512 * 1024 * 1024)
+
+
+def _fake_portfolio_renderer(out_path, projects, site_url):
+	with open(out_path, 'wb') as f:
+		f.write(b'%PDF-1.4 ' + ' | '.join(title for title, _, _ in projects).encode())
+
+
+class PDFPoolTests(TestCase):
+	def setUp(self):
+		import tempfile
+		slot_dir = tempfile.mkdtemp()
+		# fork, unlike forkserver, does not need to import the renderers above in the child
+		override = override_settings(PDF_POOL_ENABLED=True, PDF_START_METHOD='fork', PDF_SLOT_DIR=slot_dir,
+									 PDF_MAX_JOBS=1, PDF_QUEUE_WAIT=0)
+		override.enable()
+		self.addCleanup(override.disable)
+
+	def test_runaway_jobs_are_killed(self):
+		from myportfolio.pdfpool import PDFRenderError, PDFTimeout, render_file
+		started = time.monotonic()
+		with self.assertLogs('myportfolio.pdfpool', 'WARNING'):
+			with self.assertRaises(PDFTimeout):
+				render_file(_sleeping_renderer, 30, timeout=0.5)
+		self.assertLess(time.monotonic() - started, 10)
+		with override_settings(PDF_MEMORY_LIMIT_MB=64), self.assertLogs('myportfolio.pdfpool', 'WARNING'):
+			with self.assertRaises(PDFRenderError):
+				render_file(_greedy_renderer)
+
+	def test_portfolio_pdf_streams_from_child_process(self):
+		from datetime import date
+		from unittest import mock
+		from .models import Project
+		Project.objects.create(title='Pipeline', description='ETL', technologies='Python', date=date(2025, 1, 1))
+		url = reverse('portfolio:portfolio_pdf')
+		with mock.patch('portfolio.pdfrender.available', return_value=True), \
+				mock.patch('portfolio.pdfrender.portfolio_pdf', _fake_portfolio_renderer):
+			resp = self.client.get(url)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['Content-Type'], 'application/pdf')
+		self.assertIn('attachment', resp['Content-Disposition'])
+		self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF-1.4 Pipeline'))
+
+	def test_busy_slots_answer_503(self):
+		from unittest import mock
+		from myportfolio.pdfpool import acquire_slot
+		slot = acquire_slot()
+		self.addCleanup(slot.release)
+		with mock.patch('portfolio.pdfrender.available', return_value=True):
+			resp = self.client.get(reverse('portfolio:portfolio_pdf'))
+		self.assertEqual(resp.status_code, 503)
+		self.assertIn('Retry-After', resp)
+
+
+class SubscriptionMergeMigrationTests(TransactionTestCase):
+	before = [('blog', '0009_mailmetric'), ('portfolio', '0043_mediablob')]
+	after = [('blog', '0010_merge_portfolio_subscriptions'), ('portfolio', '0043_mediablob')]
+
+	def _migrate(self, targets=None):
+		from django.db import connection
+		from django.db.migrations.executor import MigrationExecutor
+		executor = MigrationExecutor(connection)
+		targets = targets or executor.loader.graph.leaf_nodes()
+		executor.migrate(targets)
+		return executor.loader.project_state(targets).apps
+
+	def tearDown(self):
+		self._migrate()
+
+	def test_merge_and_reverse(self):
+		import uuid
+		from datetime import datetime, timezone as dt_timezone
+		old = self._migrate(self.before)
+		Subscriber = old.get_model('blog', 'Subscriber')
+		Subscription = old.get_model('portfolio', 'Subscription')
+		early = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+		late = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+		ann_token = uuid.uuid4()
+		Subscriber.objects.create(email='Ann@Example.com', active=False, created_at=late, token=ann_token)
+		Subscriber.objects.create(email='dan@example.com', active=False, created_at=late)
+		Subscriber.objects.create(email='DAN@example.com', active=True, created_at=early)
+		for email, active, token in (('ann@EXAMPLE.com', True, uuid.uuid4()), ('Carol@example.com', False, None)):
+			Subscription.objects.create(email=email, active=active, token=token)
+		Subscription.objects.filter(email='ann@EXAMPLE.com').update(created_at=early)
+
+		new = self._migrate(self.after)
+		merged = {s.email: s for s in new.get_model('blog', 'Subscriber').objects.all()}
+		self.assertEqual(set(merged), {'ann@example.com', 'carol@example.com', 'dan@example.com'})
+		# The blog row is kept, active if either was, with the earliest date
+		self.assertEqual(merged['ann@example.com'].token, ann_token)
+		self.assertTrue(merged['ann@example.com'].active)
+		self.assertEqual(merged['ann@example.com'].created_at, early)
+		self.assertTrue(merged['dan@example.com'].active)
+		self.assertEqual(merged['dan@example.com'].created_at, early)
+		self.assertIsNotNone(merged['carol@example.com'].token)
+
+		# Rolling back past portfolio 0044 (which drops the old table) puts
+		# every subscriber back on the old list
+		self._migrate()
+		old = self._migrate(self.before)
+		restored = {s.email: s for s in old.get_model('portfolio', 'Subscription').objects.all()}
+		self.assertEqual(set(restored), set(merged))
+		self.assertEqual(restored['ann@example.com'].token, ann_token)
+		self.assertEqual(restored['ann@example.com'].created_at, early)
+		self.assertTrue(restored['dan@example.com'].active)
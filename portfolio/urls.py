@@ -16,6 +16,7 @@ urlpatterns = [
     path('recommend/', views.recommend, name='recommend'),
     path('sitemap/', views.html_sitemap, name='html_sitemap'),
     path('contact/', views.contact, name='contact'),
+    path('contact/attachments/<str:token>/', views.attachment_download, name='attachment_download'),
     path('privacy/', views.privacy, name='privacy'),
     path('terms/', views.terms, name='terms'),
     path('gallery/', views.gallery, name='gallery'),
@@ -24,4 +25,8 @@ urlpatterns = [
     path('portfolio.pdf', views.portfolio_pdf, name='portfolio_pdf'),
     # Health check endpoint used by hosting providers
     path('health/', views.health, name='health'),
+    # Readiness: probes the database, cache, storage and email backend
+    path('ready/', views.ready, name='ready'),
+    # Prometheus scrape endpoint (METRICS_TOKEN or localhost only)
+    path('metrics', views.metrics, name='metrics'),
 ]
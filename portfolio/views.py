@@ -1,16 +1,21 @@
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.urls import reverse
-from django.core.mail import send_mail, EmailMessage
+from django.core.mail import EmailMessage
 from django.contrib import messages
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, date, time as dtime
+from blog.emails import compiled_email
 from blog.models import Post
+from blog.utils import deliver_mail, deliver_message
+from myportfolio.middleware.ratelimit import client_ip, cooldown, shared_cache
 from .models import Message, Project, Testimonial, Tag, GalleryItem, Subscription, MessageAttachment, Service
 from django.db import models
 from django.db.models import Count
 from .forms import ContactForm, SubscribeForm, TestimonialForm
+from .attachments import attach_or_link, resolve_token
+from .spam import is_spam, score_submission
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
@@ -143,6 +148,39 @@ def health(request):
     return HttpResponse('OK', content_type='text/plain')
 
 
+def ready(request):
+	"""Readiness endpoint: probes the database, cache, media storage and email.
+
+	Answers 200 with per-probe latency in JSON while the worker can serve
+	requests and 503 when it cannot (see ``myportfolio.health``). Results
+	are cached for a few seconds, so it is safe to poll often.
+	"""
+	from django.http import JsonResponse
+	from myportfolio.health import readiness
+	ok, report = readiness()
+	response = JsonResponse(report, status=200 if ok else 503)
+	response['Cache-Control'] = 'no-store'
+	return response
+
+
+def metrics(request):
+	"""Prometheus metrics (see ``myportfolio.metrics``).
+
+	With ``METRICS_TOKEN`` set, scrapers must send it as a bearer token;
+	without one, only requests from the local host are answered.
+	"""
+	from django.utils.crypto import constant_time_compare
+	from myportfolio import metrics as site_metrics
+	token = getattr(settings, 'METRICS_TOKEN', '')
+	if token:
+		allowed = constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+	else:
+		allowed = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+	if not allowed:
+		return HttpResponse('Forbidden', status=403, content_type='text/plain')
+	return HttpResponse(site_metrics.render(), content_type=site_metrics.CONTENT_TYPE)
+
+
 def server_error(request, template_name='500.html'):
 	"""Custom 500 handler that prefers a minimal static fallback template.
 
@@ -211,40 +249,32 @@ def service_detail(request, slug: str):
 
 
 def about_pdf(request):
-	"""Render the About (resume) page as a downloadable PDF using WeasyPrint when possible.
-	Fallbacks:
-	  1) If WeasyPrint not available or PDF gen fails → redirect to uploaded resume (if configured)
+	"""Serve the About (resume) page as a PDF, built in the background by WeasyPrint.
+
+	The PDF is generated once per content version (see ``portfolio.resume``)
+	and served from storage with an ETag. Fallbacks when no build has
+	succeeded yet:
+	  1) Redirect to the uploaded resume (if configured)
 	  2) Else redirect to static resume file (if present)
 	  3) Else redirect to portfolio PDF (ReportLab)
 	"""
-	# Attempt WeasyPrint generation
+	from django.http import FileResponse
+	from django.utils.cache import get_conditional_response
+	from .resume import get_resume
 	try:
-		import weasyprint  # type: ignore
-		html_str = render_to_string('about.html', request=request)
-		base_url = request.build_absolute_uri('/')
-		stylesheets = []
-		try:
-			from django.conf import settings as _settings
-			css_dir = _settings.BASE_DIR / 'portfolio' / 'static' / 'css'
-			style_files = []
-			# Prefer a dedicated print stylesheet for PDF generation to avoid
-			# parsing the full site stylesheet (which contains modern CSS
-			# features WeasyPrint will warn about). If `print.css` exists,
-			# use it alone; otherwise fall back to `styles.css` if present.
-			print_path = css_dir / 'print.css'
-			styles_path = css_dir / 'styles.css'
-			if print_path.exists():
-				style_files.append(weasyprint.CSS(filename=str(print_path)))
-			elif styles_path.exists():
-				style_files.append(weasyprint.CSS(filename=str(styles_path)))
-			stylesheets = style_files
-		except Exception:
-			stylesheets = []
-
-		pdf_bytes = weasyprint.HTML(string=html_str, base_url=base_url).write_pdf(stylesheets=stylesheets or None)
-		response = HttpResponse(pdf_bytes, content_type='application/pdf')
-		# Force download for clarity
-		response['Content-Disposition'] = 'attachment; filename="Denis_Lokwo_Resume.pdf"'
+		resume = get_resume()
+		if resume is None:
+			raise LookupError('no resume PDF has been built')
+		etag = f'"{resume.etag}"'
+		not_modified = get_conditional_response(request, etag=etag)
+		if not_modified is not None:
+			return not_modified
+		response = FileResponse(resume.file.open('rb'), content_type='application/pdf', as_attachment=True,
+								filename='Denis_Lokwo_Resume.pdf')
+		response['Content-Length'] = str(resume.size)
+		response['ETag'] = etag
+		# Cacheable, but revalidated so a new version shows up at once
+		response['Cache-Control'] = 'no-cache'
 		return response
 	except Exception:
 		# Graceful fallbacks
@@ -269,14 +299,13 @@ def about_pdf(request):
 
 
 def contact(request):
-	RATE_LIMIT_SECONDS = getattr(settings, 'CONTACT_RATE_LIMIT_SECONDS', 30)  # simple per-session rate limit
+	RATE_LIMIT_SECONDS = getattr(settings, 'CONTACT_RATE_LIMIT_SECONDS', 30)  # one message per client per period
 	if request.method == 'POST':
 		form = ContactForm(request.POST, request.FILES)
 		if form.is_valid():
-			# basic rate limiting by session timestamp
-			last = request.session.get('last_contact')
-			now = timezone.now().timestamp()
-			if last and (now - float(last) < RATE_LIMIT_SECONDS):
+			# Per-client cooldown in the rate limiter's cache, shared by all
+			# workers (no session row for anonymous visitors)
+			if not cooldown(shared_cache(), 'contact', client_ip(request), RATE_LIMIT_SECONDS):
 				messages.error(request, 'Please wait a moment before sending another message.')
 				return redirect(reverse('portfolio:contact'))
 
@@ -284,12 +313,15 @@ def contact(request):
 			email = form.cleaned_data['email']
 			message_text = form.cleaned_data['message']
 
+			spam_score = score_submission(name, email, message_text)
+
 			# save to DB
 			msg_obj = Message.objects.create(
 				name=name,
 				email=email,
 				message=message_text,
-				attachment=form.cleaned_data.get('attachment')
+				attachment=form.cleaned_data.get('attachment'),
+				spam_score=spam_score,
 			)
 
 			# Handle additional attachments (multiple files input named "attachments")
@@ -321,33 +353,34 @@ def contact(request):
 				except Exception:
 					pass
 
+			if is_spam(spam_score):
+				# Kept for review in the admin, but no notification and no
+				# acknowledgment to an address the spammer made up
+				messages.success(request, 'Thanks — your message was sent. I will get back to you soon.')
+				return redirect(reverse('portfolio:contact'))
+
 			subject = f'Portfolio contact from {name}'
 			body = f'From: {name} <{email}>\n\n{message_text}'
 			recipient = getattr(settings, 'CONTACT_EMAIL', None) or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
 			try:
-				# Always use EmailMessage so we can include multiple attachments
+				# Always use EmailMessage so we can include multiple attachments.
+				# Files were streamed to storage above; the stored copies within
+				# a size budget are attached when the email is sent and the rest
+				# are linked. Sending happens after commit, off the request.
 				email_msg = EmailMessage(subject, body, None, [recipient])
-				# Primary single attachment from form
-				primary_att = form.cleaned_data.get('attachment')
-				if primary_att:
-					email_msg.attach(primary_att.name, primary_att.read(), getattr(primary_att, 'content_type', None))
-				# Additional attachments
-				for f in filtered_extras:
-					try:
-						email_msg.attach(f.name, f.read(), getattr(f, 'content_type', None))
-					except Exception:
-						continue
-				email_msg.send(fail_silently=False)
+				refs = []
+				attach_or_link(email_msg, msg_obj, request.build_absolute_uri('/'), refs=refs)
+				deliver_message(email_msg, idempotency_key=f'contact:{msg_obj.pk}:owner', attachments=refs)
 				# Send acknowledgment to user (no attachments)
 				try:
 					brand = getattr(settings, 'SITE_NAME', 'Portfolio')
 					from_addr = getattr(settings, 'DEFAULT_FROM_EMAIL', None)
 					ack_subject = f"Thanks for reaching out — {brand}"
 					# Try rendering templates first
-					ctx = {'name': name, 'message': message_text, 'brand_name': brand}
 					try:
-						text_body = render_to_string('emails/contact_ack.txt', ctx)
-						html_body = render_to_string('emails/contact_ack.html', ctx)
+						text_body, html_body = compiled_email(
+							'emails/contact_ack', {'brand_name': brand}, fields=('name', 'message'),
+						).render(name=name, message=message_text)
 					except Exception:
 						text_body = (
 							f"Hi {name},\n\n"
@@ -355,7 +388,7 @@ def contact(request):
 							"Your message:\n" + message_text + "\n\nBest regards,\n" + brand
 						)
 						html_body = None
-					send_mail(ack_subject, text_body, from_addr, [email], fail_silently=True, html_message=html_body)
+					deliver_mail(ack_subject, text_body, from_addr, [email], fail_silently=True, html_message=html_body, idempotency_key=f'contact:{msg_obj.pk}:ack', template='emails/contact_ack')
 				except Exception:
 					pass
 			except Exception:
@@ -364,7 +397,6 @@ def contact(request):
 			else:
 				messages.success(request, 'Thanks — your message was sent. I will get back to you soon.')
 
-			request.session['last_contact'] = str(now)
 			# Redirect back to contact page (tests expect exact URL without query params)
 			return redirect(reverse('portfolio:contact'))
 	else:
@@ -372,6 +404,20 @@ def contact(request):
 	return render(request, 'contact.html', {'form': form})
 
 
+def attachment_download(request, token: str):
+	"""Stream a stored contact attachment referenced by a signed link."""
+	from django.http import FileResponse, Http404
+	field_file = resolve_token(token)
+	if not field_file:
+		raise Http404()
+	try:
+		fh = field_file.storage.open(field_file.name, 'rb')
+	except Exception:
+		raise Http404()
+	import os as _os
+	return FileResponse(fh, as_attachment=True, filename=_os.path.basename(field_file.name))
+
+
 def privacy(request):
 	return render(request, 'privacy.html')
 
@@ -385,7 +431,7 @@ def subscribe(request):
 	if request.method == 'POST':
 		form = SubscribeForm(request.POST)
 		if form.is_valid():
-			email = form.cleaned_data['email']
+			email = form.cleaned_data['email'].strip().lower()
 			next_url = request.POST.get('next') or None
 			sub, created = Subscription.objects.get_or_create(email=email, defaults={'active': False})
 			if sub.active:
@@ -428,19 +474,19 @@ def subscribe(request):
 					'site_name': site_name,
 					'brand_name': brand_name,
 					'logo_url': logo_url,
-					'confirm_url': confirm_url,
 					'primary_color': primary_color,
 				}
 				try:
-					text_body = render_to_string('emails/subscribe_confirm.txt', ctx)
-					html_body = render_to_string('emails/subscribe_confirm.html', ctx)
+					text_body, html_body = compiled_email(
+						'emails/subscribe_confirm', ctx, fields=('confirm_url',),
+					).render(confirm_url=confirm_url)
 				except Exception:
 					text_body = (
 						f"Hi,\n\nPlease confirm your subscription by clicking the link below:\n{confirm_url}\n\n"
 						f"If you didn't request this, you can ignore this email.\n"
 					)
 					html_body = None
-				send_mail(subject, text_body, from_addr, to, fail_silently=not settings.DEBUG, html_message=html_body)
+				deliver_mail(subject, text_body, from_addr, to, fail_silently=not settings.DEBUG, html_message=html_body, template='emails/subscribe_confirm')
 			except Exception:
 				# Don't block on email errors; allow manual confirmation if needed later
 				pass
@@ -498,18 +544,18 @@ def subscribe_confirm(request, token: str):
 			'brand_name': brand_name,
 			'logo_url': logo_url,
 			'primary_color': primary_color,
-			'unsubscribe_url': unsubscribe_url,
 		}
 		try:
-			text_body = render_to_string('emails/subscribe_welcome.txt', ctx)
-			html_body = render_to_string('emails/subscribe_welcome.html', ctx)
+			text_body, html_body = compiled_email(
+				'emails/subscribe_welcome', ctx, fields=('unsubscribe_url',),
+			).render(unsubscribe_url=unsubscribe_url)
 		except Exception:
 			text_body = (
 				"Thanks for confirming your subscription!\n\n"
 				f"You can unsubscribe anytime: {unsubscribe_url}\n"
 			)
 			html_body = None
-		send_mail(subject, text_body, from_addr, to, fail_silently=not settings.DEBUG, html_message=html_body)
+		deliver_mail(subject, text_body, from_addr, to, fail_silently=not settings.DEBUG, html_message=html_body, idempotency_key=f'subscription:{sub.token}:welcome', template='emails/subscribe_welcome')
 	except Exception:
 		pass
 
@@ -542,7 +588,11 @@ def recommend(request):
 		if form.is_valid():
 			t = form.save(commit=False)
 			t.featured = False
+			t.spam_score = score_submission(t.name, t.email, f'{t.role} {t.content}')
 			t.save()
+			if is_spam(t.spam_score):
+				messages.success(request, 'Thank you! Your recommendation was received and is pending review.')
+				return redirect(request.POST.get('next') or 'portfolio:recommend')
 
 			# Notify site owner/admin
 			try:
@@ -561,7 +611,7 @@ def recommend(request):
 						f"Content:\n{t.content}\n\n"
 						+ (f"Review in admin: {admin_url}\n" if admin_url else "")
 					)
-					send_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [admin_email], fail_silently=True)
+					deliver_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [admin_email], fail_silently=True, idempotency_key=f'testimonial:{t.pk}:admin')
 			except Exception:
 				pass
 
@@ -574,7 +624,7 @@ def recommend(request):
 						"Thanks for sharing your feedback! Your recommendation was received and is pending review.\n\n"
 						"Best regards,\nDenis"
 					)
-					send_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [t.email], fail_silently=True)
+					deliver_mail(subject, body, getattr(settings, 'DEFAULT_FROM_EMAIL', None), [t.email], fail_silently=True, idempotency_key=f'testimonial:{t.pk}:ack')
 			except Exception:
 				pass
 
@@ -658,107 +708,44 @@ def project_list(request):
 
 def portfolio_pdf(request):
 	"""Generate a simple portfolio PDF with a project listing.
-	If reportlab is not installed, return a helpful message.
+
+	ReportLab runs in a separate process with a time and memory limit (see
+	``myportfolio.pdfpool``) and the PDF is streamed from a temporary file.
+	When every rendering slot is taken the client gets a 503 with
+	``Retry-After``. If reportlab is not installed, a placeholder is returned.
 	"""
-	try:
-		from reportlab.lib.pagesizes import A4
-		from reportlab.pdfgen import canvas
-		from reportlab.lib.units import mm
-		from reportlab.lib.utils import simpleSplit
-	except Exception as exc:
+	from django.http import FileResponse
+	from myportfolio.pdfpool import PDFBusy, PDFRenderError, render_file
+	from . import pdfrender
+	filename = 'Denis_Lokwo_Portfolio.pdf'
+	if not pdfrender.available('reportlab'):
 		# Fallback: return a minimal PDF-like payload so endpoint remains available for tests/environments without ReportLab
 		placeholder = b"%PDF-1.4\n" + (b"0" * 256) + b"\n%%EOF"
 		resp = HttpResponse(placeholder, content_type='application/pdf')
-		resp['Content-Disposition'] = 'attachment; filename="Denis_Lokwo_Portfolio.pdf"'
+		resp['Content-Disposition'] = f'attachment; filename="{filename}"'
 		return resp
 
-	try:
-		# Prepare response
-		response = HttpResponse(content_type='application/pdf')
-		response['Content-Disposition'] = 'attachment; filename="Denis_Lokwo_Portfolio.pdf"'
-		c = canvas.Canvas(response, pagesize=A4)
-		width, height = A4
-
-		# Margins
-		margin_x = 20 * mm
-		margin_y = 20 * mm
-		y = height - margin_y
-
-		# Title
-		c.setFont("Helvetica-Bold", 18)
-		c.drawString(margin_x, y, "Denis Lokwo — Portfolio")
-		y -= 12 * mm
-
-		# Intro
-		c.setFont("Helvetica", 11)
-		intro = (
-			"Selected projects and highlights. For live demos and full details, visit the website."
+	# Plain data for the renderer, which has no database access
+	projects = [
+		(
+			f"{proj.title} — {proj.category or 'General'} ({proj.date:%b %Y})",
+			", ".join(proj.tech_list()),
+			(proj.description or "").strip(),
 		)
-		for line in simpleSplit(intro, "Helvetica", 11, width - 2 * margin_x):
-			c.drawString(margin_x, y, line)
-			y -= 6 * mm
-
-		y -= 4 * mm
-		c.setFont("Helvetica-Bold", 14)
-		c.drawString(margin_x, y, "Projects")
-		y -= 8 * mm
-
-		projects = Project.objects.order_by('-date')
-		c.setFont("Helvetica", 11)
-		for proj in projects:
-			# Ensure there is space, else new page
-			min_block = 18 * mm
-			if y < margin_y + min_block:
-				c.showPage()
-				y = height - margin_y
-				c.setFont("Helvetica", 11)
-
-			# Title line
-			title = f"{proj.title} — {proj.category or 'General'} ({proj.date:%b %Y})"
-			for line in simpleSplit(title, "Helvetica", 11, width - 2 * margin_x):
-				c.drawString(margin_x, y, line)
-				y -= 6 * mm
-
-			# Technologies
-			tech = ", ".join(proj.tech_list())
-			if tech:
-				for line in simpleSplit(f"Tech: {tech}", "Helvetica", 10, width - 2 * margin_x):
-					c.drawString(margin_x, y, line)
-					y -= 5 * mm
-
-			# Description (short)
-			desc = (proj.description or "").strip()
-			if desc:
-				lines = simpleSplit(desc, "Helvetica", 10, width - 2 * margin_x)
-				for line in lines[:5]:
-					c.drawString(margin_x, y, line)
-					y -= 5 * mm
-
-			y -= 3 * mm
-
-		# Footer note
-		if y < margin_y + 12 * mm:
-			c.showPage()
-			y = height - margin_y
-		c.setFont("Helvetica-Oblique", 9)
-		site_url = request.build_absolute_uri('/')
-		c.drawString(margin_x, margin_y, f"Generated from Denis Lokwo Portfolio — {site_url}")
-
-		c.showPage()
-		c.save()
+		for proj in Project.objects.order_by('-date')
+	]
+	try:
+		try:
+			pdf = render_file(pdfrender.portfolio_pdf, projects, request.build_absolute_uri('/'))
+		except PDFRenderError:
+			# Graceful fallback: minimal one-page PDF so endpoint remains available even if a rendering error occurs
+			pdf = render_file(pdfrender.portfolio_fallback_pdf)
+	except (PDFBusy, PDFRenderError):
+		response = HttpResponse('The PDF is being generated for other visitors; please retry shortly.',
+								status=503, content_type='text/plain')
+		response['Retry-After'] = str(max(1, int(getattr(settings, 'PDF_QUEUE_WAIT', 5))))
 		return response
-	except Exception:
-		# Graceful fallback: minimal one-page PDF so endpoint remains available even if a rendering error occurs
-		fallback = HttpResponse(content_type='application/pdf')
-		fallback['Content-Disposition'] = 'attachment; filename="Denis_Lokwo_Portfolio.pdf"'
-		c = canvas.Canvas(fallback, pagesize=A4)
-		c.setFont("Helvetica-Bold", 16)
-		c.drawString(50, 800, "Denis Lokwo — Portfolio")
-		c.setFont("Helvetica", 12)
-		c.drawString(50, 780, "Portfolio PDF temporarily simplified.")
-		c.showPage()
-		c.save()
-		return fallback
+	return FileResponse(pdf, content_type='application/pdf', as_attachment=True, filename=filename)
 
 
 def project_detail(request, slug: str):
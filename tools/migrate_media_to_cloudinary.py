@@ -10,6 +10,11 @@ Usage:
 
 Important: review the code and back up your DB before running. This will
 modify model file fields in-place.
+
+Prefer ``python manage.py migrate_media --to <storage>``: it copies between
+any two storage backends concurrently, can resume an interrupted run and
+updates rows without firing model signals (this script calls ``save()``,
+which re-sends blog publish notifications).
 """
 import os
 import sys